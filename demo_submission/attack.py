@@ -33,6 +33,22 @@ NT_PROF_LDA=None # 16384
 # Apply a centering process on each traces (in order to reduce any DC levels)
 centered = True
 
+class Centering:
+    """Centering of the traces, using buffers that are re-used for all the
+    chunks (of at most MAX_CHUNK_SIZE traces)."""
+    def __init__(self, nsamples):
+        self.means = np.empty((MAX_CHUNK_SIZE, 1))
+        self.centered = np.empty((MAX_CHUNK_SIZE, nsamples))
+        self.utraces = np.empty((MAX_CHUNK_SIZE, nsamples), dtype=np.int16)
+
+    def __call__(self, traces):
+        n = traces.shape[0]
+        means = np.mean(traces, axis=1, keepdims=True, out=self.means[:n])
+        centered = np.subtract(traces, means, out=self.centered[:n])
+        np.round(centered, out=centered)
+        np.copyto(self.utraces[:n], centered, casting='unsafe')
+        return self.utraces[:n]
+
 class Attack:
     """Implementation of the proposed attack.
 
@@ -154,7 +170,9 @@ class Attack:
                 list_sigs_SB.append(self.tapname_byte_fromSB(bidx,shi))
 
         # Iterate over chunks of traces and compute the SNR.  
-        iterobj = dataset.iter_ntraces(NT_PROF_SNR, max_chunk_size=MAX_CHUNK_SIZE)
+        # The chunks are read into buffers re-used for the whole iteration.
+        iterobj = dataset.iter_ntraces(NT_PROF_SNR, max_chunk_size=MAX_CHUNK_SIZE, buffers=True)
+        center = Centering(nsamples)
         for chunk in tqdm.tqdm(iterobj,total=len(iterobj)):
             # Simulate the internal values using the lib generated with Verime
             simuls = plib.Simu(
@@ -173,7 +191,7 @@ class Attack:
             if not(centered):
                 utraces = chunk["traces"]
             else:
-                utraces = np.round(chunk["traces"] - np.mean(chunk['traces'],axis=1,keepdims=True)).astype(np.int16)
+                utraces = center(chunk["traces"])
 
             # Fit SNR instance
             snr_obj_SB.fit_u(
@@ -214,7 +232,7 @@ class Attack:
         # Counter use for display purpose.
         cnt_traces = 0
         # Create the iterator for the dataset dsreader. 
-        chunkIt = dataset.iter_ntraces(NT_PROF_LDA, max_chunk_size=MAX_CHUNK_SIZE)
+        chunkIt = dataset.iter_ntraces(NT_PROF_LDA, max_chunk_size=MAX_CHUNK_SIZE, buffers=True)
         for chunk in tqdm.tqdm(chunkIt,total=len(chunkIt)):
             # Update the counter  
             cnt_traces += chunk["traces"].shape[0]
@@ -236,7 +254,7 @@ class Attack:
             if not(centered):
                 utraces = chunk["traces"]
             else:
-                utraces = np.round(chunk["traces"] - np.mean(chunk['traces'],axis=1,keepdims=True)).astype(np.int16)
+                utraces = center(chunk["traces"])
 
             # Fit the LDA object with the profiling traces.
             lda_state_SB.fit_u(
@@ -272,7 +290,8 @@ class Attack:
 
         # Amount of traces to keep track of the amount of traces used during the attack.       
         cnt_traces = 0
-        iterobj = attack_dataset.iter_ntraces(None, max_chunk_size=MAX_CHUNK_SIZE)
+        iterobj = attack_dataset.iter_ntraces(None, max_chunk_size=MAX_CHUNK_SIZE, buffers=True)
+        center = Centering(attack_dataset.fields["traces"]["shape"][0])
 
         # Amount of traces to be processed
         nchunks = len(iterobj)
@@ -289,7 +308,7 @@ class Attack:
             if not(centered):
                 utraces = chunk["traces"]
             else:
-                utraces = np.round(chunk["traces"] - np.mean(chunk['traces'],axis=1,keepdims=True)).astype(np.int16)
+                utraces = center(chunk["traces"])
 
             # Recover the probability given the leakages values  
             probas_SB = list(lda_mod_SB.predict_proba(utraces))  
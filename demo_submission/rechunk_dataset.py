@@ -0,0 +1,205 @@
+"""Split the chunks of a dataset according to a chunk-size policy.
+
+The new chunks are written from memory-mapped files (with bounded memory) by
+a pool of processes, or, with --no-copy, reference rows of the existing files
+(see DatasetReader.subset_rows). The new chunks keep the codecs and the block
+hash size of the existing files. The chunks that are not split are reused as
+they are, including their hashes, and the sample-major layouts (see
+transpose_dataset.py) are updated to reference the new chunks. The new manifest
+is written in the directory of the existing one.
+"""
+import argparse
+import copy
+import math
+from pathlib import Path
+
+import numpy as np
+
+import dataset
+
+def fixed_size(size):
+    """Policy: pieces of `size` traces (the last one may be smaller)."""
+    def policy(nexec, row_nbytes):
+        return [
+                (f'_part{i}', start, stop)
+                for i, (start, stop) in enumerate(dataset.split_slice(0, nexec, size))
+                ]
+    return policy
+
+def max_bytes(nbytes):
+    """Policy: pieces of at most `nbytes` bytes (at least one trace)."""
+    def policy(nexec, row_nbytes):
+        return fixed_size(max(1, nbytes // max(1, row_nbytes)))(nexec, row_nbytes)
+    return policy
+
+def pow2_ladder():
+    """Policy: pieces [0, 1), [1, 2), [2, 4), ..., [2**(k-1), 2**k) and
+    [2**k, nexec) (if not empty), where k = floor(log2(nexec)), such that
+    any number of traces can be made from a subset of the pieces.
+    """
+    def policy(nexec, row_nbytes):
+        if nexec == 0:
+            return []
+        k = int(math.log2(nexec))
+        pieces = [(f'_split{base}', 2**base, 2**(base+1)) for base in reversed(range(k))]
+        pieces.append(('_split00', 0, 1))
+        if nexec > 2**k:
+            pieces.insert(0, (f'_split{k}', 2**k, nexec))
+        return pieces
+    return policy
+
+def row_nbytes(fields):
+    """Size of a trace (all fields), in bytes."""
+    return sum(
+            np.dtype(desc['dtype']).itemsize * math.prod(desc['shape'])
+            for desc in fields.values()
+            )
+
+def write_piece(dr, chunk_name, new_chunk_name, start, stop, dest_path, dataset_id):
+    """Write the traces [start, stop) of a chunk as a new chunk, with the
+    codecs and block hash size of the files of the chunk. Returns the new
+    chunk object."""
+    files = dr.chunks[chunk_name]['files']
+    codecs = {field: file['codec'] for field, file in files.items() if 'codec' in file}
+    block_size = next((file['blocks']['size'] for file in files.values() if 'blocks' in file), None)
+    chunk = dr.load_chunk(chunk_name, mmap_mode='r', start=start, stop=stop)
+    # The manifest is written by the main process.
+    dw = dataset.DatasetWriter(
+            dest_path, dataset_id, dr.metadata, dr.fields, codecs, merkle_block_size=block_size
+            )
+    dw.add_chunk(new_chunk_name, **chunk)
+    return dw.chunks[new_chunk_name]
+
+def rechunk(dr, dest_path, policy, chunk_names=None, dataset_id=None, nproc=None, copy_data=True):
+    """Split the chunks chunk_names (default: all) of dr according to policy
+    and write the new dataset manifest at dest_path.
+
+    policy(nexec, row_nbytes) returns the pieces of a chunk:
+    [(<chunk name suffix>, <start>, <stop>), ...].
+    copy_data: if False, the pieces reference rows of the existing files.
+    The paths of the existing files are made relative to the directory of
+    dest_path (see dataset.rebase_path).
+    """
+    if dataset_id is None:
+        dataset_id = dr.id
+    if chunk_names is None:
+        chunk_names = dr.chunk_name_list
+    chunk_names = set(chunk_names)
+    nbytes = row_nbytes(dr.fields)
+    dest_dir = Path(dest_path).parent
+    def rebase(file):
+        return dict(file, path=str(dataset.rebase_path(file['path'], dr.base_path, dest_dir)))
+    def rebase_files(files):
+        return {field: rebase(file) for field, file in files.items()}
+    layouts = copy.deepcopy(dr.layouts)
+    for layout in layouts.values():
+        layout['files'] = [rebase(file) for file in layout['files']]
+    with dataset.ReaderPoolExecutor(dr, max_workers=nproc) as executor:
+        new_chunks = []
+        for chunk_name, chunk in dr.chunks.items():
+            pieces = policy(chunk['nexec'], nbytes) if chunk_name in chunk_names else []
+            if len(pieces) <= 1:
+                # Not split: keep the files and hashes.
+                new_chunks.append((chunk_name, dict(chunk, files=rebase_files(chunk['files']))))
+            else:
+                for suffix, start, stop in pieces:
+                    new_chunk_name = chunk_name + suffix
+                    if copy_data:
+                        new_chunks.append((new_chunk_name, executor.submit(
+                            write_piece, chunk_name, new_chunk_name, start, stop,
+                            dest_path, dataset_id,
+                            )))
+                    else:
+                        new_chunk = dataset.sub_chunk(chunk, start, stop)
+                        new_chunk['files'] = rebase_files(new_chunk['files'])
+                        new_chunks.append((new_chunk_name, new_chunk))
+                    for layout in layouts.values():
+                        if chunk_name in layout['chunks']:
+                            layout['chunks'][new_chunk_name] = layout['chunks'][chunk_name] + start
+                # The layouts reference the new chunks instead of the split one.
+                for layout in layouts.values():
+                    layout['chunks'].pop(chunk_name, None)
+        with dataset.DatasetWriter(dest_path, dataset_id, dr.metadata, dr.fields) as dw:
+            for chunk_name, chunk in new_chunks:
+                if not isinstance(chunk, dict):
+                    chunk = chunk.result()
+                dw.add_existing_chunk(chunk_name, chunk)
+            for field_name, field_layout in layouts.items():
+                dw.add_layout(field_name, field_layout)
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Split the chunks of a dataset according to a chunk-size policy.'
+        )
+    parser.add_argument(
+            '--dataset',
+            type=str,
+            required=True,
+            help='Existing dataset path (to manifest).',
+            )
+    parser.add_argument(
+            '--new',
+            type=str,
+            default="manifest_rechunk.json",
+            help='Name of the new manifest.',
+            )
+    parser.add_argument(
+            '--id',
+            type=str,
+            default=None,
+            help='Id of the new dataset (default: id of the dataset).',
+            )
+    policy = parser.add_mutually_exclusive_group(required=True)
+    policy.add_argument(
+            '--fixed',
+            type=int,
+            default=None,
+            help='Split in chunks of FIXED traces.',
+            )
+    policy.add_argument(
+            '--max-bytes',
+            type=int,
+            default=None,
+            help='Split in chunks of at most MAX_BYTES bytes.',
+            )
+    policy.add_argument(
+            '--pow2',
+            default=False,
+            action="store_true",
+            help='Split in chunks of 1, 1, 2, 4, ... traces.',
+            )
+    parser.add_argument(
+            '--last-only',
+            default=False,
+            action="store_true",
+            help='Split only the last chunk.',
+            )
+    parser.add_argument(
+            '--no-copy',
+            default=False,
+            action="store_true",
+            help='Reference the rows of the existing files instead of copying them.',
+            )
+    parser.add_argument(
+            '--nproc',
+            type=int,
+            default=None,
+            help='Number of processes (default: number of CPUs).',
+            )
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    dest_path = Path(args.dataset).parent / args.new
+    dr = dataset.DatasetReader.from_manifest(args.dataset)
+    if args.fixed is not None:
+        policy = fixed_size(args.fixed)
+    elif args.max_bytes is not None:
+        policy = max_bytes(args.max_bytes)
+    else:
+        policy = pow2_ladder()
+    chunk_names = dr.chunk_name_list[-1:] if args.last_only else None
+    rechunk(dr, dest_path, policy, chunk_names, args.id, args.nproc, not args.no_copy)
+
+if __name__ == '__main__':
+    main()
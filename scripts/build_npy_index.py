@@ -0,0 +1,24 @@
+import argparse
+
+import dataset
+
+parser = argparse.ArgumentParser(
+    description='Index the .npy headers of the files of a dataset ' +
+    '(see DatasetReader.build_npy_index), stored next to the manifest.'
+    )
+parser.add_argument(
+        '--dataset',
+        type=str,
+        required=True,
+        help='Existing dataset path (to manifest).',
+        )
+parser.add_argument(
+        '--nthreads',
+        type=int,
+        default=None,
+        help='Number of threads (default: see concurrent.futures.ThreadPoolExecutor).',
+        )
+args = parser.parse_args()
+
+dr = dataset.DatasetReader.from_manifest(args.dataset)
+dr.build_npy_index(args.nthreads, save=True)
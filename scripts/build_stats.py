@@ -0,0 +1,30 @@
+import argparse
+
+import dataset
+
+parser = argparse.ArgumentParser(
+    description='Compute the per-sample statistics of the chunks of a dataset ' +
+    '(see DatasetReader.stats), stored next to the manifest.'
+    )
+parser.add_argument(
+        '--dataset',
+        type=str,
+        required=True,
+        help='Existing dataset path (to manifest).',
+        )
+parser.add_argument(
+        '--field',
+        type=str,
+        default='traces',
+        help='Field (default: traces).',
+        )
+parser.add_argument(
+        '--nproc',
+        type=int,
+        default=None,
+        help='Number of processes (default: number of CPUs).',
+        )
+args = parser.parse_args()
+
+dr = dataset.DatasetReader.from_manifest(args.dataset)
+dr.build_stats(args.field, args.nproc)
@@ -0,0 +1,29 @@
+import argparse
+
+import dataset
+
+parser = argparse.ArgumentParser(
+    description='Convert a dataset manifest between the JSON and binary formats.'
+    )
+parser.add_argument(
+        '--dataset',
+        type=str,
+        required=True,
+        help='Existing dataset path (to manifest, JSON or binary).',
+        )
+parser.add_argument(
+        '--new',
+        type=str,
+        required=True,
+        help='Path of the new manifest.',
+        )
+parser.add_argument(
+        '--format',
+        choices=['json', 'binary'],
+        default='binary',
+        help='Format of the new manifest (default: binary).',
+        )
+args = parser.parse_args()
+
+dr = dataset.DatasetReader.from_manifest(args.dataset)
+dr.save_to(args.new, binary=args.format == 'binary')
@@ -54,17 +54,114 @@ where a chunk object is
 and a file object is
 {
     "path": <path relative to the directory containing the manifest>,
-    "hash": "Hash of the content of the file. Format: sha256-<hex of hash>."
+    "hash": "Hash of the content of the file. Format: sha256-<hex of hash>.",
+    "blocks": <optional, block hashes, see below>,
+    "codec": <optional, name of the codec used to compress the file (see below)>,
+    "segment": <optional, [<offset>, <count>]>,
+    "rows": <optional, [<offset>, <count>]>
 }
+The hash may alternatively be a block hash (see DatasetWriter's
+merkle_block_size and rehash_dataset.py), which allows verifying parts of the
+file: "hash" is "blake2b-<hex of root hash>" and
+"blocks": {"size": <block size>, "digests": ["<hex of block hash>", ...]},
+where the content is split in blocks of <block size> bytes (the last one may be
+shorter), each block hash is the 32-bytes BLAKE2b digest of the block and the
+root hash is the 32-bytes BLAKE2b digest of <block size> (little-endian
+uint64) followed by the block hashes.
+If "segment" is present, the file is a segment file (as produced by
+pack_dataset.py), which packs the data of many chunks: the array of the chunk is
+made of the rows [offset, offset+count) of the array in the file, and the hash
+covers this array saved as a .npy file (that is, the hash of the file of the
+chunk before packing).
+If "rows" is present, the chunk data is the rows [offset, offset+count) of the
+array (count is equal to the nexec of the chunk), otherwise it is the whole
+array. This allows chunks to reference parts of files without copy (see
+DatasetReader.subset_rows). The hash covers the whole file (or segment).
+Since readers of version 1.0 ignore "segment" and "rows" (and would silently
+read the whole file), JSON manifests with such file objects have version "1.1".
+
+The manifest may also contain a "layouts" key, whose value is a
+{ "<field_name>": <layout object>, ... } object. A layout object describes an
+additional copy of the field, stored in sample-major order (as produced by
+transpose_dataset.py):
+{
+    "kind": "sample-major",
+    "nexec": <number of executions>,
+    "chunks": { <chunk name>: <index of the first execution of the chunk>, ...},
+    "files": [
+        {
+            "samples": [<first sample>, <end sample>],
+            "path": <path relative to the directory containing the manifest>,
+            "hash": "Hash of the content of the file. Format: sha256-<hex of hash>."
+        },
+        ...
+    ]
+}
+where each file contains a (<end sample>-<first sample>, nexec) array.
 
 The files containing the traces and the indata are .npy files [1].
 
+## Binary manifest
+
+For datasets with many chunks, the manifest may alternatively be stored in a
+binary format that is faster to load (auto-detected by
+DatasetReader.from_manifest, see convert_manifest.py). It is made of:
+- the magic string b"SIMPLE-DATASET-MANIFEST-BINARY\n",
+- the length of the header (little-endian uint64),
+- the header: the JSON manifest object (with version "1.1") without its
+  "chunks", with an additional "arrays" key: {<array name>: {"offset": <offset>, "dtype":
+  <dtype>, "shape": <shape>}, ...} (offsets are relative to the first
+  64-bytes-aligned position after the header),
+- the arrays, which describe the chunks (one entry per chunk):
+  - "chunk_names" and "nexec",
+  - "files/<field_name>/path" and "files/<field_name>/hash",
+  - "files/<field_name>/extra": optional, JSON-encoded other keys of the file
+    objects (empty when there is none),
+  - "chunk_extra": optional, JSON-encoded other keys of the chunk objects.
+The arrays are memory-mapped, and chunk objects are built on access.
+
 A design principle is that all information about the dataset (except the data
 itself) must be contained in the manifest, such that any processing pipeline
 may be configured (including buffer allocation) before reading the data.
 
 [1] https://numpy.org/devdocs/reference/generated/numpy.lib.format.html
 
+## Storage backends
+
+The manifest and the files are accessed through a storage backend:
+LocalStorage (files in the directory of the manifest, the default) or
+HTTPStorage (files served over HTTP, read with range requests, e.g., served by
+serve_dataset.py). DatasetReader.from_manifest selects HTTPStorage for http(s)
+URLs. Validation, statistics files and save_to require local storage.
+
+## Compressed files
+
+A file with a "codec" is not a .npy file but a compressed file made of:
+- a .npy header (magic string and header) describing the decoded array,
+- a .npy uint64 array of the sizes of the frames,
+- the frames, each of which is an independently encoded slice of rows of the
+  array.
+The hash of the file covers the stored (compressed) bytes. The available codecs
+are the keys of CODECS, see register_codec.
+
+## Statistics
+
+Per-sample statistics of the chunks (see DatasetReader.build_stats) are stored
+next to the manifest, in a stats_<field name>.npz file with the arrays:
+- "keys": identifies the data of each chunk: hash of the file (followed by
+  ":<offset>:<count>" if the file object has "rows"), such that the entries are
+  shared by all the manifests referencing the same files,
+- "n": number of traces,
+- "mean", "m2" (sum of the squared deviations from the mean), "min" and "max",
+  with shape (<number of entries>, <shape of the field>).
+
+## Header index
+
+The .npy headers of the uncompressed files (see DatasetReader.build_npy_index)
+may be stored next to the manifest, in a npy_index.json file:
+{"<hash of the file>": [<offset of the data>, <shape>, <fortran order>,
+<dtype descr>], ...}.
+
 
 # Partial datasets
 
@@ -72,12 +169,32 @@ A dataset may be partial, that is, some of the files listed in the manifest may
 not exist.
 """
 
+import asyncio
 import bisect
+import collections
+import collections.abc
+import contextlib
+from concurrent.futures import (
+        FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+        )
 import hashlib
+import http.client
 import itertools as it
+import io
 import json
+import lzma
+from multiprocessing import shared_memory
+import os
 import pathlib
 import copy
+import queue
+import ctypes
+import tempfile
+import threading
+import time
+import urllib.parse
+import warnings
+import zlib
 
 import numpy as np
 
@@ -90,32 +207,758 @@ class PartialDatasetError(DatasetError):
 class CorruptedDatasetError(DatasetError):
     pass
 
+# Chunk status in validation reports, by increasing severity.
+CHUNK_OK = 'ok'
+CHUNK_MISSING = 'missing'
+CHUNK_CORRUPTED = 'corrupted'
+_CHUNK_STATUS_SEVERITY = [CHUNK_OK, CHUNK_MISSING, CHUNK_CORRUPTED]
+
+class ValidationProgress(collections.namedtuple(
+    'ValidationProgress', ['nfiles', 'nfiles_total', 'nbytes', 'nbytes_total', 'elapsed']
+    )):
+    """Progress of a validation (elapsed time is in seconds)."""
+    @property
+    def throughput(self):
+        """Hashing throughput, in bytes/s."""
+        return self.nbytes / self.elapsed if self.elapsed > 0 else 0.0
+
+class SampleStats(collections.namedtuple('SampleStats', ['n', 'mean', 'm2', 'min', 'max'])):
+    """Per-sample statistics: number of traces, mean, sum of the squared
+    deviations from the mean, minimum and maximum."""
+    @property
+    def var(self):
+        return self.m2 / self.n
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+    @classmethod
+    def merge(cls, stats):
+        """Statistics of the union of the sets of traces of stats."""
+        stats = [st for st in stats if st.n > 0]
+        if not stats:
+            raise ValueError('No traces.')
+        n = np.array([st.n for st in stats])
+        means = np.stack([st.mean for st in stats])
+        total = int(n.sum())
+        mean = np.tensordot(n, means, axes=1) / total
+        dev = means - mean
+        m2 = sum(st.m2 for st in stats) + np.tensordot(n, dev*dev, axes=1)
+        return cls(
+                total,
+                mean,
+                m2,
+                np.min([st.min for st in stats], axis=0),
+                np.max([st.max for st in stats], axis=0),
+                )
+
+class HashCache:
+    """Persistent record of successful hash checks.
+
+    Entries are keyed by file path and are valid only as long as the size,
+    modification time and inode of the file are unchanged.
+    path: cache file (default: <user cache dir>/simple-dataset/hash_cache.json).
+    """
+    def __init__(self, path=None):
+        if path is None:
+            cache_dir = os.environ.get('XDG_CACHE_HOME') or pathlib.Path.home() / '.cache'
+            path = pathlib.Path(cache_dir) / 'simple-dataset' / 'hash_cache.json'
+        self.path = pathlib.Path(path)
+        self._entries = self._load()
+        self._new_entries = dict()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return dict()
+
+    @staticmethod
+    def _identity(stat):
+        return dict(size=stat.st_size, mtime_ns=stat.st_mtime_ns, ino=stat.st_ino)
+
+    def lookup(self, path, stat):
+        """Hash of the file at path, if it was recorded and the file (whose
+        os.stat result is stat) did not change since then, otherwise None."""
+        entry = self._entries.get(str(path))
+        if entry is None or {k: entry.get(k) for k in ('size', 'mtime_ns', 'ino')} != self._identity(stat):
+            return None
+        return entry['hash']
+
+    def record(self, path, stat, h):
+        """Record that the file at path had hash h when its os.stat was stat."""
+        entry = dict(self._identity(stat), hash=h)
+        self._entries[str(path)] = entry
+        self._new_entries[str(path)] = entry
+
+    def save(self):
+        """Merge the new records in the cache file."""
+        if not self._new_entries:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Merge with the current content, in case of concurrent updates, and
+        # atomically replace the file.
+        with _file_lock(self.path.with_name(self.path.name + '.lock')):
+            entries = self._load()
+            entries.update(self._new_entries)
+            fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name)
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(entries, f)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        self._entries = entries
+        self._new_entries = dict()
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """Exclusive lock (between processes) on the file at path, which is
+    created if needed (with fcntl, or msvcrt on Windows)."""
+    try:
+        import fcntl
+    except ImportError:
+        fcntl = None
+        import msvcrt
+    with open(path, 'a+') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+            return
+        # Lock the first byte (LK_LOCK gives up after 10 seconds).
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                break
+            except OSError:
+                pass
+        try:
+            yield
+        finally:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _read_npy_header(f):
+    """(shape, fortran_order, dtype) of the .npy file f, which is then
+    positioned at the start of the data (None if the version is not
+    supported)."""
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        return np.lib.format.read_array_header_1_0(f)
+    elif version == (2, 0):
+        return np.lib.format.read_array_header_2_0(f)
+    return None
+
+def _npy_index_entry(path):
+    """npy_index entry of the .npy file at path (None if its version is not
+    supported)."""
+    with open(path, 'rb') as f:
+        header = _read_npy_header(f)
+        if header is None:
+            return None
+        shape, fortran_order, dtype = header
+        return (f.tell(), tuple(shape), fortran_order, dtype)
+
+def _try_npy_index_entry(path):
+    try:
+        return _npy_index_entry(path)
+    except OSError:
+        return None
+
+def _open_memmap(path, header):
+    offset, shape, fortran_order, dtype = header
+    if int(np.prod(shape)) == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(
+            path, dtype=dtype, mode='r', offset=offset, shape=shape,
+            order='F' if fortran_order else 'C',
+            )
+
+def _read_npy_index(path):
+    try:
+        with open(path, 'r') as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        return dict()
+    except (OSError, ValueError) as e:
+        warnings.warn(f'Could not read header index {path}: {e}')
+        return dict()
+    return {
+            h: (offset, tuple(shape), fortran_order, np.lib.format.descr_to_dtype(descr))
+            for h, (offset, shape, fortran_order, descr) in entries.items()
+            }
+
+def _write_npy_index(path, index):
+    """Atomically write a header index file."""
+    entries = {
+            h: [offset, list(shape), fortran_order, np.lib.format.dtype_to_descr(dtype)]
+            for h, (offset, shape, fortran_order, dtype) in index.items()
+            }
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+class _MemmapPool:
+    """LRU pool of at most maxsize open files: memory-mapped arrays (keyed by
+    path) and _NpyFile objects (keyed by (path, 'file')).
+
+    The evicted files remain open as long as they are referenced.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._arrays = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Memory mappings are not sent to other processes.
+        return dict(maxsize=self.maxsize)
+
+    def __setstate__(self, state):
+        self.__init__(state['maxsize'])
+
+    def get(self, path, open_array):
+        """Array for path, opened with open_array() if not in the pool."""
+        with self._lock:
+            array = self._arrays.get(path)
+            if array is not None:
+                self._arrays.move_to_end(path)
+                return array
+        array = open_array()
+        with self._lock:
+            self._arrays[path] = array
+            self._arrays.move_to_end(path)
+            while len(self._arrays) > self.maxsize:
+                # The arrays still referenced remain valid.
+                self._arrays.popitem(last=False)
+        return array
+
+class _NpyFile:
+    """Open .npy file, whose rows are read with readinto (by multiple
+    threads), such that reading into a buffer needs no memory mapping.
+
+    header: npy_index entry of the file (parsed from the file if None).
+    """
+    def __init__(self, path, header=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._open()
+        if header is None:
+            npy_header = _read_npy_header(self._f)
+            header = None if npy_header is None else (self._f.tell(), *npy_header)
+        self.header = header
+
+    def _open(self):
+        self._f = open(self.path, 'rb', buffering=0)
+        # The file position is shared with forked processes.
+        self._pid = os.getpid()
+
+    def readinto_rows(self, row, out):
+        """Read the rows [row, row+len(out)) into the C-contiguous array out.
+        Returns False if the file cannot be read this way."""
+        if self.header is None:
+            return False
+        offset, shape, fortran_order, dtype = self.header
+        if fortran_order or dtype != out.dtype or tuple(shape[1:]) != out.shape[1:]:
+            return False
+        if row + out.shape[0] > shape[0]:
+            raise CorruptedDatasetError(f'Not enough rows in {self.path}.')
+        if out.size == 0:
+            return True
+        view = memoryview(out).cast('B')
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            self._f.seek(offset + row * (out.nbytes // max(1, out.shape[0])))
+            pos = 0
+            while pos < len(view):
+                n = self._f.readinto(view[pos:])
+                if not n:
+                    raise CorruptedDatasetError(f'Truncated file {self.path}.')
+                pos += n
+        return True
+
+class _ThreadPool:
+    """Thread pool created on first use, and re-created in forked processes
+    (it is not sent to other processes)."""
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return dict(max_workers=self.max_workers)
+
+    def __setstate__(self, state):
+        self.__init__(state['max_workers'])
+
+    def get(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+                self._pid = os.getpid()
+            return self._executor
+
+class LocalStorage:
+    """Storage backend for files in the directory base_path."""
+    def __init__(self, base_path):
+        self.base_path = pathlib.Path(base_path)
+
+    def local_path(self, path):
+        """Path of the file on the local filesystem (None if not local)."""
+        return self.base_path / path
+
+    def open(self, path):
+        """Binary file object (read-only)."""
+        return open(self.base_path / path, 'rb')
+
+    def read(self, path):
+        with self.open(path) as f:
+            return f.read()
+
+    def read_ranges(self, path, ranges):
+        """Contents of the byte ranges [(<offset>, <size>), ...] of a file."""
+        res = []
+        with self.open(path) as f:
+            for offset, size in ranges:
+                f.seek(offset)
+                data = f.read(size)
+                if len(data) != size:
+                    raise CorruptedDatasetError(f'Truncated file {path}.')
+                res.append(data)
+        return res
+
+    def size(self, path):
+        return os.stat(self.base_path / path).st_size
+
+    def exists(self, path):
+        return (self.base_path / path).exists()
+
+class HTTPStorage:
+    """Storage backend for files served over HTTP(S) under base_url (e.g., by
+    serve_dataset.py), read with range requests.
+
+    At most nconnections requests run in parallel (on persistent connections),
+    and large ranges are fetched as parallel requests of at most part_size
+    bytes. The file objects returned by open read ahead by read_ahead bytes.
+    If the server ignores range requests (it answers with the whole file),
+    whole files are fetched with a single request instead, and the last one is
+    kept in memory.
+    """
+    def __init__(self, base_url, nconnections=8, part_size=2**22, read_ahead=2**16, timeout=60):
+        if not base_url.endswith('/'):
+            base_url += '/'
+        url = urllib.parse.urlsplit(base_url)
+        if url.scheme not in ('http', 'https'):
+            raise ValueError(f'Not an HTTP URL: {base_url}.')
+        self.base_url = base_url
+        self.nconnections = nconnections
+        self.part_size = part_size
+        self.read_ahead = read_ahead
+        self.timeout = timeout
+        # Whether the server supports range requests (None: not known yet).
+        self._ranges = None
+        self._init_pool()
+
+    def _init_pool(self):
+        # Idle connections.
+        self._connections = queue.LifoQueue()
+        self._executor = ThreadPoolExecutor(max_workers=self.nconnections)
+        # (<path>, <future of the content>) of the last whole file fetched (or
+        # None), see _read_whole.
+        self._whole = None
+        self._whole_lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        # Connections and threads are not usable in a forked process.
+        if self._pid != os.getpid():
+            self._init_pool()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_connections'], state['_executor'], state['_pid']
+        del state['_whole'], state['_whole_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_pool()
+
+    def _new_connection(self):
+        url = urllib.parse.urlsplit(self.base_url)
+        if url.scheme == 'https':
+            return http.client.HTTPSConnection(url.netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(url.netloc, timeout=self.timeout)
+
+    def _request(self, method, path, headers=None):
+        """Returns (<status>, <response>, <body>)."""
+        self._check_fork()
+        url_path = urllib.parse.urlsplit(self.base_url).path + urllib.parse.quote(str(path))
+        for attempt in range(2):
+            try:
+                conn = self._connections.get_nowait()
+                reused = True
+            except queue.Empty:
+                conn = self._new_connection()
+                reused = False
+            try:
+                conn.request(method, url_path, headers=headers or dict())
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                # The server may have closed an idle connection.
+                if reused and attempt == 0:
+                    continue
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self._connections.put(conn)
+            if response.status == 404:
+                raise FileNotFoundError(f'{self.base_url}{path}')
+            return response.status, response, body
+
+    def local_path(self, path):
+        return None
+
+    def open(self, path):
+        return io.BufferedReader(_HTTPRawFile(self, path), buffer_size=self.read_ahead)
+
+    def read(self, path):
+        status, _, body = self._request('GET', path)
+        if status != 200:
+            raise DatasetError(f'HTTP error {status} for {self.base_url}{path}.')
+        return body
+
+    def _read_whole(self, path, body=None):
+        """Content of the file at path, for servers that do not support range
+        requests. The last file is kept, such that reading its parts (possibly
+        concurrently) fetches it once. body: content just fetched, if any."""
+        with self._whole_lock:
+            if self._whole is not None and self._whole[0] == path:
+                future = self._whole[1]
+                owner = False
+            else:
+                future = Future()
+                self._whole = (path, future)
+                owner = True
+        if owner:
+            try:
+                future.set_result(self.read(path) if body is None else body)
+            except BaseException as e:
+                future.set_exception(e)
+                with self._whole_lock:
+                    if self._whole is not None and self._whole[1] is future:
+                        self._whole = None
+                raise
+        return future.result()
+
+    def _read_range(self, path, offset, size):
+        self._check_fork()
+        if self._ranges is False:
+            return self._read_whole(path)[offset:offset+size]
+        status, _, body = self._request('GET', path, {'Range': f'bytes={offset}-{offset+size-1}'})
+        if status == 200:
+            # The server does not support range requests.
+            self._ranges = False
+            return self._read_whole(path, body)[offset:offset+size]
+        elif status == 416:
+            return b''
+        elif status != 206:
+            raise DatasetError(f'HTTP error {status} for {self.base_url}{path}.')
+        self._ranges = True
+        return body
+
+    def read_ranges(self, path, ranges):
+        self._check_fork()
+        res = [bytearray(size) for _, size in ranges]
+        def fetch(i, offset, size):
+            data = self._read_range(path, offset, size)
+            if len(data) != size:
+                raise CorruptedDatasetError(f'Truncated file {path}.')
+            start = offset - ranges[i][0]
+            res[i][start:start+size] = data
+        parts = [
+                (i, part_offset, min(self.part_size, offset+size-part_offset))
+                for i, (offset, size) in enumerate(ranges)
+                for part_offset in range(offset, offset+size, self.part_size)
+                ]
+        if self._ranges is None and parts:
+            # Find out whether the server supports range requests before
+            # sending parallel requests (otherwise, the parts are taken from
+            # the whole file, see _read_whole).
+            fetch(*parts.pop(0))
+        for future in [self._executor.submit(fetch, *part) for part in parts]:
+            future.result()
+        return res
+
+    def size(self, path):
+        status, response, _ = self._request('HEAD', path)
+        if status != 200:
+            raise DatasetError(f'HTTP error {status} for {self.base_url}{path}.')
+        return int(response.getheader('Content-Length'))
+
+    def exists(self, path):
+        try:
+            return self._request('HEAD', path)[0] == 200
+        except FileNotFoundError:
+            return False
+
+class _HTTPRawFile(io.RawIOBase):
+    def __init__(self, storage, path):
+        self._storage = storage
+        self._path = path
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        if len(b) == 0:
+            return 0
+        data = self._storage._read_range(self._path, self._pos, len(b))
+        b[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._storage.size(self._path)
+        self._pos = offset
+        return offset
+
+    def tell(self):
+        return self._pos
+
+class ChunkCache:
+    """Local copy of dataset files (e.g., on a local SSD for datasets on network
+    storage).
+
+    The files are copied in the directory path on first access, and their hash
+    is checked while copying. They are stored by hash, such that a cache can be
+    shared by multiple datasets (and by multiple processes).
+    The least recently used files are evicted when the cache exceeds max_bytes,
+    except those used in the last grace seconds (which may be in use by
+    another process): the cache may therefore exceed max_bytes while its
+    files are younger than grace.
+
+    The total size of the cached files (including the files being copied) is
+    recorded in the file .total, such that the directory is scanned only when
+    files must be evicted. The cache lock is held only while reserving space
+    for a file (and evicting), not while copying it: a file fetched by
+    multiple processes at the same time may be copied by each of them.
+    """
+    def __init__(self, path, max_bytes, grace=60):
+        self.path = pathlib.Path(path)
+        self.max_bytes = max_bytes
+        self.grace = grace
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def fetch(self, storage, file):
+        """Path of the local copy of the file (file object) in storage (see
+        LocalStorage)."""
+        path = file['path']
+        hex_hash = hash_hex(file['hash'])
+        local_path = self.path / hex_hash
+        try:
+            # Mark as recently used.
+            os.utime(local_path)
+            return local_path
+        except FileNotFoundError:
+            pass
+        nbytes = storage.size(path)
+        # Reserve the space under the lock, such that concurrent copies do not
+        # exceed max_bytes together. The temporary file name records the
+        # reservation (see _evict).
+        with _file_lock(self.path / '.lock'):
+            if local_path.exists():
+                # Copied by another process in the meantime.
+                os.utime(local_path)
+                return local_path
+            total = self._evict(nbytes)
+            self._write_total(total + nbytes)
+            fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix=f'.tmp-{nbytes}-')
+        try:
+            with os.fdopen(fd, 'wb') as f, storage.open(path) as src:
+                hf = _HashingWriter(f, new_hasher(file))
+                while data := src.read(2**20):
+                    hf.write(data)
+            if hf.hexdigest() != hex_hash:
+                raise CorruptedDatasetError(f'Hash mismatch for {path}.')
+        except BaseException:
+            with _file_lock(self.path / '.lock'):
+                os.unlink(tmp_path)
+                self._release(nbytes)
+            raise
+        with _file_lock(self.path / '.lock'):
+            if local_path.exists():
+                # Also copied by another process.
+                os.unlink(tmp_path)
+                self._release(nbytes)
+            else:
+                os.replace(tmp_path, local_path)
+        return local_path
+
+    def _read_total(self):
+        try:
+            return int((self.path / '.total').read_text())
+        except (OSError, ValueError):
+            return None
+
+    def _write_total(self, total):
+        (self.path / '.total').write_text(str(total))
+
+    def _release(self, nbytes):
+        """Cancel the reservation of nbytes for a file that is not added. The
+        lock must be held."""
+        total = self._read_total()
+        if total is not None:
+            self._write_total(max(0, total - nbytes))
+
+    def _evict(self, nbytes):
+        """Evict files such that nbytes can be added without exceeding
+        max_bytes (as far as possible). Returns the total size of the
+        remaining files and of the files being copied. The lock must be
+        held."""
+        total = self._read_total()
+        if total is not None and total + nbytes <= self.max_bytes:
+            return total
+        entries = []
+        reserved = 0
+        for path in self.path.iterdir():
+            if path.name.startswith('.tmp-'):
+                # Being copied: .tmp-<reserved size>-<random>.
+                size = path.name.split('-')[1]
+                reserved += int(size) if size.isdigit() else 0
+            if path.name.startswith('.'):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = reserved + sum(size for _, size, _ in entries)
+        now = time.time()
+        for mtime, size, path in entries:
+            if total + nbytes <= self.max_bytes or now - mtime < self.grace:
+                break
+            # Processes which opened the file can still read it.
+            path.unlink(missing_ok=True)
+            total -= size
+        self._write_total(total)
+        return total
+
 class DatasetReader:
-    def __init__(self, dataset_id, metadata, chunks, fields, base_path):
+    # Maximum number of files (memory-mapped or read with readinto) kept open.
+    max_open_files = 64
+
+    def __init__(
+            self, dataset_id, metadata, chunks, fields, base_path, layouts=None, cache=None,
+            storage=None,
+            ):
         self.id = dataset_id
         self.metadata = metadata
+        # {<chunk name>: <chunk object>} (a read-only mapping for binary manifests)
         self.chunks = chunks
         self.fields = fields
         self.base_path = base_path
-        self.cum_nexec = list(it.accumulate([0] + [chunk['nexec'] for chunk in self.chunks.values()]))
-        self.chunk_name_list = list(self.chunks)
-        self.chunk_list = list(self.chunks.values())
+        # {<field_name>: <layout object>}, alternative storage of some fields.
+        self.layouts = dict() if layouts is None else layouts
+        # ChunkCache (or None) from which the files are read.
+        self.cache = cache
+        # Storage backend of the files (base_path is None if not local).
+        self.storage = LocalStorage(base_path) if storage is None else storage
+        if isinstance(chunks, _IndexedChunks):
+            nexecs = chunks.nexecs()
+        else:
+            nexecs = [chunk['nexec'] for chunk in self.chunks.values()]
+        self.cum_nexec = list(it.accumulate([0] + nexecs))
+        # Built on first access (see chunk_name_list and chunk_list).
+        self._chunk_name_list = None
+        self._chunk_list = None
+        # .npy headers of the files: {<hash>: (<data offset>, <shape>,
+        # <fortran order>, <dtype>)} (see build_npy_index).
+        self.npy_index = dict()
+        # Open files (LRU).
+        self._memmaps = _MemmapPool(self.max_open_files)
+        # Threads decoding the frames of compressed files.
+        self._decoders = _ThreadPool()
+
+    def _share_files(self, other):
+        """Share the header index, the open files and the decoding threads of
+        other (a reader of the same dataset)."""
+        self.npy_index = other.npy_index
+        self._memmaps = other._memmaps
+        self._decoders = other._decoders
+        return self
+
+    @property
+    def chunk_name_list(self):
+        if self._chunk_name_list is None:
+            self._chunk_name_list = list(self.chunks)
+        return self._chunk_name_list
+
+    @property
+    def chunk_list(self):
+        if self._chunk_list is None:
+            self._chunk_list = list(self.chunks.values())
+        return self._chunk_list
 
     def __len__(self):
         return self.cum_nexec[-1]
 
     @classmethod
-    def from_manifest(cls, manifest_path, base_path=None,perm_seed=None):
-        with open(manifest_path, 'r') as f:
-            manifest = json.load(f)
+    def from_manifest(
+            cls, manifest_path, base_path=None,perm_seed=None, cache=None, storage=None,
+            ):
+        """Open a dataset from a (JSON or binary) manifest file.
+
+        manifest_path may be an http(s) URL (see HTTPStorage).
+        cache: ChunkCache used when reading the files.
+        storage: storage backend of the dataset (e.g., HTTPStorage), in which
+        case manifest_path is relative to it.
+        """
+        if storage is None and str(manifest_path).startswith(('http://', 'https://')):
+            base_url, _, manifest_path = str(manifest_path).rpartition('/')
+            storage = HTTPStorage(base_url)
+        if storage is not None:
+            data = storage.read(manifest_path)
+            binary = data.startswith(_BINARY_MANIFEST_MAGIC)
+            manifest = _read_binary_manifest(data) if binary else json.loads(data)
+            base_path = getattr(storage, 'base_path', None)
+        else:
+            with open(manifest_path, 'rb') as f:
+                binary = f.read(len(_BINARY_MANIFEST_MAGIC)) == _BINARY_MANIFEST_MAGIC
+            if binary:
+                manifest = _read_binary_manifest(manifest_path)
+            else:
+                with open(manifest_path, 'r') as f:
+                    manifest = json.load(f)
+            if base_path is None:
+                base_path = pathlib.Path(manifest_path).resolve().parent
+            else:
+                base_path = pathlib.Path(base_path).resolve()
         if manifest.get('about') != 'SIMPLE-DATASET-MANIFEST':
             raise DatasetError('Manifest file does not have SIMPLE-DATASET-MANIFEST marker.')
-        if base_path is None:
-            base_path = pathlib.Path(manifest_path).resolve().parent
-        else:
-            base_path = pathlib.Path(base_path).resolve()
         try:
-            if manifest['version'] != '1.0':
+            if manifest['version'] not in _MANIFEST_VERSIONS:
                 raise DatasetError(f'Unknown manifest version {manifest["version"]}.')
             dataset_id = manifest['id']
             metadata = manifest['metadata']
@@ -126,58 +969,526 @@ class DatasetReader:
                 rs = np.random.RandomState(seed=perm_seed)
                 manifest_keys = list(manifest['chunks'].keys())
                 random_keys = rs.permutation(manifest_keys)
-                chunks = {k:manifest['chunks'][k] for k in random_keys}
+                if binary:
+                    chunks = manifest['chunks'].reorder(random_keys)
+                else:
+                    chunks = {k:manifest['chunks'][k] for k in random_keys}
             fields = {
                     f_name: { "shape": f["shape"], "dtype": np.dtype(f["dtype"]) }
                     for f_name, f in manifest['fields'].items()
                     }
+            layouts = manifest.get('layouts', dict())
+            if any(l['kind'] != 'sample-major' for l in layouts.values()):
+                raise DatasetError('Unknown field layout.')
         except KeyError as e:
             raise DatasetError("Badly-formed manifest.") from e
         else:
-            return cls(dataset_id, metadata, chunks, fields, base_path)
+            return cls(dataset_id, metadata, chunks, fields, base_path, layouts, cache, storage)
 
     def _chunk_paths(self, chunk_name):
+        if self.base_path is None:
+            raise DatasetError('Not supported for datasets without local storage.')
         chunk = self.chunks[chunk_name]
         return {f: self.base_path / p['path'] for f, p in chunk['files'].items()}
 
+    def _read_path(self, file):
+        """Local path from which the file (a file object) is read, None if
+        the storage is not local and there is no cache."""
+        if self.cache is None or 'segment' in file:
+            # Segment files are not cached (their hash is not the file hash).
+            return self.storage.local_path(file['path'])
+        return self.cache.fetch(self.storage, file)
+
+    def _memmap(self, path, h=None):
+        """Memory-mapped array of the (local) .npy file at path, whose hash
+        is h (used to look up its header in npy_index)."""
+        def open_array():
+            header = self.npy_index.get(h) if h is not None else None
+            if header is None:
+                header = _npy_index_entry(path)
+                if header is None:
+                    return np.load(path, mmap_mode='r')
+                if h is not None:
+                    self.npy_index[h] = header
+            return _open_memmap(path, header)
+        return self._memmaps.get(path, open_array)
+
+    def _npy_file(self, path, h=None):
+        """_NpyFile of the (local) .npy file at path, whose hash is h (used to
+        look up its header in npy_index)."""
+        header = self.npy_index.get(h) if h is not None else None
+        return self._memmaps.get((path, 'file'), lambda: _NpyFile(path, header))
+
+    def npy_index_path(self):
+        if self.base_path is None:
+            raise DatasetError('The header index requires local storage.')
+        return self.base_path / 'npy_index.json'
+
+    def build_npy_index(self, nthreads=None, save=False):
+        """Read the .npy headers of the uncompressed files (which are not yet in
+        npy_index) using nthreads threads, such that loading the chunks does
+        not parse them.
+
+        save: merge npy_index in the index file (see load_npy_index).
+        Missing files are ignored.
+        """
+        paths = {
+                file['hash']: self.base_path / file['path']
+                for chunk in self.chunks.values()
+                for file in chunk['files'].values()
+                if 'codec' not in file and 'segment' not in file
+                and file['hash'] not in self.npy_index
+                }
+        index_path = self.npy_index_path()
+        with ThreadPoolExecutor(max_workers=nthreads) as executor:
+            headers = executor.map(_try_npy_index_entry, paths.values())
+            for h, header in zip(paths, headers):
+                if header is not None:
+                    self.npy_index[h] = header
+        if save:
+            _write_npy_index(index_path, dict(_read_npy_index(index_path), **self.npy_index))
+
+    def load_npy_index(self):
+        """Add the entries of the index file (see build_npy_index) to
+        npy_index."""
+        self.npy_index.update(_read_npy_index(self.npy_index_path()))
+
+    def hash_stream(self, field, file, storage, path):
+        """Returns (<stream>, <data start>), where the stream (<prefix>,
+        <offset>, <size>) describes the hashed content of the file object
+        (prefix followed by the bytes [offset, offset+size) of the file at path
+        in storage), and the rows of the array start at <data start> in it."""
+        with storage.open(path) as f:
+            header = _read_npy_header(f) if 'codec' not in file else None
+            data_offset = f.tell()
+        if 'segment' not in file:
+            return (b'', 0, storage.size(path)), data_offset
+        if header is None:
+            raise DatasetError(f'Unsupported .npy file {path}.')
+        offset, count = file['segment']
+        dtype = np.dtype(self.fields[field]['dtype'])
+        shape = (count, *self.fields[field]['shape'])
+        row_nbytes = dtype.itemsize * int(np.prod(shape[1:]))
+        prefix = npy_header(dtype, shape)
+        return (prefix, data_offset + offset*row_nbytes, count*row_nbytes), len(prefix)
+
+    def _hash_range(self, field, file):
+        """For a file of a packed chunk (see "segment"), (<header>, <offset>,
+        <size>) such that the hash of the file object (of the field) is the
+        hash of <header> followed by the bytes [offset, offset+size) of the
+        local file (see hash_stream), otherwise None."""
+        if 'segment' not in file:
+            return None
+        stream, _ = self.hash_stream(field, file, LocalStorage(self.base_path), file['path'])
+        return stream
+
     def chunk_exists(self, chunk_name):
-        return all(path.exists() for path in self._chunk_paths(chunk_name).values())
+        files = self.chunks[chunk_name]['files']
+        return all(self.storage.exists(file['path']) for file in files.values())
 
     def is_partial(self):
         return any(not self.chunk_exists(chunk_name) for chunk_name in self.chunks)
 
+    def _file_hash(self, chunk_name, field):
+        """Hex of the hash (or root hash) of a file."""
+        return hash_hex(self.chunks[chunk_name]['files'][field]['hash'])
+
     def validate_chunk(self, chunk_name, allow_missing=False):
         if allow_missing and not self.chunk_exists(chunk_name):
             return
         for f, path in self._chunk_paths(chunk_name).items():
-            hash_scheme = 'sha256-'
-            h = self.chunks[chunk_name]['files'][f]['hash'].partition(hash_scheme)
-            if h[:2] != ('', hash_scheme):
-                raise DatasetError('Hash not SHA256.')
+            h = self._file_hash(chunk_name, f)
             try:
-                if _sha256sum(path) != h[2]:
-                    raise CorruptedDatasetError('Hash mismatch.')
+                hash_range = self._hash_range(f, self.chunks[chunk_name]['files'][f])
             except OSError as e:
                 raise PartialDatasetError(f'chunk {chunk_name}') from e
+            tasks, combine = hash_tasks(path, hash_range, self.chunks[chunk_name]['files'][f])
+            res = combine([task(*args) for task, args in tasks])
+            if res is None:
+                raise PartialDatasetError(f'chunk {chunk_name}')
+            elif res != h:
+                raise CorruptedDatasetError('Hash mismatch.')
+
+    def validate(
+            self,
+            allow_missing=True,
+            nproc=1,
+            journal=None,
+            progress=None,
+            hash_cache=None,
+            paranoid=False,
+            ):
+        """Validate all the chunks, see validation_report for the parameters.
+
+        Raises CorruptedDatasetError if some file is corrupted, and
+        PartialDatasetError if some file is missing (unless allow_missing).
+        """
+        report = self.validation_report(
+                nproc=nproc,
+                journal=journal,
+                progress=progress,
+                hash_cache=hash_cache,
+                paranoid=paranoid,
+                )
+        corrupted = [cn for cn, status in report.items() if status == CHUNK_CORRUPTED]
+        if corrupted:
+            raise CorruptedDatasetError(f'Hash mismatch in chunks {corrupted}.')
+        missing = [cn for cn, status in report.items() if status == CHUNK_MISSING]
+        if missing and not allow_missing:
+            raise PartialDatasetError(f'Missing chunks {missing}.')
 
-    def validate(self, allow_missing=True):
-        for chunk_name in self.chunks:
-            self.validate_chunk(chunk_name, allow_missing)
+    def validation_report(
+            self,
+            nproc=1,
+            journal=None,
+            progress=None,
+            hash_cache=None,
+            paranoid=False,
+            ):
+        """Check the hashes of all the files of the dataset in a single pass.
 
-    def load_chunk(self, chunk_name, mmap_mode=None, fields=None):
+        Returns {<chunk name>: CHUNK_OK | CHUNK_MISSING | CHUNK_CORRUPTED}, with
+        also an entry "layout:<field name>" for the files of each layout (see
+        module doc).
+
+        nproc: number of hashing processes (None: number of CPUs), files are
+        hashed in the current process if nproc == 1 (the default).
+        journal: path of a file where the result of each file check is
+        appended. The files already checked in the journal (e.g. by an
+        interrupted validation) are not hashed again, unless their size or
+        modification time changed.
+        progress: callable, called with a ValidationProgress after each file.
+        hash_cache: HashCache (default: None, no cache).
+        The files whose successful check is recorded in the cache and which did
+        not change since then are not hashed again.
+        paranoid: hash all the files, ignoring the journal and the cache (the
+        results are still recorded in them).
+        """
+        if journal is not None and not paranoid:
+            journal_entries = _read_journal(journal)
+        else:
+            journal_entries = dict()
+        if self.base_path is None:
+            raise DatasetError('Not supported for datasets without local storage.')
+        # [(<report entry>, [(<field name>, <file object>), ...]), ...]
+        entries = [(cn, list(chunk['files'].items())) for cn, chunk in self.chunks.items()]
+        entries += [
+                (f'layout:{field}', [(field, file) for file in layout['files']])
+                for field, layout in self.layouts.items()
+                ]
+        report = dict()
+        to_check = []
+        for name, files in entries:
+            paths = [self.base_path / file['path'] for _, file in files]
+            try:
+                # The stat must be taken before hashing: a file modified while
+                # being hashed must not be recorded as valid.
+                stats = [path.stat() for path in paths]
+                hash_ranges = [self._hash_range(f, file) for f, file in files]
+            except OSError:
+                report[name] = CHUNK_MISSING
+                continue
+            report[name] = CHUNK_OK
+            for (f, file), path, stat, hash_range in zip(files, paths, stats, hash_ranges):
+                exp_h = hash_hex(file['hash'])
+                # Files of packed chunks are identified by their rows.
+                key = str(path) if hash_range is None else '{}:{}:{}'.format(path, *file['segment'])
+                ok = journal_entries.get((key, exp_h, stat.st_size, stat.st_mtime_ns))
+                if ok is None and hash_cache and not paranoid:
+                    ok = hash_cache.lookup(key, stat) == exp_h or None
+                if ok is None:
+                    size = stat.st_size if hash_range is None else hash_range[2]
+                    tasks = hash_tasks(path, hash_range, file)
+                    to_check.append((name, exp_h, key, stat, size, tasks))
+                elif not ok:
+                    report[name] = CHUNK_CORRUPTED
+        nbytes_total = sum(size for *_, size, _ in to_check)
+        nbytes = 0
+        start_time = time.monotonic()
+        executor = None
+        journal_file = None
+        try:
+            if journal is not None:
+                journal_file = open(journal, 'a')
+            # Block hashes are computed by multiple tasks.
+            if nproc == 1:
+                results = (
+                        combine([task(*args) for task, args in tasks])
+                        for *_, (tasks, combine) in to_check
+                        )
+            else:
+                executor = ProcessPoolExecutor(max_workers=nproc)
+                futures = [
+                        ([executor.submit(task, *args) for task, args in tasks], combine)
+                        for *_, (tasks, combine) in to_check
+                        ]
+                results = (combine([f.result() for f in fs]) for fs, combine in futures)
+            for i, (h, (name, exp_h, key, stat, size, _)) in enumerate(zip(results, to_check)):
+                if h is None:
+                    status = CHUNK_MISSING
+                else:
+                    status = CHUNK_OK if h == exp_h else CHUNK_CORRUPTED
+                    if status == CHUNK_OK and hash_cache:
+                        hash_cache.record(key, stat, h)
+                    if journal_file is not None:
+                        journal_file.write(json.dumps(dict(
+                            path=key, hash=exp_h, size=stat.st_size, mtime_ns=stat.st_mtime_ns,
+                            ok=status == CHUNK_OK,
+                            )) + '\n')
+                        journal_file.flush()
+                report[name] = max(report[name], status, key=_CHUNK_STATUS_SEVERITY.index)
+                nbytes += size
+                if progress is not None:
+                    progress(ValidationProgress(
+                        i+1, len(to_check), nbytes, nbytes_total, time.monotonic()-start_time
+                        ))
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            if journal_file is not None:
+                journal_file.close()
+            if hash_cache:
+                try:
+                    hash_cache.save()
+                except OSError as e:
+                    warnings.warn(f'Could not save hash cache {hash_cache.path}: {e}')
+        return report
+
+    def load_chunk(self, chunk_name, mmap_mode=None, fields=None, start=0, stop=None):
         """Load a dataset chunk.
         Returns {'traces': <trace array>, 'indata': <indata array>}.
 
         mmap_mode: see [1], default: None, you may get better performance using 'r'.
+        Compressed files are decoded (using multiple threads) in memory.
+        start, stop: load only the rows [start, stop) of the chunk (only the
+        frames containing them are decoded for compressed files).
         [1] https://numpy.org/doc/stable/reference/generated/numpy.memmap.html
         """
-        return {
-                f: np.load(path, mmap_mode=mmap_mode)
-                for f, path in self._chunk_paths(chunk_name).items()
+        return self._load_rows(chunk_name, fields, start, stop, mmap_mode=mmap_mode)
+
+    def _load_rows(self, chunk_name, fields=None, start=0, stop=None, mmap_mode=None):
+        """Rows [start, stop) of the arrays of a chunk (see load_chunk)."""
+        files = {
+                f: file for f, file in self.chunks[chunk_name]['files'].items()
                 if fields is None or f in fields
                 }
+        executor = None
+        if any('codec' in file for file in files.values()):
+            executor = self._decoders.get()
+        return {f: self._load_file(file, mmap_mode, executor, start, stop) for f, file in files.items()}
+
+    def _load_file(self, file, mmap_mode=None, executor=None, start=0, stop=None):
+        """Rows [start, stop) of the array of a file object. Files which are
+        not local are read in RAM, and so are compressed files (decoded using
+        executor)."""
+        first_row, nrows = _file_rows(file)
+        if nrows is not None:
+            stop = nrows if stop is None else stop
+        start, stop = first_row + start, None if stop is None else first_row + stop
+        local_path = self._read_path(file)
+        if 'codec' not in file and local_path is not None and mmap_mode in (None, 'r'):
+            # Segment files are not in npy_index (their hash is not the file hash).
+            array = self._memmap(local_path, None if 'segment' in file else file['hash'])
+            array = array[start:stop]
+            return np.array(array) if mmap_mode is None else array
+        storage, path = self.file_storage(file, local_path)
+        if 'codec' in file:
+            return _load_encoded(storage, path, file['codec'], executor, start, stop)
+        elif local_path is None:
+            return _load_remote_npy(storage, path, start, stop)
+        return _load_npy(local_path, mmap_mode, start, stop)
+
+    def file_storage(self, file, local_path=None):
+        """(<storage>, <path in storage>) from which a file object is read."""
+        if local_path is None:
+            local_path = self._read_path(file)
+        if local_path is None:
+            return self.storage, file['path']
+        return LocalStorage(local_path.parent), local_path.name
+
+    def iter_ntraces(
+            self,
+            max_ntraces=None,
+            start_trace=0,
+            fields=None,
+            max_chunk_size=None,
+            prefetch=None,
+            prefetch_workers=1,
+            samples=None,
+            buffers=None,
+            verify=False,
+            lazy=False,
+            ):
+        """Iterate over (at most) max_ntraces traces, starting at start_trace.
+
+        Each item is a {<field_name>: <array>} dict, whose arrays have at most
+        max_chunk_size rows.
+
+        samples: if not None, only these samples of the traces are read, and
+        the 'traces' arrays are compact (contiguous) arrays of these samples.
+        It may be a slice, a list of (start, stop) windows or an array of
+        sample indices. The traces are always read from the chunk files: the
+        sample-major layout is only used by read_samples.
+
+        prefetch: if not None, the next `prefetch` items are read in RAM by
+        `prefetch_workers` background threads while the current item is
+        processed (at most prefetch+1 items are held in memory).
+        Otherwise, the items are views on memory-mapped files. If lazy, they
+        are read-only LazyChunk mappings instead of dicts: the file of a field
+        is opened only when the field is first accessed.
+
+        buffers: if not None, the items are read (with readinto for
+        uncompressed files) into preallocated buffers instead, such that
+        iterating needs no allocation:
+        - True: the buffers are allocated by the iterator, and an item is valid
+          until the next item is requested,
+        - a BufferPool: the consumer must give the items back with
+          BufferPool.release (its buffers must have at least max_chunk_size
+          rows). If the consumer holds all the buffers, the reads fail once
+          the timeout of the pool expires (if any), and the reads waiting for a
+          buffer are cancelled when the iterator is closed.
+
+        Compressed files are decoded whole, once per chunk.
+
+        verify: check the hashes of the data before it is used (raising
+        CorruptedDatasetError), once per iterator. For files with block hashes
+        (see module doc), only the blocks containing the rows read are checked,
+        other files are checked whole. The checks read the files separately
+        from the data returned: files modified during the iteration may not be
+        detected.
+        """
+        chunk_names, chunk_ranges = self._chunk_ranges(max_ntraces, start_trace)
+        # Slices in chunks
+        chunk_slices = [
+                split_slice(start, stop, max_chunk_size)
+                for start, stop in chunk_ranges
+                ]
+        return ChunkIterator(
+                self, chunk_names, chunk_slices, fields,
+                prefetch=prefetch, prefetch_workers=prefetch_workers,
+                samples=self._normalize_samples(samples),
+                buffers=buffers,
+                verify=verify,
+                lazy=lazy,
+                )
+
+    def iter_parallel(
+            self,
+            max_ntraces=None,
+            start_trace=0,
+            fields=None,
+            max_chunk_size=None,
+            samples=None,
+            preprocess=None,
+            out_fields=None,
+            nproc=None,
+            nslots=None,
+            verify=False,
+            max_bytes=2**28,
+            ):
+        """Iterate over the traces like iter_ntraces, reading (and
+        preprocessing) the items in nproc (default: at most 4) processes.
+
+        preprocess: if not None, function applied to each item (in the
+        processes, it must be picklable), which returns a
+        {<field_name>: <array>} dict, whose arrays have at most as many rows as
+        the item. The fields of the result are described by out_fields
+        ({<field_name>: {"shape": <shape of a row>, "dtype": <dtype>}}, default:
+        same as the items).
+
+        The results are written in nslots shared memory slots (default: 2*nproc,
+        but at most max_bytes bytes in total), and the items are views on them:
+        an item is valid until the next one is requested.
+
+        verify: see iter_ntraces (the blocks are verified once per process).
+        """
+        chunk_names, chunk_ranges = self._chunk_ranges(max_ntraces, start_trace)
+        chunk_slices = [
+                split_slice(start, stop, max_chunk_size)
+                for start, stop in chunk_ranges
+                ]
+        chunk_iterator = ChunkIterator(
+                self, chunk_names, chunk_slices, fields,
+                samples=self._normalize_samples(samples),
+                verify=verify,
+                )
+        return ParallelChunkIterator(
+                chunk_iterator, preprocess, out_fields, nproc, nslots, max_bytes
+                )
+
+    def aiter_ntraces(
+            self,
+            max_ntraces=None,
+            start_trace=0,
+            fields=None,
+            max_chunk_size=None,
+            samples=None,
+            read_ahead=2,
+            concurrency=1,
+            executor=None,
+            ):
+        """Asynchronous iterator over the traces (see iter_ntraces for the
+        parameters), for use with `async for`.
+
+        The items are read in RAM in an executor (default: a thread pool of
+        `concurrency` threads), such that the event loop is not blocked. At
+        most read_ahead items are read in advance.
+        """
+        if read_ahead < 1 or concurrency < 1:
+            raise ValueError('read_ahead and concurrency must be positive.')
+        chunk_names, chunk_ranges = self._chunk_ranges(max_ntraces, start_trace)
+        chunk_slices = [
+                split_slice(start, stop, max_chunk_size)
+                for start, stop in chunk_ranges
+                ]
+        chunk_iterator = ChunkIterator(
+                self, chunk_names, chunk_slices, fields,
+                samples=self._normalize_samples(samples),
+                )
+        return AsyncChunkIterator(chunk_iterator, read_ahead, concurrency, executor)
+
+    def iter_shuffled(self, batch_size, seed=None, fields=None, max_bytes=2**30, drop_last=False):
+        """Iterate over all the traces in random order, by batches of
+        batch_size traces.
 
-    def iter_ntraces(self, max_ntraces=None, start_trace=0, fields=None, max_chunk_size=None):
+        The chunks are read sequentially, in random order, into a window of at
+        most max_bytes bytes, whose traces are shuffled before being yielded.
+        drop_last: do not yield the last batch if it is smaller than batch_size.
+        """
+        return ShuffledChunkIterator(self, batch_size, seed, fields, max_bytes, drop_last)
+
+    def iter_batches(
+            self,
+            batch_size,
+            max_ntraces=None,
+            start_trace=0,
+            fields=None,
+            samples=None,
+            drop_last=False,
+            verify=False,
+            ):
+        """Iterate over (at most) max_ntraces traces, starting at start_trace,
+        by batches of exactly batch_size traces, which may span multiple chunks.
+
+        The batches are read into a buffer allocated by the iterator: a batch is
+        valid until the next one is requested.
+        drop_last: do not yield the last batch if it is smaller than batch_size.
+        samples, verify: see iter_ntraces.
+        """
+        if batch_size < 1:
+            raise ValueError('batch_size must be positive.')
+        chunk_names, chunk_ranges = self._chunk_ranges(max_ntraces, start_trace)
+        chunk_iterator = ChunkIterator(
+                self, chunk_names, [[chunk_range] for chunk_range in chunk_ranges], fields,
+                samples=self._normalize_samples(samples),
+                verify=verify,
+                )
+        return BatchIterator(chunk_iterator, batch_size, drop_last)
+
+    def _chunk_ranges(self, max_ntraces, start_trace):
+        """Names of the chunks containing the traces in
+        [start_trace, start_trace+max_ntraces), and range of trace offsets in
+        each of them."""
         # Let max_ntraces be in range
         if max_ntraces is None:
             max_ntraces = self.cum_nexec[-1] - start_trace
@@ -186,7 +1497,7 @@ class DatasetReader:
         if max_ntraces == 0:
             # Handle special empty case
             chunk_names = []
-            chunk_slices = []
+            chunk_ranges = []
         else:
             # Indices of chunks to be loaded.
             start_chunk = bisect.bisect_right(self.cum_nexec, start_trace) - 1
@@ -203,12 +1514,153 @@ class DatasetReader:
             # Fixup in case of a single chunk
             if start_chunk == end_chunk-1:
                 chunk_ranges = [(chunk_ranges[0][0], chunk_ranges[1][1])]
-            # Slices in chunks
-            chunk_slices = [
-                    _split_slice(start, stop, max_chunk_size)
-                    for start, stop in chunk_ranges
-                    ]
-        return ChunkIterator(self, chunk_names, chunk_slices, fields)
+        return chunk_names, chunk_ranges
+
+    def _normalize_samples(self, samples):
+        if samples is None:
+            return None
+        return _samples_index(samples, self.fields[_SAMPLES_FIELD]['shape'][0])
+
+    def take(self, indices, fields=None, samples=None):
+        """Gather the traces at arbitrary indices (in the whole dataset).
+
+        Returns {<field_name>: <array>}, where the i-th row of each array
+        corresponds to indices[i].
+        Each chunk is memory-mapped once, and read in increasing offset order.
+        samples: see iter_ntraces.
+        """
+        samples = self._normalize_samples(samples)
+        if isinstance(samples, slice):
+            samples = np.arange(self.fields[_SAMPLES_FIELD]['shape'][0])[samples]
+        indices = np.asarray(indices, dtype=np.int64)
+        if indices.ndim != 1:
+            raise ValueError('indices must be one-dimensional.')
+        if np.any((indices < 0) | (indices >= len(self))):
+            raise IndexError('Trace index out of range.')
+        fields = [f for f in self.fields if fields is None or f in fields]
+        res = {
+                f: np.empty(
+                    (len(indices), *self.fields[f]['shape']),
+                    dtype=self.fields[f]['dtype'],
+                    )
+                for f in fields
+                if f != _SAMPLES_FIELD or samples is None
+                }
+        if samples is not None and _SAMPLES_FIELD in fields:
+            res[_SAMPLES_FIELD] = np.empty(
+                    (len(indices), len(samples)),
+                    dtype=self.fields[_SAMPLES_FIELD]['dtype'],
+                    )
+        # Group the indices by chunk.
+        chunk_ids = np.searchsorted(self.cum_nexec, indices, side='right') - 1
+        order = np.argsort(chunk_ids, kind='stable')
+        used_chunks, group_starts = np.unique(chunk_ids[order], return_index=True)
+        for chunk_id, group in zip(used_chunks, np.split(order, group_starts[1:])):
+            offsets = indices[group] - self.cum_nexec[chunk_id]
+            sort = np.argsort(offsets, kind='stable')
+            group, offsets = group[sort], offsets[sort]
+            chunk = self.load_chunk(self.chunk_name_list[chunk_id], mmap_mode='r', fields=fields)
+            for f in fields:
+                if f == _SAMPLES_FIELD and samples is not None:
+                    res[f][group] = chunk[f][offsets[:, np.newaxis], samples]
+                else:
+                    res[f][group] = chunk[f][offsets]
+        return res
+
+    def read_samples(self, samples, max_ntraces=None, start_trace=0):
+        """Read some samples of the traces (see iter_ntraces for the
+        parameters), as a sample-major (n_samples, n_traces) array.
+
+        This is efficient if the traces are stored in sample-major layout (see
+        transpose_dataset.py), otherwise all the traces are read.
+        samples: None for all the samples.
+        """
+        nsamples = self.fields[_SAMPLES_FIELD]['shape'][0]
+        if samples is None:
+            samples = slice(None)
+        samples = np.arange(nsamples)[self._normalize_samples(samples)]
+        layout = self.layouts.get(_SAMPLES_FIELD)
+        if layout is None:
+            chunks = self.iter_ntraces(max_ntraces, start_trace, fields=[_SAMPLES_FIELD], samples=samples)
+            return np.concatenate(
+                    [np.empty((0, len(samples)), dtype=self.fields[_SAMPLES_FIELD]['dtype'])] +
+                    [chunk[_SAMPLES_FIELD] for chunk in chunks]
+                    ).T.copy()
+        # Ranges of columns in the layout files, merging adjacent ranges.
+        col_ranges = []
+        for cn, (start, stop) in zip(*self._chunk_ranges(max_ntraces, start_trace)):
+            try:
+                offset = layout['chunks'][cn]
+            except KeyError:
+                raise DatasetError(f'Chunk {cn} not in {_SAMPLES_FIELD} layout.') from None
+            if col_ranges and col_ranges[-1][1] == offset + start:
+                col_ranges[-1][1] = offset + stop
+            else:
+                col_ranges.append([offset + start, offset + stop])
+        res = np.empty(
+                (len(samples), sum(stop-start for start, stop in col_ranges)),
+                dtype=self.fields[_SAMPLES_FIELD]['dtype'],
+                )
+        for file in layout['files']:
+            s_start, s_stop = file['samples']
+            selected = np.flatnonzero((samples >= s_start) & (samples < s_stop))
+            if len(selected) == 0:
+                continue
+            rows = samples[selected] - s_start
+            array = self._load_file(file, mmap_mode='r', start=rows.min(), stop=rows.max()+1)
+            rows = rows - rows.min()
+            pos = 0
+            for start, stop in col_ranges:
+                res[selected, pos:pos+stop-start] = array[rows, start:stop]
+                pos += stop-start
+        return res
+
+    def stats_path(self, field='traces'):
+        if self.base_path is None:
+            raise DatasetError('Statistics files require local storage.')
+        return self.base_path / f'stats_{field}.npz'
+
+    def _stats_key(self, chunk_name, field):
+        file = self.chunks[chunk_name]['files'][field]
+        if 'rows' in file:
+            return '{}:{}:{}'.format(file['hash'], *file['rows'])
+        return file['hash']
+
+    def build_stats(self, field='traces', nproc=None):
+        """Compute the statistics of the chunks that are not in the
+        statistics file (see stats_path) in nproc processes (default: number
+        of CPUs), and add them to the file."""
+        entries = _read_stats(self.stats_path(field))
+        keys = {self._stats_key(cn, field): cn for cn in self.chunks}
+        todo = [(key, cn) for key, cn in keys.items() if key not in entries]
+        if not todo:
+            return
+        with ReaderPoolExecutor(self, max_workers=nproc) as executor:
+            futures = {key: executor.submit(_chunk_stats, cn, field) for key, cn in todo}
+            new_entries = {key: future.result() for key, future in futures.items()}
+        # Merge with the current content, in case of concurrent updates.
+        entries = _read_stats(self.stats_path(field))
+        entries.update(new_entries)
+        _write_stats(self.stats_path(field), entries, self.fields[field])
+
+    def stats(self, field='traces', compute_missing=True):
+        """Per-sample statistics (SampleStats) of a field over the dataset,
+        merged from the statistics of the chunks (see build_stats).
+
+        The statistics of the chunks that are not in the statistics file are
+        computed (without saving them) if compute_missing, otherwise a
+        DatasetError is raised.
+        """
+        entries = _read_stats(self.stats_path(field)) if self.base_path is not None else dict()
+        stats = []
+        for cn in self.chunks:
+            st = entries.get(self._stats_key(cn, field))
+            if st is None:
+                if not compute_missing:
+                    raise DatasetError(f'No statistics for chunk {cn} (see build_stats).')
+                st = _chunk_stats(self, cn, field)
+            stats.append(st)
+        return SampleStats.merge(stats)
 
     def subset(self, chunk_names=None, fields=None):
         if chunk_names is not None:
@@ -227,9 +1679,51 @@ class DatasetReader:
                 for cn, cv in self.chunks.items()
                 if chunk_names is None or cn in chunk_names
                 }
-        return type(self)(self.id, self.metadata, new_chunks, new_fields, self.base_path)
+        new_layouts = {
+                fn: l for fn, l in self.layouts.items()
+                if fields is None or fn in fields
+                }
+        return type(self)(
+                self.id, self.metadata, new_chunks, new_fields, self.base_path, new_layouts,
+                self.cache, self.storage,
+                )._share_files(self)
+
+    def subset_rows(self, chunk_rows, fields=None):
+        """Subset made of parts of chunks, which reference the same files
+        (without copy).
+
+        chunk_rows: [(<chunk name>, <start>, <stop>), ...]. The new chunks are
+        named <chunk name> if the whole chunk is taken, and
+        <chunk name>_rows<start>-<stop> otherwise.
+        """
+        sub = self.subset([cn for cn, _, _ in chunk_rows], fields)
+        new_chunks = dict()
+        new_layouts = {
+                fn: dict(layout, chunks=dict()) for fn, layout in sub.layouts.items()
+                }
+        for cn, start, stop in chunk_rows:
+            chunk = sub.chunks[cn]
+            # A whole chunk can be taken even if it is empty.
+            if (start, stop) == (0, chunk['nexec']):
+                new_cn = cn
+                new_chunks[cn] = chunk
+            elif 0 <= start < stop <= chunk['nexec']:
+                new_cn = f'{cn}_rows{start}-{stop}'
+                new_chunks[new_cn] = sub_chunk(chunk, start, stop)
+            else:
+                raise ValueError(f'Bad rows [{start}, {stop}) for chunk {cn}.')
+            # Only the new chunks are referenced by the layouts.
+            for fn, layout in sub.layouts.items():
+                if cn in layout['chunks']:
+                    new_layouts[fn]['chunks'][new_cn] = layout['chunks'][cn] + start
+        return type(self)(
+                self.id, self.metadata, new_chunks, sub.fields, self.base_path, new_layouts,
+                self.cache, self.storage,
+                )._share_files(self)
 
     def subset_ntraces(self, n_traces, fields=None):
+        """Subset of n_traces traces (all if None), made of the largest chunks
+        and, if needed, of a part of a chunk (see subset_rows)."""
         chunk_sizes = [(cv['nexec'], cn) for cn, cv in self.chunks.items()]
         chunk_sizes.sort(key=lambda x: x[0],reverse=True)
         tot_nexec = 0
@@ -239,41 +1733,189 @@ class DatasetReader:
                 tot_nexec += nexec
                 used_chunks.append(chunk_name)
         if tot_nexec != n_traces and n_traces != None:
-            raise ValueError(
-                f"Could not make dataset with {n_traces} traces. "
-                + "Dataset is too small." if n_traces > len(self) else
-                "Files are not split in small chunks (use split_dataset.py)."
-            )
+            if n_traces > len(self):
+                raise ValueError(
+                    f"Could not make dataset with {n_traces} traces. Dataset is too small."
+                )
+            # All the remaining chunks are larger than the missing traces.
+            used = set(used_chunks)
+            _, chunk_name = min((nexec, cn) for nexec, cn in chunk_sizes if cn not in used)
+            return self.subset_rows(
+                    [(cn, 0, self.chunks[cn]['nexec']) for cn in used_chunks] +
+                    [(chunk_name, 0, n_traces - tot_nexec)],
+                    fields,
+                    )
         return self.subset(used_chunks, fields)
 
-    def save_to(self, manifest_path, process_path=None):
+    def save_to(self, manifest_path, process_path=None, binary=False):
+        """Write a manifest for the dataset (paths are made relative to the
+        new manifest where possible, or mapped with process_path).
+
+        binary: write a binary manifest instead of JSON.
+        """
+        if self.base_path is None:
+            raise DatasetError('Not supported for datasets without local storage.')
         manifest_path = pathlib.Path(manifest_path).resolve()
         new_basepath = manifest_path.parent
-        new_chunks = copy.deepcopy(self.chunks)
-        def map_path(path):
-            try:
-                return path.relative_to(new_basepath)
-            except ValueError:
-                return path
+        new_chunks = {cn: copy.deepcopy(chunk) for cn, chunk in self.chunks.items()}
         if process_path is None:
-            process_path = map_path
+            process_path = lambda path: rebase_path(path, self.base_path, new_basepath)
         for chunk in new_chunks.values():
             for f in chunk['files'].values():
                 f['path'] = str(process_path((self.base_path / f['path']).resolve()))
-        new_ds = type(self)(self.id, self.metadata, new_chunks, self.fields, new_basepath)
-        with open(manifest_path, 'w') as f:
-            f.write(new_ds.serialize())
+        new_layouts = copy.deepcopy(self.layouts)
+        for layout in new_layouts.values():
+            for f in layout['files']:
+                f['path'] = str(process_path((self.base_path / f['path']).resolve()))
+        new_ds = type(self)(
+                self.id, self.metadata, new_chunks, self.fields, new_basepath, new_layouts
+                )
+        if binary:
+            with open(manifest_path, 'wb') as f:
+                f.write(new_ds.serialize_binary())
+        else:
+            with open(manifest_path, 'w') as f:
+                f.write(new_ds.serialize())
         
     def serialize(self):
-        return _gen_manifest(self.id, self.metadata, self.chunks, self.fields)
+        return _gen_manifest(self.id, self.metadata, self.chunks, self.fields, self.layouts)
+
+    def serialize_binary(self):
+        return _gen_binary_manifest(self.id, self.metadata, self.chunks, self.fields, self.layouts)
+
+
+class ConcatDatasetReader:
+    """Virtual concatenation of several datasets, without data copy.
+
+    The traces are indexed globally: first the traces of readers[0], then
+    those of readers[1], etc. Only the fields present in all the datasets
+    (with the same shape and dtype) are available.
+
+    weights: relative (positive) weights of the datasets for interleaved
+    iteration (default: proportional to the number of iterated traces in each
+    dataset).
+    """
+    def __init__(self, readers, weights=None):
+        self.readers = list(readers)
+        if not self.readers:
+            raise ValueError('No dataset to concatenate.')
+        if weights is not None and len(weights) != len(self.readers):
+            raise ValueError('Bad number of weights.')
+        if weights is not None and not all(w > 0 for w in weights):
+            raise ValueError('The weights must be positive.')
+        self.weights = weights
+        self.id = '+'.join(reader.id for reader in self.readers)
+        self.metadata = {reader.id: reader.metadata for reader in self.readers}
+        self.fields = {
+                f: desc for f, desc in self.readers[0].fields.items()
+                if all(reader.fields.get(f) == desc for reader in self.readers[1:])
+                }
+        self.cum_nexec = list(it.accumulate([0] + [len(reader) for reader in self.readers]))
+
+    def __len__(self):
+        return self.cum_nexec[-1]
+
+    def _check_fields(self, fields):
+        if fields is None:
+            return list(self.fields)
+        if not set(fields) <= set(self.fields):
+            raise ValueError('Fields not common to all the datasets.')
+        return fields
+
+    def iter_ntraces(
+            self,
+            max_ntraces=None,
+            start_trace=0,
+            fields=None,
+            max_chunk_size=None,
+            interleave=False,
+            **kwargs,
+            ):
+        """See DatasetReader.iter_ntraces (other keyword arguments are passed
+        to it).
+
+        interleave: interleave the items from the datasets according to the
+        weights, instead of iterating over the datasets in order.
+        """
+        fields = self._check_fields(fields)
+        if max_ntraces is None:
+            stop_trace = len(self)
+        else:
+            stop_trace = min(len(self), start_trace + max_ntraces)
+        iterators = []
+        ntraces = []
+        for reader, offset in zip(self.readers, self.cum_nexec):
+            start = min(max(start_trace - offset, 0), len(reader))
+            stop = min(max(stop_trace - offset, 0), len(reader))
+            iterators.append(reader.iter_ntraces(
+                stop-start, start, fields=fields, max_chunk_size=max_chunk_size, **kwargs
+                ))
+            ntraces.append(stop-start)
+        if not interleave:
+            weights = None
+        elif self.weights is None:
+            weights = ntraces
+        else:
+            weights = self.weights
+        return ConcatChunkIterator(iterators, weights)
 
+    def take(self, indices, fields=None, samples=None):
+        """See DatasetReader.take."""
+        fields = self._check_fields(fields)
+        indices = np.asarray(indices, dtype=np.int64)
+        if indices.ndim != 1:
+            raise ValueError('indices must be one-dimensional.')
+        if np.any((indices < 0) | (indices >= len(self))):
+            raise IndexError('Trace index out of range.')
+        reader_ids = np.searchsorted(self.cum_nexec, indices, side='right') - 1
+        res = None
+        for reader_id, reader in enumerate(self.readers):
+            sel = np.flatnonzero(reader_ids == reader_id)
+            if len(sel) == 0 and res is not None:
+                continue
+            values = reader.take(indices[sel] - self.cum_nexec[reader_id], fields, samples)
+            if res is None:
+                res = {
+                        f: np.empty((len(indices), *v.shape[1:]), dtype=v.dtype)
+                        for f, v in values.items()
+                        }
+            for f, v in values.items():
+                res[f][sel] = v
+        return res
+
+    def subset(self, chunk_names=None, fields=None):
+        """chunk_names: None, or a list with one entry (None or list of chunk
+        names, see DatasetReader.subset) for each dataset."""
+        if chunk_names is None:
+            chunk_names = [None] * len(self.readers)
+        if len(chunk_names) != len(self.readers):
+            raise ValueError('Bad number of chunk name lists.')
+        fields = self._check_fields(fields)
+        return type(self)(
+                [reader.subset(cn, fields) for reader, cn in zip(self.readers, chunk_names)],
+                self.weights,
+                )
+
+    def stats(self, field='traces', compute_missing=True):
+        return SampleStats.merge([
+            dr.stats(field, compute_missing) for dr in self.readers if len(dr)
+            ])
 
 class DatasetWriter:
     """
     dataset_path: str
     fields: {<field_name>: { 'shape': [<shape of one record>], 'dtype': np.dtype }, ...}
+    codecs: {<field_name>: <codec name>} for the fields stored compressed.
+    nworkers: if not None, the chunks are written by a pool of nworkers
+    threads: add_chunk returns immediately (the arrays must not be modified
+    afterwards), and write errors are raised by write_manifest.
+    merkle_block_size: if not None, the files get block hashes (see module
+    doc) with blocks of merkle_block_size bytes, instead of SHA-256 hashes.
     """
-    def __init__(self, dataset_path, dataset_id, metadata, fields):
+    def __init__(
+            self, dataset_path, dataset_id, metadata, fields, codecs=None, nworkers=None,
+            merkle_block_size=None,
+            ):
         self.path = pathlib.Path(dataset_path)
         self.id = dataset_id
         self.metadata = metadata
@@ -281,18 +1923,99 @@ class DatasetWriter:
         # convert e.g. np.int8 to np.dtype('int8')
         for f in self.fields.values():
             f['dtype'] = np.dtype(f['dtype'])
+        # {<field_name>: <codec name>} for the fields stored compressed.
+        self.codecs = dict() if codecs is None else codecs
+        if not set(self.codecs) <= set(self.fields):
+            raise ValueError('Codec for unknown field.')
+        if not set(self.codecs.values()) <= set(CODECS):
+            raise ValueError('Unknown codec.')
+        self.merkle_block_size = merkle_block_size
         self.chunks = dict()
+        self.layouts = dict()
         self.error = False
+        self._executor = None if nworkers is None else ThreadPoolExecutor(max_workers=nworkers)
+        # Chunks being written: {<chunk name>: <future of the chunk object>}
+        self._pending = dict()
+        self._max_pending = None if nworkers is None else 2*nworkers
 
     def add_existing_chunk(self, chunk_name, chunk):
         self.chunks[chunk_name] = chunk
 
+    def add_layout(self, field_name, layout):
+        """Add an alternative layout (layout object, see module doc) for a field."""
+        if field_name not in self.fields:
+            self.error = True
+            raise ValueError(f'Unknown field {field_name}.')
+        self.layouts[field_name] = layout
+
     def add_chunk(self, chunk_name=None, **fields):
+        chunk_name = self._new_chunk_name(chunk_name)
+        nexec = self._check_arrays(fields)
+        if self._executor is None:
+            try:
+                self.chunks[chunk_name] = self._write_chunk(chunk_name, nexec, fields)
+            except ValueError:
+                self.error = True
+                raise
+        else:
+            # Bound the memory held by pending chunks.
+            if len(self._pending) >= self._max_pending:
+                wait(self._pending.values(), return_when=FIRST_COMPLETED)
+                self._pending = {cn: f for cn, f in self._pending.items() if not f.done()}
+            # Placeholder, keeps the order of the chunks.
+            self.chunks[chunk_name] = self._executor.submit(
+                    self._write_chunk, chunk_name, nexec, fields
+                    )
+            self._pending[chunk_name] = self.chunks[chunk_name]
+
+    def add_chunk_rows(self, chunk_name, nexec, blocks):
+        """Add a chunk of nexec rows given by blocks, an iterable of
+        {<field_name>: <array>} dicts of consecutive rows, such that the chunk
+        is written without being held in memory (not supported for compressed
+        fields). The chunk is written before returning."""
+        chunk_name = self._new_chunk_name(chunk_name)
+        if self.codecs:
+            self.error = True
+            raise ValueError('Compressed fields are not supported.')
+        chunk = dict(nexec=nexec, files=dict())
+        try:
+            with contextlib.ExitStack() as stack:
+                writers = dict()
+                for field_name, f_type in self.fields.items():
+                    p, rel_path = self._chunk_file(chunk_name, field_name)
+                    writers[field_name] = _HashingWriter(
+                            stack.enter_context(open(p, 'wb')), self._new_hasher()
+                            )
+                    writers[field_name].write(npy_header(f_type['dtype'], [nexec] + f_type['shape']))
+                    chunk['files'][field_name] = dict(path=rel_path)
+                nrows = 0
+                for block in blocks:
+                    n = self._check_arrays(block)
+                    if nrows + n > nexec:
+                        raise ValueError(f'More than {nexec} rows.')
+                    for field_name, hf in writers.items():
+                        hf.write(np.ascontiguousarray(block[field_name]).data)
+                    nrows += n
+                if nrows != nexec:
+                    raise ValueError(f'Expected {nexec} rows, got {nrows}.')
+        except ValueError:
+            self.error = True
+            raise
+        for field_name, hf in writers.items():
+            chunk['files'][field_name].update(hash_entries(hf.hasher))
+        self.chunks[chunk_name] = chunk
+
+    def _new_chunk_name(self, chunk_name):
         if chunk_name is None:
             chunk_name = '{:04}'.format(len(self.chunks))
         if not isinstance(chunk_name, str) or chunk_name in self.chunks:
             self.error = True
             raise ValueError('Bad chunk_name.')
+        return chunk_name
+
+    def _check_arrays(self, fields):
+        """Check the fields, shapes and dtypes of {<field_name>: <array>}, and
+        return the number of rows."""
         nexec = next(iter(fields.values())).shape[0]
         if set(fields) != set(self.fields):
             self.error = True
@@ -312,20 +2035,54 @@ class DatasetWriter:
                         f'Bad field type {field_name}.' +
                         f' Expected {f_type["dtype"]}, got {field_data.dtype}.'
                         )
+        return nexec
+
+    def _chunk_file(self, chunk_name, field_name):
+        """(<path>, <path relative to the manifest>) of the file of a field in
+        a chunk (the directory is created)."""
+        codec = self.codecs.get(field_name)
+        file_name = chunk_name + '.npy' + ('' if codec is None else '.' + codec)
+        p = self.path.parent / field_name / file_name
+        p.parent.mkdir(parents=True, exist_ok=True)
+        return p, str(pathlib.Path('.') / field_name / file_name)
+
+    def _new_hasher(self):
+        if self.merkle_block_size is None:
+            return hashlib.sha256()
+        return MerkleHasher(self.merkle_block_size)
+
+    def _write_chunk(self, chunk_name, nexec, fields):
+        """Write the files of a chunk and return the chunk object."""
         chunk = dict(nexec=nexec, files=dict())
         for field_name in self.fields:
-            p = self.path.parent / field_name / (chunk_name + '.npy')
-            p.parent.mkdir(parents=True, exist_ok=True)
-            np.save(p, fields[field_name])
-            h = _sha256sum(p)
-            chunk['files'][field_name] = dict(
-                    path = str(pathlib.Path('.') / field_name / (chunk_name + '.npy')),
-                    hash = 'sha256-' + h,
-                    )
-        self.chunks[chunk_name] = chunk
+            codec = self.codecs.get(field_name)
+            p, rel_path = self._chunk_file(chunk_name, field_name)
+            hasher = self._new_hasher()
+            with open(p, 'wb') as f:
+                # Hash while serializing, covering the header and data.
+                hf = _HashingWriter(f, hasher)
+                if codec is None:
+                    np.save(hf, fields[field_name])
+                else:
+                    hf.write(_encode_array(fields[field_name], codec))
+            chunk['files'][field_name] = dict(path=rel_path, **hash_entries(hasher))
+            if codec is not None:
+                chunk['files'][field_name]['codec'] = codec
+        return chunk
+
+    def _wait_pending(self):
+        for chunk_name, chunk in self.chunks.items():
+            if isinstance(chunk, Future):
+                try:
+                    self.chunks[chunk_name] = chunk.result()
+                except BaseException:
+                    self.error = True
+                    raise
+        self._pending = dict()
 
     def write_manifest(self):
-        manifest = _gen_manifest(self.id, self.metadata, self.chunks, self.fields)
+        self._wait_pending()
+        manifest = _gen_manifest(self.id, self.metadata, self.chunks, self.fields, self.layouts)
         self.path.parent.mkdir(parents=True, exist_ok=True)
         with open(self.path, 'w') as f:
             f.write(manifest)
@@ -334,10 +2091,224 @@ class DatasetWriter:
         return self
 
     def __exit__(self, type, value, traceback):
-        if type is None and not self.error:
-            self.write_manifest()
+        try:
+            if type is None and not self.error:
+                self.write_manifest()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=type is not None)
 
-def _split_slice(start, stop, max_chunk_size):
+# {<codec name>: (<encode function>, <decode function>)}
+CODECS = dict()
+
+def register_codec(name, encode, decode):
+    """Register a codec for compressed files.
+
+    encode(array) -> bytes encodes a C-contiguous array,
+    decode(data, dtype, shape) -> array decodes it (data is a bytes-like object).
+    """
+    CODECS[name] = (encode, decode)
+
+def _stdlib_codec(module):
+    def encode(array):
+        return module.compress(array.tobytes())
+    def decode(data, dtype, shape):
+        return np.frombuffer(module.decompress(data), dtype=dtype).reshape(shape)
+    return encode, decode
+
+# Number of values in a block of the delta-bitpack codec (multiple of 8).
+_BITPACK_BLOCK = 128
+_POW2 = np.uint64(2)**np.arange(64, dtype=np.uint64)
+
+def _bitpack_positions(widths):
+    """Byte offset and bit shift of each value in a bit-packed payload, bit
+    width of each value, and size of the payload."""
+    value_widths = np.repeat(widths.astype(np.int64), _BITPACK_BLOCK)
+    bit_pos = np.cumsum(value_widths) - value_widths
+    nbytes = int(np.sum(value_widths)) // 8
+    return bit_pos >> 3, (bit_pos & 7).astype(np.uint64), value_widths.astype(np.uint64), nbytes
+
+def _delta_bitpack_encode(array):
+    """Encode integers as the zigzag-encoded differences between consecutive
+    values in each row, bit-packed by blocks of _BITPACK_BLOCK values
+    with one bit width per block."""
+    if array.dtype.kind not in 'iu' or array.dtype.itemsize > 4:
+        raise ValueError('delta-bitpack codec only supports small integer types.')
+    values = array.reshape(array.shape[0], -1).astype(np.int64)
+    deltas = np.diff(values, axis=1, prepend=0).ravel()
+    nblocks = -(-len(deltas) // _BITPACK_BLOCK)
+    zigzag = np.zeros(nblocks * _BITPACK_BLOCK, dtype=np.uint64)
+    zigzag[:len(deltas)] = (deltas << 1) ^ (deltas >> 63)
+    widths = np.searchsorted(
+            _POW2, zigzag.reshape(nblocks, _BITPACK_BLOCK).max(axis=1, initial=0), side='right'
+            ).astype(np.uint8)
+    byte_idx, shift, _, nbytes = _bitpack_positions(widths)
+    # A shifted value spans at most value_nbytes <= 6 bytes. The bits of
+    # distinct values do not overlap, so we can sum instead of or-ing them.
+    value_nbytes = (int(widths.max(initial=0)) + 7 + 7) // 8
+    value_bytes = (zigzag << shift).astype('<u8').view(np.uint8).reshape(-1, 8)
+    payload = np.zeros(nbytes + 8)
+    for k in range(value_nbytes):
+        payload += np.bincount(byte_idx + k, weights=value_bytes[:, k], minlength=nbytes + 8)
+    return widths.tobytes() + payload[:nbytes].astype(np.uint8).tobytes()
+
+def _delta_bitpack_decode(data, dtype, shape):
+    nrows = shape[0]
+    nvalues = int(np.prod(shape))
+    nblocks = -(-nvalues // _BITPACK_BLOCK)
+    data = np.frombuffer(data, dtype=np.uint8)
+    widths = data[:nblocks]
+    byte_idx, shift, value_widths, nbytes = _bitpack_positions(widths)
+    payload = np.zeros(nbytes + 8, dtype=np.uint8)
+    payload[:nbytes] = data[nblocks:nblocks+nbytes]
+    # Unaligned little-endian 64-bit words starting at each byte of payload.
+    words = np.ndarray((nbytes + 1,), dtype='<u8', buffer=payload, strides=(1,))
+    masks = (np.uint64(1) << value_widths) - np.uint64(1)
+    zigzag = ((words[byte_idx] >> shift) & masks)[:nvalues]
+    deltas = (zigzag >> np.uint64(1)).astype(np.int64) ^ -(zigzag & np.uint64(1)).astype(np.int64)
+    values = np.cumsum(deltas.reshape(nrows, -1), axis=1)
+    return values.astype(dtype).reshape(shape)
+
+register_codec('zlib', *_stdlib_codec(zlib))
+register_codec('lzma', *_stdlib_codec(lzma))
+register_codec('delta-bitpack', _delta_bitpack_encode, _delta_bitpack_decode)
+
+# Approximate size of the decoded frames in compressed files.
+_FRAME_NBYTES = 2**22
+
+def _frame_rows(dtype, shape):
+    row_nbytes = dtype.itemsize * int(np.prod(shape[1:]))
+    return max(1, _FRAME_NBYTES // max(1, row_nbytes))
+
+def _encode_array(array, codec):
+    encode, _ = CODECS[codec]
+    array = np.ascontiguousarray(array)
+    frames = [
+            encode(array[start:stop])
+            for start, stop in split_slice(0, array.shape[0], _frame_rows(array.dtype, array.shape))
+            ]
+    f = io.BytesIO()
+    np.lib.format.write_array_header_1_0(f, np.lib.format.header_data_from_array_1_0(array))
+    np.save(f, np.array([len(frame) for frame in frames], dtype=np.uint64))
+    for frame in frames:
+        f.write(frame)
+    return f.getvalue()
+
+def _load_npy(path, mmap_mode, start=0, stop=None):
+    if start == 0 and stop is None:
+        return np.load(path, mmap_mode=mmap_mode)
+    array = np.load(path, mmap_mode='r' if mmap_mode is None else mmap_mode)[start:stop]
+    # Read only the rows when not memory-mapping.
+    return np.array(array) if mmap_mode is None else array
+
+def _load_remote_npy(storage, path, start=0, stop=None):
+    """Read the rows [start, stop) of a .npy file in storage."""
+    with storage.open(path) as f:
+        header = _read_npy_header(f)
+        data_start = f.tell()
+    if header is None or header[1]:
+        raise DatasetError(f'Unsupported .npy file {path}.')
+    shape, _, dtype = header
+    stop = shape[0] if stop is None else stop
+    row_nbytes = dtype.itemsize * int(np.prod(shape[1:]))
+    data, = storage.read_ranges(path, [(data_start + start*row_nbytes, (stop-start)*row_nbytes)])
+    return np.frombuffer(data, dtype=dtype).reshape((stop-start, *shape[1:]))
+
+def _load_encoded(storage, path, codec, executor, start=0, stop=None):
+    """Decode the rows [start, stop) of a compressed file in storage (only
+    the overlapping frames are read)."""
+    _, decode = CODECS[codec]
+    with storage.open(path) as f:
+        np.lib.format.read_magic(f)
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        frame_sizes = np.load(f)
+        data_start = f.tell()
+    frame_offsets = data_start + np.cumsum(frame_sizes) - frame_sizes
+    row_slices = split_slice(0, shape[0], _frame_rows(dtype, shape))
+    if len(row_slices) != len(frame_sizes):
+        raise CorruptedDatasetError(f'Bad frame count in {path}.')
+    r_start, r_stop = start, shape[0] if stop is None else stop
+    res = np.empty((r_stop-r_start, *shape[1:]), dtype=dtype)
+    frames = [
+            (int(offset), int(size), start, stop)
+            for offset, size, (start, stop) in zip(frame_offsets, frame_sizes, row_slices)
+            if start < r_stop and stop > r_start
+            ]
+    data = storage.read_ranges(path, [(offset, size) for offset, size, _, _ in frames])
+    def decode_frame(data, start, stop):
+        frame = decode(data, dtype, (stop-start, *shape[1:]))
+        lo, hi = max(start, r_start), min(stop, r_stop)
+        res[lo-r_start:hi-r_start] = frame[lo-start:hi-start]
+    futures = [
+            executor.submit(decode_frame, frame_data, start, stop)
+            for frame_data, (_, _, start, stop) in zip(data, frames)
+            ]
+    for future in futures:
+        future.result()
+    return res
+
+def _file_rows(file):
+    """(<first row>, <number of rows>) of the array of a file object in the
+    stored file (the number of rows is None for the whole array)."""
+    first_row, nrows = file.get('segment', (0, None))
+    if 'rows' in file:
+        first_row, nrows = first_row + file['rows'][0], file['rows'][1]
+    return first_row, nrows
+
+def npy_header(dtype, shape):
+    """.npy (version 1.0) header of a C-order array."""
+    f = io.BytesIO()
+    np.lib.format.write_array_header_1_0(f, dict(
+        descr=np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        fortran_order=False,
+        shape=tuple(shape),
+        ))
+    return f.getvalue()
+
+def sub_chunk(chunk, start, stop):
+    """Chunk object for the rows [start, stop) of chunk (same files)."""
+    files = {
+            f: dict(file, rows=[file.get('rows', [0])[0] + start, stop - start])
+            for f, file in chunk['files'].items()
+            }
+    return dict(chunk, nexec=stop-start, files=files)
+
+# Field whose columns are selected by the `samples` parameters.
+_SAMPLES_FIELD = 'traces'
+
+def _samples_index(samples, nsamples):
+    """Normalize a selection of samples to a slice or an array of indices.
+
+    samples: slice, list of (start, stop) windows or array of indices.
+    """
+    if isinstance(samples, slice):
+        return samples
+    if len(samples) != 0 and isinstance(samples[0], (tuple, list, slice)):
+        windows = [w if isinstance(w, slice) else slice(*w) for w in samples]
+        samples = np.concatenate([np.arange(nsamples)[w] for w in windows])
+    samples = np.asarray(samples, dtype=np.int64)
+    if samples.ndim != 1:
+        raise ValueError('Bad samples selection.')
+    if np.any((samples < -nsamples) | (samples >= nsamples)):
+        raise IndexError('Sample index out of range.')
+    samples = samples % nsamples
+    # A contiguous range is read as a slice (i.e., a single window per trace).
+    if len(samples) != 0 and np.array_equal(samples, np.arange(samples[0], samples[0]+len(samples))):
+        return slice(int(samples[0]), int(samples[0])+len(samples))
+    return samples
+
+def rebase_path(path, base_path, new_base_path):
+    """Path of the file at path (relative to base_path) relative to
+    new_base_path if it is below it, absolute otherwise."""
+    path = (pathlib.Path(base_path) / path).resolve()
+    try:
+        return path.relative_to(pathlib.Path(new_base_path).resolve())
+    except ValueError:
+        return path
+
+def split_slice(start, stop, max_chunk_size):
+    """Split [start, stop) in (start, stop) slices of at most max_chunk_size
+    rows (a single slice if None)."""
     if max_chunk_size is None:
         return [(start, stop)]
     else:
@@ -345,50 +2316,1198 @@ def _split_slice(start, stop, max_chunk_size):
         ends = starts[1:] + [stop]
         return [(start, stop) for start, stop in zip(starts, ends)]
 
+def _aligned_empty(shape, dtype, align):
+    dtype = np.dtype(dtype)
+    nbytes = dtype.itemsize * int(np.prod(shape))
+    raw = np.empty(nbytes + align, dtype=np.uint8)
+    start = -raw.ctypes.data % align
+    return raw[start:start+nbytes].view(dtype).reshape(shape)
+
+class BufferPool:
+    """Preallocated buffers for ChunkIterator (see DatasetReader.iter_ntraces).
+
+    Each of the nbuffers buffers is a {<field_name>: <array>} dict, whose
+    arrays have nrows rows and are aligned on `align` bytes.
+    fields: {<field_name>: {"shape": <shape of a row>, "dtype": <dtype>}}.
+    timeout: default maximum time (in seconds) to wait for a free buffer in
+    acquire (None: no limit).
+    """
+    def __init__(self, fields, nrows, nbuffers=2, align=64, timeout=None):
+        self.fields = fields
+        self.nrows = nrows
+        self.timeout = timeout
+        self._buffers = [
+                {
+                    f: _aligned_empty((nrows, *desc['shape']), desc['dtype'], align)
+                    for f, desc in fields.items()
+                    }
+                for _ in range(nbuffers)
+                ]
+        # Address of any array of a buffer -> index of the buffer.
+        self._index = {
+                a.ctypes.data: i for i, buffers in enumerate(self._buffers) for a in buffers.values()
+                }
+        self._free = list(range(nbuffers))
+        self._cond = threading.Condition()
+
+    def acquire(self, block=True, timeout=None, cancel=None):
+        """Take a free buffer. If none is free, wait for one to be released
+        (if block), at most timeout seconds (default: self.timeout) and until
+        the threading.Event cancel is set (see interrupt). Raises DatasetError
+        if no buffer could be taken."""
+        if timeout is None:
+            timeout = self.timeout
+        with self._cond:
+            if block:
+                self._cond.wait_for(
+                        lambda: self._free or (cancel is not None and cancel.is_set()),
+                        timeout,
+                        )
+            if cancel is not None and cancel.is_set():
+                raise DatasetError('Cancelled while waiting for a free buffer.')
+            if not self._free:
+                raise DatasetError('No free buffer (items must be released).')
+            return self._buffers[self._free.pop()]
+
+    def interrupt(self):
+        """Wake up the threads waiting in acquire, such that they check their
+        cancel event."""
+        with self._cond:
+            self._cond.notify_all()
+
+    def release(self, item):
+        """Give back a buffer, or an item read into it."""
+        i = self._index[next(iter(item.values())).ctypes.data]
+        with self._cond:
+            if i in self._free:
+                raise ValueError('Buffer released twice.')
+            self._free.append(i)
+            self._cond.notify()
+
 class ChunkIterator:
-    def __init__(self, dataset_reader, chunk_names, chunk_slices, fields=None):
+    def __init__(
+            self,
+            dataset_reader,
+            chunk_names,
+            chunk_slices,
+            fields=None,
+            prefetch=None,
+            prefetch_workers=1,
+            samples=None,
+            buffers=None,
+            verify=False,
+            lazy=False,
+            ):
+        if prefetch is not None and (prefetch < 1 or prefetch_workers < 1):
+            raise ValueError('prefetch and prefetch_workers must be positive.')
         self._dataset_reader = dataset_reader
         self._chunk_names = chunk_names
         self._chunk_slices = chunk_slices
         self.fields = fields
+        self.prefetch = prefetch
+        self.prefetch_workers = prefetch_workers
+        # None, slice or index array (see _samples_index)
+        self.samples = samples
         self._i = 0
+        # BufferPool (or None), whose buffers are released by the iterator if
+        # it owns it.
+        self._own_buffers = buffers is True
+        if buffers is True:
+            nrows = max((stop-start for cs in chunk_slices for start, stop in cs), default=1)
+            buffers = BufferPool(self._item_fields(), nrows, nbuffers=1+(prefetch or 0))
+        elif buffers is not None:
+            nrows = max((stop-start for cs in chunk_slices for start, stop in cs), default=0)
+            if nrows > buffers.nrows or any(
+                    buffers.fields.get(f) is None or
+                    tuple(buffers.fields[f]['shape']) != tuple(desc['shape']) or
+                    np.dtype(buffers.fields[f]['dtype']) != desc['dtype']
+                    for f, desc in self._item_fields().items()
+                    ):
+                raise ValueError('Buffers do not match the items.')
+        self.buffers = buffers
+        self.verify = verify
+        self.lazy = lazy
+        # Verified (<hash>, <path>, <block index or None for the whole file>).
+        self._verified = set()
+        # {(<hash>, <path>): (<stream>, <data start>)} (see _verify_rows).
+        self._streams = dict()
+        self._init_decoded()
+
+    def _init_decoded(self):
+        # Decoded arrays of the compressed files of the last chunks:
+        # {(<chunk name>, <field>): <future of the array>} (LRU).
+        self._decoded = collections.OrderedDict()
+        self._decoded_lock = threading.Lock()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_decoded'], state['_decoded_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_decoded()
+
+    def _load_rows(self, chunk_name, fields, start, stop):
+        """Rows [start, stop) of the arrays of the fields (all if None) of a
+        chunk, memory-mapped for uncompressed files. Compressed files are
+        decoded whole, once per iterator (see _decode)."""
+        files = self._dataset_reader.chunks[chunk_name]['files']
+        fields = [f for f in files if fields is None or f in fields]
+        plain = [f for f in fields if 'codec' not in files[f]]
+        res = dict()
+        if plain:
+            res = self._dataset_reader._load_rows(chunk_name, plain, start, stop, mmap_mode='r')
+        for f in fields:
+            if f not in res:
+                res[f] = self._decode(chunk_name, f)[start:stop]
+        return {f: res[f] for f in fields}
+
+    def _decode(self, chunk_name, field):
+        """Decoded array of the (compressed) file of the field in a chunk. The
+        arrays of the last two chunks are kept, such that the slices of a chunk
+        (which may be read concurrently) do not decode it again."""
+        key = (chunk_name, field)
+        with self._decoded_lock:
+            future = self._decoded.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._decoded[key] = future
+                while len(self._decoded) > 2*len(self._dataset_reader.fields):
+                    self._decoded.popitem(last=False)
+            else:
+                self._decoded.move_to_end(key)
+        if owner:
+            try:
+                future.set_result(self._dataset_reader.load_chunk(chunk_name, fields=[field])[field])
+            except BaseException as e:
+                future.set_exception(e)
+                with self._decoded_lock:
+                    if self._decoded.get(key) is future:
+                        del self._decoded[key]
+                raise
+        return future.result()
+
+    def _item_fields(self):
+        dr = self._dataset_reader
+        res = {
+                f: dict(shape=list(desc['shape']), dtype=desc['dtype'])
+                for f, desc in dr.fields.items()
+                if self.fields is None or f in self.fields
+                }
+        if self.samples is not None and _SAMPLES_FIELD in res:
+            nsamples = dr.fields[_SAMPLES_FIELD]['shape'][0]
+            res[_SAMPLES_FIELD]['shape'] = [len(np.arange(nsamples)[self.samples])]
+        return res
 
     def __iter__(self):
+        if self.buffers is not None:
+            return self._iter_buffers()
+        if self.prefetch is not None:
+            return self._iter_prefetch()
         def inner():
             for cn, cs in zip(self._chunk_names, self._chunk_slices):
-                chunk = self._dataset_reader.load_chunk(cn, fields=self.fields, mmap_mode='r')
+                # Memory-mapped arrays of the chunk, shared by its items.
+                chunk_arrays = dict()
                 for start, stop in cs:
-                    yield {f: array[start:stop,...] for f, array in chunk.items()}
+                    item = LazyChunk(self, cn, chunk_arrays, start, stop)
+                    yield item if self.lazy else dict(item)
         return inner()
 
+    def _verify_rows(self, chunk_name, fields, start, stop):
+        """In verify mode, check the hashes of the data of the rows [start,
+        stop) of the fields of a chunk (nothing is checked for an empty
+        range).
+
+        The blocks are read separately from the data used (memory-mapped or
+        read into buffers), once per iterator: this detects files that are
+        corrupted on storage, not files modified while they are read."""
+        if not self.verify or start == stop:
+            return
+        dr = self._dataset_reader
+        for field in fields:
+            file = dr.chunks[chunk_name]['files'][field]
+            storage, path = dr.file_storage(file)
+            blocks = 'codec' not in file and file['hash'].startswith(_MERKLE_SCHEME)
+            key = (file['hash'], str(path))
+            if key + (None,) in self._verified:
+                continue
+            if key not in self._streams:
+                self._streams[key] = dr.hash_stream(field, file, storage, path)
+            stream, data_start = self._streams[key]
+            if not blocks:
+                hasher = new_hasher(file)
+                for data in iter_stream(storage, path, stream):
+                    hasher.update(data)
+                if hasher.hexdigest() != hash_hex(file['hash']):
+                    raise CorruptedDatasetError(f'Hash mismatch for {file["path"]}.')
+                self._verified.add(key + (None,))
+                continue
+            block_size = file['blocks']['size']
+            digests = _block_digests(file)
+            row_nbytes = dr.fields[field]['dtype'].itemsize * int(np.prod(dr.fields[field]['shape']))
+            row = file.get('rows', [0])[0]
+            first = (data_start + (row+start)*row_nbytes) // block_size
+            end = -(-(data_start + (row+stop)*row_nbytes) // block_size)
+            to_check = [i for i in range(first, end) if key + (i,) not in self._verified]
+            data = _read_stream_ranges(storage, path, stream, [
+                (i*block_size, (i+1)*block_size) for i in to_check
+                ])
+            for i, block in zip(to_check, data):
+                if i >= len(digests) or _block_digest(block) != digests[i]:
+                    raise CorruptedDatasetError(f'Hash mismatch for block {i} of {file["path"]}.')
+                self._verified.add(key + (i,))
+
+    def _slice_chunk(self, chunk, start, stop, copy=False):
+        return {f: self._slice_field(f, array, start, stop, copy) for f, array in chunk.items()}
+
+    def _slice_field(self, field, array, start, stop, copy=False):
+        if field == _SAMPLES_FIELD and self.samples is not None:
+            # Always a copy, possibly non-contiguous for a slice.
+            return np.ascontiguousarray(array[start:stop, self.samples])
+        elif copy:
+            return np.array(array[start:stop,...])
+        return array[start:stop,...]
+
+    def _iter_slices(self):
+        for cn, cs in zip(self._chunk_names, self._chunk_slices):
+            for start, stop in cs:
+                yield cn, start, stop
+
+    def _load_slice(self, chunk_name, start, stop, cancel=None):
+        if self.buffers is not None:
+            return self._read_slice(chunk_name, start, stop, block=True, cancel=cancel)
+        chunk = self._load_rows(chunk_name, self.fields, start, stop)
+        self._verify_rows(chunk_name, chunk, start, stop)
+        return self._slice_chunk(chunk, 0, stop-start, copy=True)
+
+    def _read_slice(self, chunk_name, start, stop, block, cancel=None):
+        buffers = self.buffers.acquire(block, cancel=cancel)
+        try:
+            files = self._dataset_reader.chunks[chunk_name]['files']
+            item = {
+                    f: buffers[f][:stop-start] for f in files
+                    if self.fields is None or f in self.fields
+                    }
+            self._verify_rows(chunk_name, item, start, stop)
+            for f, out in item.items():
+                self._read_field(chunk_name, files[f], f, start, out)
+        except BaseException:
+            self.buffers.release(buffers)
+            raise
+        return item
+
+    def _read_field(self, chunk_name, file, field, start, out):
+        samples = self.samples if field == _SAMPLES_FIELD else None
+        row = _file_rows(file)[0] + start
+        dr = self._dataset_reader
+        path = dr._read_path(file)
+        if path is not None and 'codec' not in file and samples is None:
+            # The hash of a segment is not the hash of the file.
+            npy_file = dr._npy_file(path, None if 'segment' in file else file['hash'])
+            if npy_file.readinto_rows(row, out):
+                return
+        array = self._load_rows(chunk_name, [field], start, start+out.shape[0])[field]
+        if samples is None or isinstance(samples, slice):
+            out[...] = array if samples is None else array[:, samples]
+        else:
+            np.take(array, samples, axis=1, out=out)
+
+    def _iter_buffers(self):
+        if self.prefetch is not None:
+            items = self._iter_prefetch()
+        else:
+            items = (self._read_slice(*s, block=False) for s in self._iter_slices())
+        item = None
+        try:
+            for item in items:
+                yield item
+                if self._own_buffers:
+                    self.buffers.release(item)
+                item = None
+        finally:
+            if self._own_buffers and item is not None:
+                self.buffers.release(item)
+            items.close()
+
+    def _iter_prefetch(self):
+        # The executor is shut down when the generator is closed (including on
+        # early exit of the consumer loop): not-yet-started reads are cancelled
+        # and we wait for the running ones (the reads waiting for a free
+        # buffer are cancelled).
+        slices = self._iter_slices()
+        cancel = threading.Event()
+        with ThreadPoolExecutor(max_workers=self.prefetch_workers) as executor:
+            pending = collections.deque(
+                    executor.submit(self._load_slice, *s, cancel)
+                    for s in it.islice(slices, self.prefetch)
+                    )
+            try:
+                while pending:
+                    item = pending.popleft().result()
+                    for s in it.islice(slices, 1):
+                        pending.append(executor.submit(self._load_slice, *s, cancel))
+                    yield item
+            finally:
+                cancel.set()
+                for future in pending:
+                    future.cancel()
+                if self.buffers is not None:
+                    self.buffers.interrupt()
+                    # Give back the buffers of the items that were read.
+                    for future in pending:
+                        if not future.cancelled() and future.exception() is None:
+                            self.buffers.release(future.result())
+
     def __len__(self):
         return sum(len(cs) for cs in self._chunk_slices)
 
     @property
     def n_traces(self):
-        return sum(cs.stop-cs.start for slices in self._chunk_slices for cs in slices)
+        return sum(stop-start for slices in self._chunk_slices for start, stop in slices)
+
+
+class LazyChunk(collections.abc.Mapping):
+    """Item of a ChunkIterator with lazy=True: read-only {<field_name>:
+    <array>} mapping whose arrays are loaded (memory-mapped) on first access.
+
+    chunk_arrays: {<field_name>: <array of the whole chunk>} cache, shared by
+    the items of the same chunk.
+    """
+    def __init__(self, chunk_iterator, chunk_name, chunk_arrays, start, stop):
+        self._chunk_iterator = chunk_iterator
+        self._chunk_name = chunk_name
+        self._chunk_arrays = chunk_arrays
+        self._start = start
+        self._stop = stop
+        self._arrays = dict()
+        self._fields = [
+                f for f in chunk_iterator._dataset_reader.chunks[chunk_name]['files']
+                if chunk_iterator.fields is None or f in chunk_iterator.fields
+                ]
+
+    def __getitem__(self, field):
+        array = self._arrays.get(field)
+        if array is None:
+            if field not in self._fields:
+                raise KeyError(field)
+            self._chunk_iterator._verify_rows(self._chunk_name, [field], self._start, self._stop)
+            chunk_array = self._chunk_arrays.get(field)
+            if chunk_array is None:
+                chunk_array = self._chunk_iterator._dataset_reader.load_chunk(
+                        self._chunk_name, mmap_mode='r', fields=[field]
+                        )[field]
+                self._chunk_arrays[field] = chunk_array
+            array = self._chunk_iterator._slice_field(field, chunk_array, self._start, self._stop)
+            self._arrays[field] = array
+        return array
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __repr__(self):
+        return f'LazyChunk({self._chunk_name!r}, rows={self._start}:{self._stop}, fields={self._fields})'
+
+
+class AsyncChunkIterator:
+    """Asynchronous iterator over the items of a ChunkIterator (see
+    DatasetReader.aiter_ntraces)."""
+    def __init__(self, chunk_iterator, read_ahead=2, concurrency=1, executor=None):
+        self._chunk_iterator = chunk_iterator
+        self.read_ahead = read_ahead
+        self.concurrency = concurrency
+        self.executor = executor
+
+    def __aiter__(self):
+        return self._aiter()
+
+    async def _aiter(self):
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        slices = self._chunk_iterator._iter_slices()
+        load = self._chunk_iterator._load_slice
+        pending = collections.deque(
+                loop.run_in_executor(executor, load, *s)
+                for s in it.islice(slices, self.read_ahead)
+                )
+        try:
+            while pending:
+                item = await pending.popleft()
+                for s in it.islice(slices, 1):
+                    pending.append(loop.run_in_executor(executor, load, *s))
+                yield item
+        finally:
+            for future in pending:
+                future.cancel()
+            if self.executor is None:
+                # Do not block the event loop on the running reads.
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def __len__(self):
+        return len(self._chunk_iterator)
+
+    @property
+    def n_traces(self):
+        return self._chunk_iterator.n_traces
+
+# DatasetReader of a process of a ReaderPoolExecutor.
+_pool_reader = None
+
+def _pool_reader_init(dr):
+    global _pool_reader
+    _pool_reader = dr
+
+def _pool_reader_task(fn, *args, **kwargs):
+    return fn(_pool_reader, *args, **kwargs)
+
+class ReaderPoolExecutor(ProcessPoolExecutor):
+    """ProcessPoolExecutor running tasks that take a DatasetReader as first
+    argument: submit(fn, *args) runs fn(dr, *args) in a process.
+
+    The reader is sent once to each process (by the pool initializer) instead
+    of being pickled with every task, which matters for readers with many
+    chunks.
+    """
+    def __init__(self, dr, max_workers=None):
+        super().__init__(max_workers=max_workers, initializer=_pool_reader_init, initargs=(dr,))
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(_pool_reader_task, fn, *args, **kwargs)
+
+# Shared memory segments of ParallelChunkIterator that could not be closed yet,
+# since some items are still referencing them.
+_UNCLOSED_SHM = []
+
+def _close_shm(shms):
+    remaining = []
+    for shm in _UNCLOSED_SHM + shms:
+        try:
+            shm.close()
+        except BufferError:
+            remaining.append(shm)
+    _UNCLOSED_SHM[:] = remaining
+
+def _slot_arrays(buf, layout, nrows):
+    # The ctypes array holds an export of the buffer as long as the arrays
+    # exist (numpy alone does not), such that closing the shared memory fails
+    # instead of invalidating the arrays.
+    holder = (ctypes.c_char * len(buf)).from_buffer(buf)
+    return {
+            f: np.ndarray((nrows, *shape), dtype=dtype, buffer=holder, offset=offset)
+            for f, (offset, shape, dtype) in layout.items()
+            }
+
+# State of a loader process of ParallelChunkIterator:
+# (chunk iterator, preprocess, shared memory segments, slot arrays).
+_loader = None
+
+def _loader_init(chunk_iterator, preprocess, shm_names, layout, nrows):
+    global _loader
+    shms = [shared_memory.SharedMemory(name) for name in shm_names]
+    slots = [_slot_arrays(shm.buf, layout, nrows) for shm in shms]
+    _loader = (chunk_iterator, preprocess, shms, slots)
+
+def _loader_task(slot, chunk_name, start, stop):
+    chunk_iterator, preprocess, _, slots = _loader
+    chunk = chunk_iterator._load_rows(chunk_name, chunk_iterator.fields, start, stop)
+    chunk_iterator._verify_rows(chunk_name, chunk, start, stop)
+    item = chunk_iterator._slice_chunk(chunk, 0, stop-start)
+    if preprocess is not None:
+        item = preprocess(item)
+    nrows = {len(array) for array in item.values()}
+    if len(nrows) != 1 or set(item) != set(slots[slot]):
+        raise ValueError('Preprocessed item does not match the output fields.')
+    nrows, = nrows
+    for f, array in item.items():
+        slots[slot][f][:nrows] = array
+    return nrows
+
+class ParallelChunkIterator:
+    """Iterator over the items of a ChunkIterator, read and preprocessed in
+    multiple processes (see DatasetReader.iter_parallel)."""
+    def __init__(
+            self, chunk_iterator, preprocess=None, out_fields=None, nproc=None, nslots=None,
+            max_bytes=2**28,
+            ):
+        self._chunk_iterator = chunk_iterator
+        self.preprocess = preprocess
+        if out_fields is None:
+            out_fields = chunk_iterator._item_fields()
+        self.out_fields = out_fields
+        self.nproc = min(4, os.cpu_count() or 1) if nproc is None else nproc
+        if self.nproc < 1:
+            raise ValueError('nproc must be positive.')
+        self.nrows = max(
+                (stop-start for _, start, stop in chunk_iterator._iter_slices()), default=0
+                )
+        # Offsets of the fields in a slot.
+        self._layout = dict()
+        self._slot_nbytes = 0
+        for f, desc in out_fields.items():
+            dtype = np.dtype(desc['dtype'])
+            shape = tuple(desc['shape'])
+            self._layout[f] = (self._slot_nbytes, shape, dtype)
+            self._slot_nbytes = _align(
+                    self._slot_nbytes + self.nrows * dtype.itemsize * int(np.prod(shape))
+                    )
+        if nslots is None:
+            nslots = max(1, min(2*self.nproc, max_bytes // max(1, self._slot_nbytes)))
+        elif nslots < 1:
+            raise ValueError('nslots must be positive.')
+        self.nslots = nslots
+
+    def __iter__(self):
+        slices = self._chunk_iterator._iter_slices()
+        shms = [
+                shared_memory.SharedMemory(create=True, size=max(1, self._slot_nbytes))
+                for _ in range(self.nslots)
+                ]
+        slots = [_slot_arrays(shm.buf, self._layout, self.nrows) for shm in shms]
+        try:
+            with ProcessPoolExecutor(
+                    max_workers=self.nproc,
+                    initializer=_loader_init,
+                    initargs=(
+                        self._chunk_iterator, self.preprocess,
+                        [shm.name for shm in shms], self._layout, self.nrows,
+                        ),
+                    ) as executor:
+                pending = collections.deque(
+                        (slot, executor.submit(_loader_task, slot, *s))
+                        for slot, s in enumerate(it.islice(slices, self.nslots))
+                        )
+                try:
+                    while pending:
+                        slot, future = pending.popleft()
+                        nrows = future.result()
+                        yield {f: array[:nrows] for f, array in slots[slot].items()}
+                        # The slot is free once the next item is requested.
+                        for s in it.islice(slices, 1):
+                            pending.append((slot, executor.submit(_loader_task, slot, *s)))
+                finally:
+                    for _, future in pending:
+                        future.cancel()
+        finally:
+            del slots
+            for shm in shms:
+                shm.unlink()
+            _close_shm(shms)
+
+    def __len__(self):
+        return len(self._chunk_iterator)
+
+    @property
+    def n_traces(self):
+        return self._chunk_iterator.n_traces
+
+class ShuffledChunkIterator:
+    """See DatasetReader.iter_shuffled."""
+    def __init__(self, dataset_reader, batch_size, seed=None, fields=None, max_bytes=2**30, drop_last=False):
+        if batch_size < 1:
+            raise ValueError('batch_size must be positive.')
+        self._dataset_reader = dataset_reader
+        self.batch_size = batch_size
+        self.seed = seed
+        self.fields = [f for f in dataset_reader.fields if fields is None or f in fields]
+        self.drop_last = drop_last
+        row_nbytes = sum(
+                dataset_reader.fields[f]['dtype'].itemsize * int(np.prod(dataset_reader.fields[f]['shape']))
+                for f in self.fields
+                )
+        window = min(max_bytes // max(1, row_nbytes), len(dataset_reader))
+        self.window = max(batch_size, window)
+
+    def __iter__(self):
+        rng = np.random.default_rng(self.seed)
+        dr = self._dataset_reader
+        window = {
+                f: np.empty((self.window, *dr.fields[f]['shape']), dtype=dr.fields[f]['dtype'])
+                for f in self.fields
+                }
+        fill = 0
+        for chunk_id in rng.permutation(len(dr.chunk_name_list)):
+            chunk_name = dr.chunk_name_list[chunk_id]
+            chunk = dr.load_chunk(chunk_name, mmap_mode='r', fields=self.fields)
+            start = 0
+            nexec = dr.chunks[chunk_name]['nexec']
+            while start < nexec:
+                n = min(nexec - start, self.window - fill)
+                for f in self.fields:
+                    window[f][fill:fill+n] = chunk[f][start:start+n]
+                start += n
+                fill += n
+                if fill == self.window:
+                    fill = yield from self._shuffle_window(window, fill, rng, last=False)
+        yield from self._shuffle_window(window, fill, rng, last=True)
+
+    def _shuffle_window(self, window, fill, rng, last):
+        """Yield batches of shuffled traces from the window, and return the
+        number of remaining traces (moved to the start of the window)."""
+        perm = rng.permutation(fill)
+        nfull = fill - fill % self.batch_size
+        for start in range(0, nfull, self.batch_size):
+            yield {f: w[perm[start:start+self.batch_size]] for f, w in window.items()}
+        rem = perm[nfull:]
+        if last:
+            if len(rem) != 0 and not self.drop_last:
+                yield {f: w[rem] for f, w in window.items()}
+        else:
+            # Carry the remaining traces to the next window.
+            for w in window.values():
+                w[:len(rem)] = w[rem]
+        return len(rem)
+
+    def __len__(self):
+        ntraces = len(self._dataset_reader)
+        if self.drop_last:
+            return ntraces // self.batch_size
+        return -(-ntraces // self.batch_size)
+
+
+class BatchIterator:
+    """See DatasetReader.iter_batches."""
+    def __init__(self, chunk_iterator, batch_size, drop_last=False):
+        self._chunk_iterator = chunk_iterator
+        self.batch_size = batch_size
+        self.drop_last = drop_last
+
+    def _iter_batch_slices(self):
+        """Yield the batches as lists of (<chunk name>, <start>, <stop>)."""
+        batch = []
+        n = 0
+        for chunk_name, start, stop in self._chunk_iterator._iter_slices():
+            while start < stop:
+                k = min(stop - start, self.batch_size - n)
+                batch.append((chunk_name, start, start+k))
+                start += k
+                n += k
+                if n == self.batch_size:
+                    yield batch
+                    batch = []
+                    n = 0
+        if batch and not self.drop_last:
+            yield batch
+
+    def __iter__(self):
+        chunk_iterator = self._chunk_iterator
+        dr = chunk_iterator._dataset_reader
+        item_fields = chunk_iterator._item_fields()
+        out = {
+                f: _aligned_empty((self.batch_size, *desc['shape']), desc['dtype'], 64)
+                for f, desc in item_fields.items()
+                }
+        for batch in self._iter_batch_slices():
+            pos = 0
+            for chunk_name, start, stop in batch:
+                chunk_iterator._verify_rows(chunk_name, out, start, stop)
+                files = dr.chunks[chunk_name]['files']
+                for f, buffer in out.items():
+                    chunk_iterator._read_field(
+                            chunk_name, files[f], f, start, buffer[pos:pos+stop-start]
+                            )
+                pos += stop - start
+            yield {f: buffer[:pos] for f, buffer in out.items()}
+
+    def __len__(self):
+        if self.drop_last:
+            return self.n_traces // self.batch_size
+        return -(-self.n_traces // self.batch_size)
+
+    @property
+    def n_traces(self):
+        return self._chunk_iterator.n_traces
+
+
+class ConcatChunkIterator:
+    """Iterator over the items of several ChunkIterator.
+
+    weights: if None, the iterators are chained. Otherwise, items are
+    interleaved such that the number of traces taken from each iterator
+    remains proportional to its weight.
+    """
+    def __init__(self, iterators, weights=None):
+        if weights is not None and len(weights) != len(iterators):
+            raise ValueError('Bad number of weights.')
+        self._iterators = iterators
+        self.weights = weights
+
+    def __iter__(self):
+        if self.weights is None:
+            return it.chain.from_iterable(self._iterators)
+        return self._iter_interleaved()
+
+    def _iter_interleaved(self):
+        # Iterators without traces may have a zero weight.
+        active = [
+                (i, iter(iterator), weight)
+                for i, (iterator, weight) in enumerate(zip(self._iterators, self.weights))
+                if iterator.n_traces > 0
+                ]
+        if not all(weight > 0 for _, _, weight in active):
+            raise ValueError('The weights must be positive.')
+        consumed = [0] * len(self._iterators)
+        while active:
+            i, iterator, weight = min(active, key=lambda x: (consumed[x[0]] / x[2], x[0]))
+            try:
+                item = next(iterator)
+            except StopIteration:
+                active = [a for a in active if a[0] != i]
+                continue
+            consumed[i] += len(next(iter(item.values()))) if item else 1
+            yield item
 
+    def __len__(self):
+        return sum(len(iterator) for iterator in self._iterators)
+
+    @property
+    def n_traces(self):
+        return sum(iterator.n_traces for iterator in self._iterators)
 
-def _gen_manifest(dataset_id, metadata, chunks, fields, pretty=True):
+
+# Supported manifest versions: 1.0, and 1.1 for the manifests that readers of
+# version 1.0 cannot read correctly (see module doc).
+_MANIFEST_VERSIONS = ('1.0', '1.1')
+
+def _manifest_object(dataset_id, metadata, fields, layouts=None, version='1.0'):
     manifest = dict(
             about="SIMPLE-DATASET-MANIFEST",
-            version="1.0",
+            version=version,
             id=dataset_id,
             metadata=metadata,
             fields={
                 f_name: {'shape': f['shape'], 'dtype': f['dtype'].str}
                 for f_name, f in fields.items()
                 },
-            chunks=chunks,
             )
+    if layouts:
+        manifest['layouts'] = layouts
+    return manifest
+
+def _gen_manifest(dataset_id, metadata, chunks, fields, layouts=None, pretty=True):
+    rows = any(
+            'rows' in file or 'segment' in file
+            for chunk in chunks.values() for file in chunk['files'].values()
+            )
+    manifest = _manifest_object(dataset_id, metadata, fields, version='1.1' if rows else '1.0')
+    manifest['chunks'] = dict(chunks.items())
+    if layouts:
+        manifest['layouts'] = layouts
     return json.dumps(manifest, indent=4 if pretty else None)
 
-def _sha256sum(path):
+_BINARY_MANIFEST_MAGIC = b'SIMPLE-DATASET-MANIFEST-BINARY\n'
+_BINARY_MANIFEST_ALIGN = 64
+
+def _align(offset):
+    return -(-offset // _BINARY_MANIFEST_ALIGN) * _BINARY_MANIFEST_ALIGN
+
+def _bytes_array(strings):
+    return np.array([s.encode() for s in strings], dtype=bytes)
+
+def _gen_binary_manifest(dataset_id, metadata, chunks, fields, layouts=None):
+    chunk_names = list(chunks)
+    chunk_list = [chunks[cn] for cn in chunk_names]
+    arrays = dict(
+            chunk_names=_bytes_array(chunk_names),
+            nexec=np.array([chunk['nexec'] for chunk in chunk_list], dtype=np.int64),
+            )
+    for f in fields:
+        # A missing file is encoded as an empty path.
+        files = [chunk['files'].get(f, dict(path='', hash='')) for chunk in chunk_list]
+        arrays[f'files/{f}/path'] = _bytes_array(file['path'] for file in files)
+        arrays[f'files/{f}/hash'] = _bytes_array(file['hash'] for file in files)
+        extras = [{k: v for k, v in file.items() if k not in ('path', 'hash')} for file in files]
+        if any(extras):
+            arrays[f'files/{f}/extra'] = _bytes_array(json.dumps(e) if e else '' for e in extras)
+    chunk_extras = [
+            {k: v for k, v in chunk.items() if k not in ('nexec', 'files')}
+            for chunk in chunk_list
+            ]
+    if any(chunk_extras):
+        arrays['chunk_extra'] = _bytes_array(json.dumps(e) if e else '' for e in chunk_extras)
+    header = _manifest_object(dataset_id, metadata, fields, layouts, version='1.1')
+    header['arrays'] = dict()
+    offset = 0
+    for name, array in arrays.items():
+        header['arrays'][name] = dict(offset=offset, dtype=array.dtype.str, shape=list(array.shape))
+        offset = _align(offset + array.nbytes)
+    header_bytes = json.dumps(header).encode()
+    f = io.BytesIO()
+    f.write(_BINARY_MANIFEST_MAGIC)
+    f.write(np.array(len(header_bytes), dtype='<u8').tobytes())
+    f.write(header_bytes)
+    data_start = _align(f.tell())
+    for name, array in arrays.items():
+        f.seek(data_start + header['arrays'][name]['offset'])
+        f.write(array.tobytes())
+    return f.getvalue()
+
+def _read_binary_manifest(manifest_path):
+    """Returns the manifest object, where "chunks" is an _IndexedChunks.
+
+    manifest_path: path of the manifest, or its content (bytes).
+    """
+    data = manifest_path if isinstance(manifest_path, (bytes, bytearray)) else None
+    with open(manifest_path, 'rb') if data is None else io.BytesIO(data) as f:
+        f.seek(len(_BINARY_MANIFEST_MAGIC))
+        header_len = int(np.frombuffer(f.read(8), dtype='<u8')[0])
+        try:
+            manifest = json.loads(f.read(header_len))
+        except ValueError as e:
+            raise DatasetError('Badly-formed manifest.') from e
+    data_start = _align(len(_BINARY_MANIFEST_MAGIC) + 8 + header_len)
+    try:
+        arrays = dict()
+        for name, a in manifest.pop('arrays').items():
+            shape = tuple(a['shape'])
+            if np.prod(shape) == 0:
+                arrays[name] = np.empty(shape, dtype=a['dtype'])
+            elif data is not None:
+                arrays[name] = np.frombuffer(
+                        data,
+                        dtype=np.dtype(a['dtype']),
+                        count=int(np.prod(shape)),
+                        offset=data_start + a['offset'],
+                        ).reshape(shape)
+            else:
+                arrays[name] = np.memmap(
+                        manifest_path,
+                        dtype=np.dtype(a['dtype']),
+                        mode='r',
+                        offset=data_start + a['offset'],
+                        shape=shape,
+                        )
+        manifest['chunks'] = _IndexedChunks(arrays, list(manifest['fields']))
+    except (KeyError, ValueError) as e:
+        raise DatasetError('Badly-formed manifest.') from e
+    return manifest
+
+class _IndexedChunks(collections.abc.Mapping):
+    """Read-only {<chunk name>: <chunk object>} mapping over the arrays of a
+    binary manifest. Chunk objects are built on access, and the index of the
+    chunk names on the first lookup."""
+    def __init__(self, arrays, fields, order=None):
+        self._arrays = arrays
+        self._fields = fields
+        # {<chunk name>: <position in the arrays>}
+        self._index = None
+        # None for the order of the arrays.
+        self._order = None
+        if order is not None:
+            self._order = [str(cn) for cn in order]
+            if sorted(self._order) != sorted(self._names()):
+                raise KeyError('Bad chunk order.')
+
+    def _names(self):
+        return (name.decode() for name in self._arrays['chunk_names'])
+
+    def _position(self, chunk_name):
+        if self._index is None:
+            self._index = {name: i for i, name in enumerate(self._names())}
+        return self._index[chunk_name]
+
+    def reorder(self, order):
+        return type(self)(self._arrays, self._fields, order)
+
+    def nexecs(self):
+        nexec = self._arrays['nexec']
+        if self._order is None:
+            return nexec.tolist()
+        return nexec[[self._position(cn) for cn in self._order]].tolist()
+
+    def __getitem__(self, chunk_name):
+        i = self._position(chunk_name)
+        files = dict()
+        for f in self._fields:
+            path = self._arrays[f'files/{f}/path'][i].decode()
+            if not path:
+                continue
+            files[f] = dict(path=path, hash=self._arrays[f'files/{f}/hash'][i].decode())
+            extra = self._arrays.get(f'files/{f}/extra')
+            if extra is not None and extra[i]:
+                files[f].update(json.loads(extra[i]))
+        chunk = dict(nexec=int(self._arrays['nexec'][i]), files=files)
+        extra = self._arrays.get('chunk_extra')
+        if extra is not None and extra[i]:
+            chunk.update(json.loads(extra[i]))
+        return chunk
+
+    def __iter__(self):
+        return self._names() if self._order is None else iter(self._order)
+
+    def __len__(self):
+        return len(self._arrays['chunk_names']) if self._order is None else len(self._order)
+
+    def __contains__(self, chunk_name):
+        try:
+            self._position(chunk_name)
+        except KeyError:
+            return False
+        return True
+
+class _HashingWriter:
+    """Writable file wrapper that computes the hash of the written data (with
+    hasher, default: SHA-256)."""
+    def __init__(self, f, hasher=None):
+        self._f = f
+        self.hasher = hashlib.sha256() if hasher is None else hasher
+
+    def write(self, data):
+        self.hasher.update(data)
+        return self._f.write(data)
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+# Number of rows read at once when computing statistics.
+_STATS_BLOCK_ROWS = 2**12
+
+def _chunk_stats(dr, chunk_name, field):
+    """Statistics (SampleStats) of a field in a chunk (with n=0 and zero
+    arrays for an empty chunk)."""
+    array = dr.load_chunk(chunk_name, mmap_mode='r', fields=[field])[field]
+    if array.shape[0] == 0:
+        zeros = np.zeros(array.shape[1:])
+        return SampleStats(0, zeros, zeros, zeros.astype(array.dtype), zeros.astype(array.dtype))
+    stats = []
+    for start, stop in split_slice(0, array.shape[0], _STATS_BLOCK_ROWS):
+        block = np.asarray(array[start:stop], dtype=np.float64)
+        mean = block.mean(axis=0)
+        dev = block - mean
+        stats.append(SampleStats(
+            stop-start, mean, np.sum(dev*dev, axis=0),
+            array[start:stop].min(axis=0), array[start:stop].max(axis=0),
+            ))
+    return SampleStats.merge(stats)
+
+def _read_stats(path):
+    """Entries of a statistics file: {<key>: SampleStats}."""
+    try:
+        with np.load(path) as f:
+            arrays = {k: f[k] for k in ('keys', 'n', 'mean', 'm2', 'min', 'max')}
+    except FileNotFoundError:
+        return dict()
+    except (OSError, ValueError, KeyError) as e:
+        warnings.warn(f'Could not read statistics file {path}: {e}')
+        return dict()
+    return {
+            str(key): SampleStats(int(n), mean, m2, mn, mx)
+            for key, n, mean, m2, mn, mx in zip(*(arrays[k] for k in ('keys', 'n', 'mean', 'm2', 'min', 'max')))
+            }
+
+def _write_stats(path, entries, field):
+    """Atomically write a statistics file."""
+    keys = list(entries)
+    def stack(name, dtype):
+        return np.array(
+                [getattr(entries[k], name) for k in keys], dtype=dtype
+                ).reshape((len(keys), *field['shape']))
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix='.npz')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(
+                    f,
+                    keys=np.array(keys, dtype=str),
+                    n=np.array([entries[k].n for k in keys], dtype=np.int64),
+                    mean=stack('mean', np.float64),
+                    m2=stack('m2', np.float64),
+                    min=stack('min', field['dtype']),
+                    max=stack('max', field['dtype']),
+                    )
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _read_journal(journal):
+    """Returns {(<path>, <expected hash>, <size>, <mtime_ns>): <hash ok>} for
+    the entries in a validation journal. Truncated entries (interrupted writes)
+    are ignored.
+    """
+    entries = dict()
+    try:
+        with open(journal, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    key = (entry['path'], entry['hash'], entry['size'], entry['mtime_ns'])
+                    entries[key] = entry['ok']
+                except (ValueError, KeyError, TypeError):
+                    pass
+    except FileNotFoundError:
+        pass
+    return entries
+
+_MERKLE_SCHEME = 'blake2b-'
+# Size of the parts of the files hashed by a validation task (block hashes).
+_MERKLE_TASK_NBYTES = 2**26
+
+def hash_hex(h):
+    """Hex of a hash ("sha256-<hex>" or "blake2b-<hex>")."""
+    for hash_scheme in ('sha256-', _MERKLE_SCHEME):
+        if h.startswith(hash_scheme) and len(h) > len(hash_scheme):
+            return h[len(hash_scheme):]
+    raise DatasetError(f'Unknown hash scheme: {h}.')
+
+def _block_digest(data):
+    return hashlib.blake2b(data, digest_size=32).digest()
+
+def _merkle_root(block_size, digests):
+    h = hashlib.blake2b(block_size.to_bytes(8, 'little'), digest_size=32)
+    for digest in digests:
+        h.update(digest)
+    return h.hexdigest()
+
+class MerkleHasher:
+    """Computes block hashes (see module doc), with the interface of the
+    hashlib objects (update and hexdigest)."""
+    def __init__(self, block_size):
+        self.block_size = block_size
+        self.digests = []
+        self._block = bytearray()
+
+    def update(self, data):
+        data = memoryview(data).cast('B')
+        while len(data):
+            if not self._block and len(data) >= self.block_size:
+                self.digests.append(_block_digest(data[:self.block_size]))
+                data = data[self.block_size:]
+                continue
+            n = min(len(data), self.block_size - len(self._block))
+            self._block += data[:n]
+            data = data[n:]
+            if len(self._block) == self.block_size:
+                self.digests.append(_block_digest(self._block))
+                self._block.clear()
+
+    def all_digests(self):
+        if self._block or not self.digests:
+            return self.digests + [_block_digest(self._block)]
+        return self.digests
+
+    def hexdigest(self):
+        return _merkle_root(self.block_size, self.all_digests())
+
+def new_hasher(file):
+    """Hasher for the hash of a file object."""
+    if file['hash'].startswith(_MERKLE_SCHEME):
+        return MerkleHasher(file['blocks']['size'])
+    hash_hex(file['hash'])
+    return hashlib.sha256()
+
+def hash_entries(hasher):
+    """"hash" (and "blocks") entries of a file object for a hasher."""
+    if isinstance(hasher, MerkleHasher):
+        return dict(
+                hash=_MERKLE_SCHEME + hasher.hexdigest(),
+                blocks=dict(size=hasher.block_size, digests=[d.hex() for d in hasher.all_digests()]),
+                )
+    return dict(hash='sha256-' + hasher.hexdigest())
+
+def _block_digests(file):
+    """Block hashes of a file object, checked against the root hash."""
+    blocks = file['blocks']
+    digests = [bytes.fromhex(d) for d in blocks['digests']]
+    if _merkle_root(blocks['size'], digests) != hash_hex(file['hash']):
+        raise CorruptedDatasetError(f'Block hashes do not match the hash of {file["path"]}.')
+    return digests
+
+def _read_stream_ranges(storage, path, stream, ranges):
+    """Contents of the byte ranges [(<start>, <stop>), ...] of a stream (see
+    DatasetReader.hash_stream), truncated to its size."""
+    prefix, offset, size = stream
+    ranges = [(start, min(stop, len(prefix) + size)) for start, stop in ranges]
+    file_ranges = [
+            (offset + max(start-len(prefix), 0), stop - max(start, len(prefix)))
+            for start, stop in ranges
+            ]
+    data = iter(storage.read_ranges(path, [r for r in file_ranges if r[1] > 0]))
+    return [
+            bytes(prefix[start:stop]) + (bytes(next(data)) if n > 0 else b'')
+            for (start, stop), (_, n) in zip(ranges, file_ranges)
+            ]
+
+def iter_stream(storage, path, stream, piece_size=2**22):
+    prefix, _, size = stream
+    for start in range(0, len(prefix) + size, piece_size):
+        yield _read_stream_ranges(storage, path, stream, [(start, start+piece_size)])[0]
+
+def hash_tasks(path, hash_range, file):
+    """Tasks computing the hash of the (local) file at path (see sha256sum
+    for hash_range): ([(<function>, <args>), ...], <combine>), where
+    combine(<results of the tasks>) is the hex of the hash, or None if the file
+    is missing."""
+    if not file['hash'].startswith(_MERKLE_SCHEME):
+        return [(_try_sha256sum, (path, hash_range))], lambda results: results[0]
+    block_size = file['blocks']['size']
+    nblocks = len(file['blocks']['digests'])
+    group = max(1, _MERKLE_TASK_NBYTES // block_size)
+    # The last task also checks the size of the file.
+    tasks = [
+            (_try_block_digests, (
+                path, hash_range, block_size, first, min(first+group, nblocks),
+                first+group >= nblocks,
+                ))
+            for first in range(0, nblocks, group)
+            ]
+    def combine(results):
+        if any(r is None for r in results):
+            return None
+        return _merkle_root(block_size, [d for r in results for d in r])
+    return tasks, combine
+
+def _try_block_digests(path, hash_range, block_size, first, stop, last=False):
+    """Block hashes [first, stop) of the (local) file at path (see
+    sha256sum for hash_range), followed by an invalid hash if last and the
+    file has more blocks. None if the file is missing."""
+    path = pathlib.Path(path)
+    storage = LocalStorage(path.parent)
+    try:
+        stream = (b'', 0, os.stat(path).st_size) if hash_range is None else hash_range
+        blocks = _read_stream_ranges(storage, path.name, stream, [
+            (i*block_size, (i+1)*block_size) for i in range(first, stop)
+            ])
+    except OSError:
+        return None
+    except CorruptedDatasetError:
+        # Truncated file.
+        return [b'']
+    digests = [_block_digest(block) for block in blocks]
+    if last and len(stream[0]) + stream[2] > stop*block_size:
+        digests.append(b'')
+    return digests
+
+def _try_sha256sum(path, hash_range=None):
+    try:
+        return sha256sum(path, hash_range)
+    except OSError:
+        return None
+
+def sha256sum(path, hash_range=None):
+    """Hash of the file at path, or, if hash_range is (<header>, <offset>,
+    <size>), of header followed by the bytes [offset, offset+size) of the
+    file."""
     h  = hashlib.sha256()
     b  = bytearray(128*1024)
     mv = memoryview(b)
     with open(path, 'rb', buffering=0) as f:
-        for n in iter(lambda : f.readinto(mv), 0):
-            h.update(mv[:n])
+        if hash_range is None:
+            for n in iter(lambda : f.readinto(mv), 0):
+                h.update(mv[:n])
+        else:
+            header, offset, remaining = hash_range
+            h.update(header)
+            f.seek(offset)
+            while remaining:
+                n = f.readinto(mv[:min(len(mv), remaining)])
+                if not n:
+                    break
+                h.update(mv[:n])
+                remaining -= n
     return h.hexdigest()
 
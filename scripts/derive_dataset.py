@@ -0,0 +1,192 @@
+"""Derive a new dataset by applying transforms to the traces of a dataset.
+
+The transforms are applied chunk by chunk (in parallel), by blocks of rows
+that are written as they are computed, and the other fields are copied. The metadata of the new dataset records its provenance:
+"derived_from": {"id": <source dataset id>, "transforms": [<parameters>, ...]}.
+
+Example: sum pairs of adjacent samples, then keep the first 1000 samples:
+    python derive_dataset.py --dataset vk0/manifest.json --new vk0_ds2/manifest.json \
+            --transform downsample:2 --transform crop:0:1000
+"""
+import argparse
+
+import numpy as np
+
+import dataset
+
+FIELD = 'traces'
+
+def _clip_cast(traces, dtype):
+    info = np.iinfo(dtype)
+    return np.clip(traces, info.min, info.max).astype(dtype)
+
+def _int_dtype(dtype):
+    dtype = np.dtype(dtype)
+    if dtype.kind not in 'iu':
+        raise ValueError(f'Not an integer dtype: {dtype}.')
+    return dtype
+
+class Downsample:
+    """Sum groups of `factor` adjacent samples (the last incomplete group is
+    dropped). The result is saturated to the range of the output dtype
+    (default: input dtype)."""
+    def __init__(self, factor, dtype=None):
+        self.factor = int(factor)
+        if self.factor < 1:
+            raise ValueError('The factor must be positive.')
+        self.dtype = None if dtype is None else _int_dtype(dtype)
+
+    def field(self, field):
+        dtype = _int_dtype(field['dtype'] if self.dtype is None else self.dtype)
+        return dict(shape=[field['shape'][0] // self.factor], dtype=dtype)
+
+    def __call__(self, traces):
+        nsamples = traces.shape[1] // self.factor
+        sums = np.sum(
+                traces[:, :nsamples*self.factor].reshape(traces.shape[0], nsamples, self.factor),
+                axis=2,
+                dtype=np.int64,
+                )
+        return _clip_cast(sums, traces.dtype if self.dtype is None else self.dtype)
+
+    def params(self):
+        return dict(
+                transform='downsample',
+                factor=self.factor,
+                dtype=None if self.dtype is None else self.dtype.str,
+                )
+
+class Crop:
+    """Keep the samples in [start, stop)."""
+    def __init__(self, start, stop):
+        self.start = int(start)
+        self.stop = int(stop)
+
+    def field(self, field):
+        nsamples = len(range(field['shape'][0])[self.start:self.stop])
+        return dict(shape=[nsamples], dtype=field['dtype'])
+
+    def __call__(self, traces):
+        return traces[:, self.start:self.stop]
+
+    def params(self):
+        return dict(transform='crop', start=self.start, stop=self.stop)
+
+class Quantize:
+    """Divide by 2**shift (arithmetic right shift) and saturate to dtype."""
+    def __init__(self, dtype='int8', shift=0):
+        self.dtype = _int_dtype(dtype)
+        self.shift = int(shift)
+        if self.shift < 0:
+            raise ValueError('The shift must not be negative.')
+
+    def field(self, field):
+        _int_dtype(field['dtype'])
+        return dict(shape=field['shape'], dtype=self.dtype)
+
+    def __call__(self, traces):
+        return _clip_cast(traces.astype(np.int64) >> self.shift, self.dtype)
+
+    def params(self):
+        return dict(transform='quantize', dtype=self.dtype.str, shift=self.shift)
+
+TRANSFORMS = {
+        'downsample': Downsample,
+        'crop': Crop,
+        'quantize': Quantize,
+        }
+
+def parse_transform(spec):
+    """Parse a '<name>:<arg>:<arg>...' transform specification."""
+    name, *args = spec.split(':')
+    if name not in TRANSFORMS:
+        raise argparse.ArgumentTypeError(f'Unknown transform {name} in {spec}.')
+    try:
+        return TRANSFORMS[name](*args)
+    except (TypeError, ValueError) as e:
+        raise argparse.ArgumentTypeError(f'Bad transform {spec}: {e}') from e
+
+def derive_chunk(dr, chunk_name, transforms, dest_path, dataset_id, metadata, fields, max_chunk_size):
+    """Derive a chunk and write it by blocks of max_chunk_size rows. Returns
+    the new chunk object."""
+    nexec = dr.chunks[chunk_name]['nexec']
+    def blocks():
+        for start, stop in dataset.split_slice(0, nexec, max_chunk_size):
+            block = dr.load_chunk(chunk_name, mmap_mode='r', fields=fields, start=start, stop=stop)
+            for transform in transforms:
+                block[FIELD] = transform(block[FIELD])
+            yield block
+    # The manifest is written by the main process.
+    dw = dataset.DatasetWriter(dest_path, dataset_id, metadata, fields)
+    dw.add_chunk_rows(chunk_name, nexec, blocks())
+    return dw.chunks[chunk_name]
+
+def derive(dr, dest_path, transforms, dataset_id=None, nproc=None, max_chunk_size=2**14):
+    if dataset_id is None:
+        dataset_id = dr.id + '-derived'
+    provenance = dict(id=dr.id, transforms=[t.params() for t in transforms])
+    if 'derived_from' in dr.metadata:
+        provenance['derived_from'] = dr.metadata['derived_from']
+    metadata = dict(dr.metadata, derived_from=provenance)
+    fields = {f: dict(desc) for f, desc in dr.fields.items()}
+    for transform in transforms:
+        fields[FIELD] = transform.field(fields[FIELD])
+    if fields[FIELD]['shape'][0] == 0:
+        raise ValueError('The derived traces have no samples.')
+    with dataset.ReaderPoolExecutor(dr, max_workers=nproc) as executor:
+        futures = {
+                chunk_name: executor.submit(
+                    derive_chunk, chunk_name, transforms, dest_path,
+                    dataset_id, metadata, fields, max_chunk_size,
+                    )
+                for chunk_name in dr.chunks
+                }
+        with dataset.DatasetWriter(dest_path, dataset_id, metadata, fields) as dw:
+            for chunk_name, future in futures.items():
+                dw.add_existing_chunk(chunk_name, future.result())
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Derive a dataset by applying transforms to the traces.'
+        )
+    parser.add_argument(
+            '--dataset',
+            type=str,
+            required=True,
+            help='Existing dataset path (to manifest).',
+            )
+    parser.add_argument(
+            '--new',
+            type=str,
+            required=True,
+            help='Path of the manifest of the new dataset.',
+            )
+    parser.add_argument(
+            '--id',
+            type=str,
+            default=None,
+            help='Id of the new dataset (default: <id of the dataset>-derived).',
+            )
+    parser.add_argument(
+            '--transform',
+            type=parse_transform,
+            action='append',
+            required=True,
+            help='Transform (applied in order): ' +
+            'downsample:<factor>[:<dtype>], crop:<start>:<stop> or quantize:<dtype>[:<shift>].',
+            )
+    parser.add_argument(
+            '--nproc',
+            type=int,
+            default=None,
+            help='Number of processes (default: number of CPUs).',
+            )
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    dr = dataset.DatasetReader.from_manifest(args.dataset)
+    derive(dr, args.new, args.transform, args.id, args.nproc)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Pack the files of the chunks of a dataset into one segment file per field.
+
+The rows of all the chunks of a field are copied (by a pool of processes) into
+a single .npy file, and the new manifest references them with "segment" file
+objects (see dataset.py), which keep the hashes of the original files. This
+avoids opening many small files for datasets with many chunks (e.g., after
+split_dataset.py).
+
+Compressed files and files referencing rows of other files (see
+DatasetReader.subset_rows) are not packed, and neither are the missing files
+and the files whose .npy header is not the standard one (as the hash could not
+be kept).
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import dataset
+
+def packable(dr, chunk_name, field):
+    """True if the file of field in the chunk can be packed (False if it is
+    missing)."""
+    file = dr.chunks[chunk_name]['files'][field]
+    if any(k in file for k in ('codec', 'rows', 'segment')):
+        return False
+    desc = dr.fields[field]
+    header = dataset.npy_header(desc['dtype'], (dr.chunks[chunk_name]['nexec'], *desc['shape']))
+    try:
+        with open(dr.base_path / file['path'], 'rb') as f:
+            return f.read(len(header)) == header
+    except FileNotFoundError:
+        return False
+
+def pack_rows(dr, chunk_name, field, segment_path, offset):
+    """Copy the array of the field in the chunk to the rows [offset, ...) of
+    the segment file, and check that the hash is kept."""
+    array = dr.load_chunk(chunk_name, mmap_mode='r', fields=[field])[field]
+    # The processes write to disjoint rows of shared mappings.
+    out = np.load(segment_path, mmap_mode='r+')
+    out[offset:offset+array.shape[0]] = array
+    out.flush()
+    del out
+    file = dr.chunks[chunk_name]['files'][field]
+    hash_range, _ = dr.hash_stream(
+            field, dict(file, segment=[offset, array.shape[0]]),
+            dataset.LocalStorage(segment_path.parent), segment_path.name,
+            )
+    tasks, combine = dataset.hash_tasks(segment_path, hash_range, file)
+    if combine([task(*args) for task, args in tasks]) != dataset.hash_hex(file['hash']):
+        raise dataset.CorruptedDatasetError(f'Hash mismatch for chunk {chunk_name}, field {field}.')
+
+def pack(dr, dest_path, nproc=None):
+    dest_path = Path(dest_path)
+    segment_dir = Path('.') / (dest_path.stem + '_segments')
+    (dest_path.parent / segment_dir).mkdir(parents=True, exist_ok=True)
+    chunks = {chunk_name: dict(chunk, files=dict(chunk['files'])) for chunk_name, chunk in dr.chunks.items()}
+    with ThreadPoolExecutor() as executor:
+        to_pack = {
+                field: [
+                    chunk_name for chunk_name, ok in zip(dr.chunk_name_list, executor.map(
+                        lambda chunk_name: packable(dr, chunk_name, field), dr.chunk_name_list
+                        ))
+                    if ok
+                    ]
+                for field in dr.fields
+                }
+    with dataset.ReaderPoolExecutor(dr, max_workers=nproc) as executor:
+        futures = []
+        for field, chunk_names in to_pack.items():
+            if not chunk_names:
+                continue
+            rel_path = segment_dir / f'{field}.npy'
+            segment_path = dest_path.parent / rel_path
+            nrows = sum(dr.chunks[chunk_name]['nexec'] for chunk_name in chunk_names)
+            desc = dr.fields[field]
+            np.lib.format.open_memmap(
+                    segment_path, mode='w+', dtype=desc['dtype'], shape=(nrows, *desc['shape'])
+                    )
+            offset = 0
+            for chunk_name in chunk_names:
+                nexec = dr.chunks[chunk_name]['nexec']
+                futures.append(executor.submit(
+                    pack_rows, chunk_name, field, segment_path, offset
+                    ))
+                # The hash (and block hashes) are kept.
+                chunks[chunk_name]['files'][field] = dict(
+                        dr.chunks[chunk_name]['files'][field],
+                        path=str(rel_path),
+                        segment=[offset, nexec],
+                        )
+                offset += nexec
+        for future in futures:
+            future.result()
+    with dataset.DatasetWriter(dest_path, dr.id, dr.metadata, dr.fields) as dw:
+        for chunk_name, chunk in chunks.items():
+            dw.add_existing_chunk(chunk_name, chunk)
+        for field_name, field_layout in dr.layouts.items():
+            dw.add_layout(field_name, field_layout)
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Pack the files of the chunks of a dataset into one segment file per field.'
+        )
+    parser.add_argument(
+            '--dataset',
+            type=str,
+            required=True,
+            help='Existing dataset path (to manifest).',
+            )
+    parser.add_argument(
+            '--new',
+            type=str,
+            default="manifest_packed.json",
+            help='Name of the new manifest.',
+            )
+    parser.add_argument(
+            '--nproc',
+            type=int,
+            default=None,
+            help='Number of processes (default: number of CPUs).',
+            )
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    dest_path = Path(args.dataset).parent / args.new
+    dr = dataset.DatasetReader.from_manifest(args.dataset)
+    pack(dr, dest_path, args.nproc)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Replace the hashes of the files of a dataset by block hashes.
+
+Block hashes (see dataset.py) allow verifying only parts of the files, in
+parallel (DatasetReader.validate) or while reading (iter_ntraces with
+verify=True). The files are read once (by a pool of processes) to check their
+current hash and compute the block hashes. The data files are not modified.
+"""
+import argparse
+from pathlib import Path
+
+import dataset
+
+def rehash_file(dr, chunk_name, field, block_size):
+    """Returns the file object of the field in the chunk with block hashes."""
+    file = dr.chunks[chunk_name]['files'][field]
+    storage, path = dr.file_storage(file)
+    stream, _ = dr.hash_stream(field, file, storage, path)
+    hasher = dataset.new_hasher(file)
+    merkle_hasher = dataset.MerkleHasher(block_size)
+    for data in dataset.iter_stream(storage, path, stream):
+        hasher.update(data)
+        merkle_hasher.update(data)
+    if hasher.hexdigest() != dataset.hash_hex(file['hash']):
+        raise dataset.CorruptedDatasetError(f'Hash mismatch for chunk {chunk_name}, field {field}.')
+    new_file = {k: v for k, v in file.items() if k not in ('hash', 'blocks')}
+    return dict(new_file, **dataset.hash_entries(merkle_hasher))
+
+def rehash(dr, dest_path, block_size, nproc=None):
+    with dataset.ReaderPoolExecutor(dr, max_workers=nproc) as executor:
+        futures = {
+                chunk_name: {
+                    field: executor.submit(rehash_file, chunk_name, field, block_size)
+                    for field in chunk['files']
+                    }
+                for chunk_name, chunk in dr.chunks.items()
+                }
+        with dataset.DatasetWriter(dest_path, dr.id, dr.metadata, dr.fields) as dw:
+            for chunk_name, files in futures.items():
+                dw.add_existing_chunk(chunk_name, dict(
+                    dr.chunks[chunk_name],
+                    files={field: future.result() for field, future in files.items()},
+                    ))
+            for field_name, field_layout in dr.layouts.items():
+                dw.add_layout(field_name, field_layout)
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Replace the hashes of the files of a dataset by block hashes.'
+        )
+    parser.add_argument(
+            '--dataset',
+            type=str,
+            required=True,
+            help='Existing dataset path (to manifest).',
+            )
+    parser.add_argument(
+            '--new',
+            type=str,
+            default="manifest_blocks.json",
+            help='Name of the new manifest.',
+            )
+    parser.add_argument(
+            '--block-size',
+            type=int,
+            default=2**20,
+            help='Size of the blocks, in bytes (default: 1 MiB).',
+            )
+    parser.add_argument(
+            '--nproc',
+            type=int,
+            default=None,
+            help='Number of processes (default: number of CPUs).',
+            )
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    dest_path = Path(args.dataset).parent / args.new
+    dr = dataset.DatasetReader.from_manifest(args.dataset)
+    rehash(dr, dest_path, args.block_size, args.nproc)
+
+if __name__ == '__main__':
+    main()
@@ -24,21 +24,30 @@ def rename(src, dest):
 manifest_path = Path(args.dataset)
 
 with open(manifest_path, 'rb') as f:
+    if f.read(len(b'SIMPLE-DATASET-MANIFEST-BINARY')) == b'SIMPLE-DATASET-MANIFEST-BINARY':
+        parser.error('Binary manifests are not supported (see convert_manifest.py).')
+    f.seek(0)
     manifest = json.load(f)
 
 shutil.copyfile(manifest_path, manifest_path.with_suffix('.json.bak'))
 
-
-for chunk in manifest['chunks'].values():
-    for file in chunk['files'].values():
-        file_path = Path(file['path'])
+# Files referenced by the chunks and the layouts. Several chunks may reference
+# the same file ("rows" and "segment" file objects), which is renamed once.
+files = [file for chunk in manifest['chunks'].values() for file in chunk['files'].values()]
+files += [file for layout in manifest.get('layouts', dict()).values() for file in layout['files']]
+new_paths = dict()
+for file in files:
+    file_path = Path(file['path'])
+    if file_path not in new_paths:
         token = secrets.token_hex(16)
-        new_file_path = file_path.parent / (token + file_path.suffix)
-        file['path'] = str(new_file_path)
-        rename(
-            manifest_path.parent / file_path,
-            manifest_path.parent / new_file_path,
-            )
+        new_paths[file_path] = file_path.parent / (token + file_path.suffix)
+    file['path'] = str(new_paths[file_path])
+
+for file_path, new_file_path in new_paths.items():
+    rename(
+        manifest_path.parent / file_path,
+        manifest_path.parent / new_file_path,
+        )
 
 with open(manifest_path, 'w') as f:
     json.dump(manifest, f, indent=4)
@@ -0,0 +1,91 @@
+"""Serve a dataset directory over HTTP, with support for range requests.
+
+The dataset can then be read with HTTPStorage, e.g.,
+    dataset.DatasetReader.from_manifest('http://<host>:<port>/manifest.json')
+"""
+import argparse
+import functools
+import http.server
+import os
+import re
+
+_RANGE_RE = re.compile(r'bytes=(\d+)-(\d*)$')
+
+class _LimitedReader:
+    """Reads at most size bytes from f."""
+    def __init__(self, f, size):
+        self._f = f
+        self._size = size
+
+    def read(self, n=-1):
+        if n < 0 or n > self._size:
+            n = self._size
+        data = self._f.read(n)
+        self._size -= len(data)
+        return data
+
+    def close(self):
+        self._f.close()
+
+class RangeRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """SimpleHTTPRequestHandler with persistent connections and single-range
+    requests ("Range: bytes=<first>-[<last>]")."""
+    protocol_version = 'HTTP/1.1'
+
+    def send_head(self):
+        match = _RANGE_RE.match(self.headers.get('Range', ''))
+        path = self.translate_path(self.path)
+        if match is None or os.path.isdir(path):
+            return super().send_head()
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self.send_error(http.HTTPStatus.NOT_FOUND, 'File not found')
+            return None
+        size = os.fstat(f.fileno()).st_size
+        first = int(match.group(1))
+        last = size - 1 if not match.group(2) else min(int(match.group(2)), size - 1)
+        if first >= size or last < first:
+            f.close()
+            self.send_response(http.HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None
+        f.seek(first)
+        self.send_response(http.HTTPStatus.PARTIAL_CONTENT)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Range', f'bytes {first}-{last}/{size}')
+        self.send_header('Content-Length', str(last - first + 1))
+        self.end_headers()
+        return _LimitedReader(f, last - first + 1)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve a dataset directory over HTTP (with range requests).'
+        )
+    parser.add_argument(
+            '--directory',
+            type=str,
+            default='.',
+            help='Directory to serve (default: current directory).',
+            )
+    parser.add_argument(
+            '--port',
+            type=int,
+            default=8000,
+            help='Port (default: 8000).',
+            )
+    parser.add_argument(
+            '--bind',
+            type=str,
+            default='127.0.0.1',
+            help='Address to bind (default: 127.0.0.1).',
+            )
+    args = parser.parse_args()
+    handler = functools.partial(RangeRequestHandler, directory=args.directory)
+    with http.server.ThreadingHTTPServer((args.bind, args.port), handler) as server:
+        server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -244,21 +244,9 @@ class SubmissionTest:
             return np.array(ubs)
 
 def _make_attack_dataset(dataset, n_attack_traces):
-    chunk_sizes = [(cv['nexec'], cn) for cn, cv in dataset.chunks.items()]
-    chunk_sizes.sort(key=lambda x: x[0],reverse=True)
-    tot_nexec = 0
-    used_chunks = []
-    for nexec, chunk_name in chunk_sizes:
-        if tot_nexec + nexec <= n_attack_traces:
-            tot_nexec += nexec
-            used_chunks.append(chunk_name)
-    if tot_nexec != n_attack_traces:
-        raise ValueError(
-            "Could not make dataset with {n_attack_traces} traces. "
-            + "Dataset is too small." if n_attack_traces > len(dataset) else
-            "Files are not split in small chunks (use split_dataset.py)."
-        )
-    return dataset.subset(used_chunks, ATTACK_FIELDS)
+    # A part of a chunk is referenced (without copy) if needed, in which case
+    # the manifest has version 1.1 (older readers refuse it).
+    return dataset.subset_ntraces(n_attack_traces, ATTACK_FIELDS)
 
 class PythonSubmissionTest(SubmissionTest):
     def __init__(self, args):
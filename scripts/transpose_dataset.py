@@ -0,0 +1,116 @@
+"""Add a sample-major copy of the traces to a dataset.
+
+The copy is stored in files that each contain a block of samples for all the
+traces of the dataset, and is recorded as a layout in the new manifest, such
+that DatasetReader.read_samples reads only the requested samples.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import dataset
+
+FIELD = 'traces'
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Add a sample-major copy of the traces to a dataset.'
+        )
+    parser.add_argument(
+            '--dataset',
+            type=str,
+            required=True,
+            help='Existing dataset path (to manifest).',
+            )
+    parser.add_argument(
+            '--new',
+            type=str,
+            default="manifest_sample_major.json",
+            help='Name of the new manifest.',
+            )
+    parser.add_argument(
+            '--block-size',
+            type=int,
+            default=64,
+            help='Number of samples per file.',
+            )
+    parser.add_argument(
+            '--tile-size',
+            type=int,
+            default=2**14,
+            help='Number of traces read at once by a process.',
+            )
+    parser.add_argument(
+            '--nproc',
+            type=int,
+            default=None,
+            help='Number of processes (default: number of CPUs).',
+            )
+    return parser.parse_args()
+
+def transpose_tile(dr, chunk_name, start, stop, col, files):
+    """Write the traces [start, stop) of chunk in the columns [col, ...) of the
+    sample-major files.
+
+    files: [(<first sample>, <end sample>, <path>), ...]
+    """
+    tile = dr.load_chunk(chunk_name, mmap_mode='r', fields=[FIELD], start=start, stop=stop)[FIELD]
+    tile = np.array(tile)
+    for s_start, s_stop, path in files:
+        # The processes write to disjoint columns of shared mappings.
+        out = np.load(path, mmap_mode='r+')
+        out[:, col:col+stop-start] = tile[:, s_start:s_stop].T
+        out.flush()
+        del out
+
+def transpose(dr, dest_path, block_size, tile_size, nproc=None):
+    dest_path = Path(dest_path)
+    nsamples = dr.fields[FIELD]['shape'][0]
+    dtype = dr.fields[FIELD]['dtype']
+    nexec = len(dr)
+    files = []
+    for s_start in range(0, nsamples, block_size):
+        s_stop = min(s_start+block_size, nsamples)
+        rel_path = Path('.') / (FIELD + '_sample_major') / f'{s_start:05}-{s_stop:05}.npy'
+        path = dest_path.parent / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(s_stop-s_start, nexec))
+        files.append((s_start, s_stop, path, rel_path))
+    abs_files = [(s_start, s_stop, path) for s_start, s_stop, path, _ in files]
+    with dataset.ReaderPoolExecutor(dr, max_workers=nproc) as executor:
+        futures = []
+        for chunk_name, col in zip(dr.chunk_name_list, dr.cum_nexec):
+            for start, stop in dataset.split_slice(0, dr.chunks[chunk_name]['nexec'], tile_size):
+                futures.append(executor.submit(
+                    transpose_tile, chunk_name, start, stop, col+start, abs_files
+                    ))
+        for future in futures:
+            future.result()
+    with ProcessPoolExecutor(max_workers=nproc) as executor:
+        hashes = list(executor.map(dataset.sha256sum, [path for _, _, path, _ in files]))
+    layout = dict(
+            kind='sample-major',
+            nexec=nexec,
+            chunks=dict(zip(dr.chunk_name_list, dr.cum_nexec)),
+            files=[
+                dict(samples=[s_start, s_stop], path=str(rel_path), hash='sha256-' + h)
+                for (s_start, s_stop, _, rel_path), h in zip(files, hashes)
+                ],
+            )
+    with dataset.DatasetWriter(dest_path, dr.id, dr.metadata, dr.fields) as dw:
+        for chunk_name, chunk in dr.chunks.items():
+            dw.add_existing_chunk(chunk_name, chunk)
+        for field_name, field_layout in dr.layouts.items():
+            dw.add_layout(field_name, field_layout)
+        dw.add_layout(FIELD, layout)
+
+def main():
+    args = parse_args()
+    dest_path = Path(args.dataset).parent / args.new
+    dr = dataset.DatasetReader.from_manifest(args.dataset)
+    transpose(dr, dest_path, args.block_size, args.tile_size, args.nproc)
+
+if __name__ == '__main__':
+    main()
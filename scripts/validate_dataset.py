@@ -0,0 +1,84 @@
+import argparse
+import sys
+
+import dataset
+
+parser = argparse.ArgumentParser(
+    description='Check the integrity of the files of a dataset.'
+    )
+parser.add_argument(
+        '--dataset',
+        type=str,
+        required=True,
+        help='Existing dataset path (to manifest).',
+        )
+parser.add_argument(
+        '--nproc',
+        type=int,
+        default=None,
+        help='Number of hashing processes (default: number of CPUs).',
+        )
+parser.add_argument(
+        '--journal',
+        type=str,
+        default=None,
+        help='Journal file, used to resume an interrupted validation.',
+        )
+parser.add_argument(
+        '--allow-missing',
+        default=False,
+        action="store_true",
+        help='Do not fail on missing chunks (partial dataset).',
+        )
+parser.add_argument(
+        '--paranoid',
+        default=False,
+        action="store_true",
+        help='Hash all the files, even those recorded as valid in the journal or the hash cache.',
+        )
+parser.add_argument(
+        '--hash-cache',
+        type=str,
+        default=None,
+        help='Hash cache file (default: in the user cache directory).',
+        )
+parser.add_argument(
+        '--no-hash-cache',
+        default=False,
+        action="store_true",
+        help='Do not use the hash cache.',
+        )
+args = parser.parse_args()
+
+def print_progress(p):
+    print(
+            f'\r{p.nfiles}/{p.nfiles_total} files, ' +
+            f'{p.nbytes/2**30:.1f}/{p.nbytes_total/2**30:.1f} GiB, ' +
+            f'{p.throughput/2**20:.1f} MiB/s',
+            end='',
+            file=sys.stderr,
+            )
+
+dr = dataset.DatasetReader.from_manifest(args.dataset)
+report = dr.validation_report(
+        nproc=args.nproc,
+        journal=args.journal,
+        progress=print_progress,
+        hash_cache=False if args.no_hash_cache else dataset.HashCache(args.hash_cache),
+        paranoid=args.paranoid,
+        )
+print(file=sys.stderr)
+
+missing = [cn for cn, status in report.items() if status == dataset.CHUNK_MISSING]
+corrupted = [cn for cn, status in report.items() if status == dataset.CHUNK_CORRUPTED]
+for cn in missing:
+    print('missing', cn)
+for cn in corrupted:
+    print('corrupted', cn)
+print(
+        f'{len(report)-len(missing)-len(corrupted)} ok, ' +
+        f'{len(missing)} missing, {len(corrupted)} corrupted.',
+        file=sys.stderr,
+        )
+if corrupted or (missing and not args.allow_missing):
+    sys.exit(1)
@@ -0,0 +1,51 @@
+import pathlib
+import sys
+
+import numpy as np
+import pytest
+
+SCRIPTS_DIR = pathlib.Path(__file__).resolve().parent.parent / 'scripts'
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+import dataset
+
+NSAMPLES = 64
+CHUNK_SIZES = (100, 50, 37)
+
+def write_dataset(path, chunk_sizes=CHUNK_SIZES, nsamples=NSAMPLES, seed=0, **writer_kwargs):
+    """Write a small dataset (fields "traces" and "umsk_plaintext") with the
+    given chunk sizes. Returns the concatenated arrays of the fields."""
+    rng = np.random.default_rng(seed)
+    fields = {
+            'traces': {'shape': [nsamples], 'dtype': np.int16},
+            'umsk_plaintext': {'shape': [16], 'dtype': np.uint8},
+            }
+    arrays = {f: [] for f in fields}
+    with dataset.DatasetWriter(path, 'test/dataset', {'info': 'test'}, fields, **writer_kwargs) as dw:
+        for nexec in chunk_sizes:
+            traces = np.cumsum(
+                    rng.integers(-50, 50, size=(nexec, nsamples)), axis=1
+                    ).astype(np.int16)
+            plaintexts = rng.integers(0, 256, size=(nexec, 16)).astype(np.uint8)
+            arrays['traces'].append(traces)
+            arrays['umsk_plaintext'].append(plaintexts)
+            dw.add_chunk(traces=traces, umsk_plaintext=plaintexts)
+    return {f: np.concatenate(a) for f, a in arrays.items()}
+
+@pytest.fixture
+def make_dataset(tmp_path):
+    """Factory writing a dataset in tmp_path, returns (<manifest path>,
+    <concatenated arrays>)."""
+    def make(name='dataset', **kwargs):
+        path = tmp_path / name / 'manifest.json'
+        return path, write_dataset(path, **kwargs)
+    return make
+
+@pytest.fixture
+def small_dataset(make_dataset):
+    """(<DatasetReader>, <concatenated arrays>) of a small dataset."""
+    path, arrays = make_dataset()
+    return dataset.DatasetReader.from_manifest(path), arrays
+
+def concat_items(items, field='traces'):
+    return np.concatenate([np.array(item[field]) for item in items])
@@ -0,0 +1,71 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+def collect(items, limit=None):
+    async def run():
+        res = []
+        async for item in items:
+            res.append(item)
+            if limit is not None and len(res) == limit:
+                break
+        return res
+    return asyncio.run(run())
+
+@pytest.mark.parametrize('read_ahead, concurrency', [(1, 1), (3, 2)])
+def test_aiter_ntraces(small_dataset, read_ahead, concurrency):
+    dr, arrays = small_dataset
+    items = dr.aiter_ntraces(
+            120, start_trace=30, max_chunk_size=40, read_ahead=read_ahead, concurrency=concurrency,
+            )
+    assert len(items) == 4 and items.n_traces == 120
+    res = collect(items)
+    assert [len(item['traces']) for item in res] == [40, 30, 40, 10]
+    traces = np.concatenate([item['traces'] for item in res])
+    np.testing.assert_array_equal(traces, arrays['traces'][30:150])
+
+def test_aiter_fields_samples(small_dataset):
+    dr, arrays = small_dataset
+    res = collect(dr.aiter_ntraces(None, fields=['traces'], samples=slice(5, 10)))
+    assert all(list(item) == ['traces'] for item in res)
+    traces = np.concatenate([item['traces'] for item in res])
+    np.testing.assert_array_equal(traces, arrays['traces'][:, 5:10])
+
+def test_aiter_executor(small_dataset):
+    dr, arrays = small_dataset
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        res = collect(dr.aiter_ntraces(None, executor=executor))
+        # The executor is not shut down by the iterator.
+        assert executor.submit(lambda: 1).result() == 1
+    np.testing.assert_array_equal(
+            np.concatenate([item['umsk_plaintext'] for item in res]), arrays['umsk_plaintext']
+            )
+
+def test_aiter_early_exit(small_dataset):
+    dr, arrays = small_dataset
+    res = collect(dr.aiter_ntraces(None, max_chunk_size=10, read_ahead=4), limit=2)
+    np.testing.assert_array_equal(
+            np.concatenate([item['traces'] for item in res]), arrays['traces'][:20]
+            )
+
+def test_aiter_concurrent_tasks(small_dataset):
+    dr, arrays = small_dataset
+    async def run():
+        # The event loop is not blocked by the reads.
+        return await asyncio.gather(
+                collect_async(dr.aiter_ntraces(100)),
+                collect_async(dr.aiter_ntraces(None, start_trace=100)),
+                )
+    async def collect_async(items):
+        return [item async for item in items]
+    first, second = asyncio.run(run())
+    traces = np.concatenate([item['traces'] for item in first + second])
+    np.testing.assert_array_equal(traces, arrays['traces'])
+
+@pytest.mark.parametrize('kwargs', [dict(read_ahead=0), dict(concurrency=0)])
+def test_aiter_bad_parameters(small_dataset, kwargs):
+    dr, _ = small_dataset
+    with pytest.raises(ValueError):
+        dr.aiter_ntraces(None, **kwargs)
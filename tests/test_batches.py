@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+import dataset
+
+def copy_batches(batches):
+    # A batch is valid until the next one is requested.
+    return [{f: np.array(array) for f, array in batch.items()} for batch in batches]
+
+@pytest.mark.parametrize('batch_size', [1, 7, 50, 64, 187, 500])
+@pytest.mark.parametrize('drop_last', [False, True])
+def test_iter_batches(small_dataset, batch_size, drop_last):
+    dr, arrays = small_dataset
+    batches = dr.iter_batches(batch_size, drop_last=drop_last)
+    res = copy_batches(batches)
+    assert len(res) == len(batches)
+    nfull, rest = divmod(len(dr), batch_size)
+    sizes = [batch_size] * nfull + ([rest] if rest and not drop_last else [])
+    assert [len(batch['traces']) for batch in res] == sizes
+    ntraces = sum(sizes)
+    for field in ('traces', 'umsk_plaintext'):
+        if ntraces:
+            np.testing.assert_array_equal(
+                    np.concatenate([batch[field] for batch in res]), arrays[field][:ntraces]
+                    )
+
+def test_iter_batches_range(small_dataset):
+    dr, arrays = small_dataset
+    batches = dr.iter_batches(40, max_ntraces=90, start_trace=80, fields=['traces'])
+    assert batches.n_traces == 90
+    res = copy_batches(batches)
+    assert [list(batch) for batch in res] == [['traces']] * 3
+    assert [len(batch['traces']) for batch in res] == [40, 40, 10]
+    np.testing.assert_array_equal(
+            np.concatenate([batch['traces'] for batch in res]), arrays['traces'][80:170]
+            )
+
+@pytest.mark.parametrize('samples, columns', [
+    (slice(10, 20), list(range(10, 20))),
+    ([(0, 4), (60, 64)], [0, 1, 2, 3, 60, 61, 62, 63]),
+    ([63, 0, 5], [63, 0, 5]),
+    ])
+def test_iter_batches_samples(small_dataset, samples, columns):
+    dr, arrays = small_dataset
+    res = copy_batches(dr.iter_batches(33, samples=samples))
+    expected = arrays['traces'][:, columns]
+    np.testing.assert_array_equal(np.concatenate([batch['traces'] for batch in res]), expected)
+
+def test_iter_batches_buffer_reused(small_dataset):
+    dr, _ = small_dataset
+    batches = iter(dr.iter_batches(32))
+    first = next(batches)['traces']
+    second = next(batches)['traces']
+    assert first.ctypes.data == second.ctypes.data
+    assert first.ctypes.data % 64 == 0
+
+def test_iter_batches_empty_chunks(make_dataset):
+    path, arrays = make_dataset(chunk_sizes=(0, 5, 0, 0, 9, 0))
+    dr = dataset.DatasetReader.from_manifest(path)
+    res = copy_batches(dr.iter_batches(4))
+    assert [len(batch['traces']) for batch in res] == [4, 4, 4, 2]
+    np.testing.assert_array_equal(np.concatenate([batch['traces'] for batch in res]), arrays['traces'])
+
+def test_iter_batches_bad_size(small_dataset):
+    dr, _ = small_dataset
+    with pytest.raises(ValueError):
+        dr.iter_batches(0)
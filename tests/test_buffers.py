@@ -0,0 +1,91 @@
+import threading
+
+import numpy as np
+import pytest
+
+import dataset
+
+def make_pool(dr, nrows=40, **kwargs):
+    fields = {f: dict(shape=desc['shape'], dtype=desc['dtype']) for f, desc in dr.fields.items()}
+    return dataset.BufferPool(fields, nrows, **kwargs)
+
+@pytest.mark.parametrize('prefetch', [None, 2])
+def test_owned_buffers(small_dataset, prefetch):
+    dr, arrays = small_dataset
+    traces = [
+            np.array(item['traces'])
+            for item in dr.iter_ntraces(None, max_chunk_size=40, prefetch=prefetch, buffers=True)
+            ]
+    np.testing.assert_array_equal(np.concatenate(traces), arrays['traces'])
+
+@pytest.mark.parametrize('prefetch', [None, 2])
+def test_buffer_pool(small_dataset, prefetch):
+    dr, arrays = small_dataset
+    pool = make_pool(dr, nbuffers=3)
+    traces = []
+    for item in dr.iter_ntraces(None, max_chunk_size=40, prefetch=prefetch, buffers=pool):
+        assert item['traces'].ctypes.data % 64 == 0
+        traces.append(np.array(item['traces']))
+        pool.release(item)
+    np.testing.assert_array_equal(np.concatenate(traces), arrays['traces'])
+    assert sorted(pool._free) == [0, 1, 2]
+
+def test_buffer_pool_mismatch(small_dataset):
+    dr, _ = small_dataset
+    with pytest.raises(ValueError):
+        dr.iter_ntraces(None, max_chunk_size=50, buffers=make_pool(dr, nrows=40))
+
+def test_acquire(small_dataset):
+    dr, _ = small_dataset
+    pool = make_pool(dr, nbuffers=1, timeout=0.05)
+    buffers = pool.acquire()
+    with pytest.raises(dataset.DatasetError):
+        pool.acquire(block=False)
+    with pytest.raises(dataset.DatasetError):
+        pool.acquire()
+    pool.release(buffers)
+    with pytest.raises(ValueError):
+        pool.release(buffers)
+    assert pool.acquire(block=False) is buffers
+
+def test_acquire_cancel(small_dataset):
+    dr, _ = small_dataset
+    pool = make_pool(dr, nbuffers=1)
+    pool.acquire()
+    cancel = threading.Event()
+    errors = []
+    def waiter():
+        try:
+            pool.acquire(cancel=cancel)
+        except dataset.DatasetError as e:
+            errors.append(e)
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    cancel.set()
+    pool.interrupt()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert len(errors) == 1
+
+def test_prefetch_unreleased_timeout(small_dataset):
+    dr, _ = small_dataset
+    pool = make_pool(dr, nbuffers=2, timeout=0.05)
+    # The consumer holds all the buffers: the next read fails instead of
+    # waiting forever.
+    with pytest.raises(dataset.DatasetError):
+        list(dr.iter_ntraces(None, max_chunk_size=40, prefetch=2, buffers=pool))
+
+def test_prefetch_close_unreleased(small_dataset):
+    dr, arrays = small_dataset
+    pool = make_pool(dr, nbuffers=2)
+    items = iter(dr.iter_ntraces(None, max_chunk_size=40, prefetch=3, buffers=pool))
+    item = next(items)
+    np.testing.assert_array_equal(item['traces'], arrays['traces'][:40])
+    # A read is waiting for a buffer (no timeout): closing the iterator
+    # cancels it and gives back the buffer of the other prefetched item.
+    closer = threading.Thread(target=items.close)
+    closer.start()
+    closer.join(timeout=5)
+    assert not closer.is_alive()
+    pool.release(item)
+    assert sorted(pool._free) == [0, 1]
@@ -0,0 +1,127 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+import dataset
+from conftest import concat_items
+
+def file_nbytes(dr):
+    return {
+            dataset.hash_hex(file['hash']): os.path.getsize(dr.base_path / file['path'])
+            for chunk in dr.chunks.values() for file in chunk['files'].values()
+            }
+
+def cached_files(path):
+    return {p.name for p in path.iterdir() if not p.name.startswith('.')}
+
+def test_chunk_cache(make_dataset, tmp_path):
+    path, arrays = make_dataset()
+    cache = dataset.ChunkCache(tmp_path / 'cache', max_bytes=2**30)
+    dr = dataset.DatasetReader.from_manifest(path, cache=cache)
+    for field in ('traces', 'umsk_plaintext'):
+        np.testing.assert_array_equal(concat_items(dr.iter_ntraces(None), field), arrays[field])
+    nbytes = file_nbytes(dr)
+    assert cached_files(cache.path) == set(nbytes)
+    assert cache._read_total() == sum(nbytes.values())
+    # Hits do not copy again.
+    inodes = {p: p.stat().st_ino for p in cache.path.iterdir() if p.name in nbytes}
+    list(dr.iter_ntraces(None))
+    assert {p: p.stat().st_ino for p in inodes} == inodes
+
+def test_chunk_cache_corrupted(make_dataset, tmp_path):
+    path, _ = make_dataset()
+    dr = dataset.DatasetReader.from_manifest(path)
+    file = dr.chunks[dr.chunk_name_list[0]]['files']['traces']
+    with open(dr.base_path / file['path'], 'r+b') as f:
+        f.seek(200)
+        f.write(b'\x12\x34')
+    cache = dataset.ChunkCache(tmp_path / 'cache', max_bytes=2**30)
+    with pytest.raises(dataset.CorruptedDatasetError):
+        cache.fetch(dr.storage, file)
+    assert not cached_files(cache.path)
+    assert not any(p.name.startswith('.tmp-') for p in cache.path.iterdir())
+
+def test_chunk_cache_evict(make_dataset, tmp_path):
+    path, _ = make_dataset()
+    dr = dataset.DatasetReader.from_manifest(path)
+    files = [dr.chunks[cn]['files']['traces'] for cn in dr.chunk_name_list]
+    nbytes = file_nbytes(dr)
+    sizes = [nbytes[dataset.hash_hex(file['hash'])] for file in files]
+    cache = dataset.ChunkCache(tmp_path / 'cache', max_bytes=sizes[0] + sizes[1], grace=0)
+    for file in files[:2]:
+        cache.fetch(dr.storage, file)
+    old = cache.path / dataset.hash_hex(files[0]['hash'])
+    os.utime(old, (time.time() - 10, time.time() - 10))
+    cache.fetch(dr.storage, files[2])
+    # The least recently used file is evicted.
+    assert cached_files(cache.path) == {dataset.hash_hex(f['hash']) for f in files[1:]}
+    assert cache._read_total() == sizes[1] + sizes[2]
+
+def test_chunk_cache_no_scan_on_miss(make_dataset, tmp_path, monkeypatch):
+    path, _ = make_dataset()
+    dr = dataset.DatasetReader.from_manifest(path)
+    cache = dataset.ChunkCache(tmp_path / 'cache', max_bytes=2**30)
+    scans = []
+    iterdir = type(cache.path).iterdir
+    def counting_iterdir(self):
+        scans.append(self)
+        return iterdir(self)
+    monkeypatch.setattr(type(cache.path), 'iterdir', counting_iterdir)
+    for cn in dr.chunk_name_list:
+        cache.fetch(dr.storage, dr.chunks[cn]['files']['traces'])
+    # Only the first miss scans the directory (there is no recorded total yet).
+    assert len(scans) == 1
+
+class ConcurrentStorage(dataset.LocalStorage):
+    """LocalStorage checking that the cache is not locked while copying, and
+    running a concurrent fetch of the same file during the first copy."""
+    def __init__(self, base_path, cache, files):
+        super().__init__(base_path)
+        self.cache = cache
+        self.files = files
+        self.concurrent = []
+
+    def open(self, path):
+        fcntl = pytest.importorskip('fcntl')
+        with open(self.cache.path / '.lock', 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        if not self.concurrent:
+            self.concurrent.append(path)
+            file, = [f for f in self.files if f['path'] == path]
+            self.cache.fetch(dataset.LocalStorage(self.base_path), file)
+        return super().open(path)
+
+def test_chunk_cache_copy_unlocked(make_dataset, tmp_path):
+    path, _ = make_dataset()
+    dr = dataset.DatasetReader.from_manifest(path)
+    cache = dataset.ChunkCache(tmp_path / 'cache', max_bytes=2**30)
+    files = [file for chunk in dr.chunks.values() for file in chunk['files'].values()]
+    storage = ConcurrentStorage(dr.base_path, cache, files)
+    for file in files:
+        assert cache.fetch(storage, file) == cache.path / dataset.hash_hex(file['hash'])
+    nbytes = file_nbytes(dr)
+    # The file copied twice is counted once, and no temporary file is left.
+    assert set(os.listdir(cache.path)) == set(nbytes) | {'.lock', '.total'}
+    assert cache._read_total() == sum(nbytes.values())
+
+def fetch_all(manifest_path, cache_path, max_bytes):
+    cache = dataset.ChunkCache(cache_path, max_bytes=max_bytes, grace=0)
+    dr = dataset.DatasetReader.from_manifest(manifest_path, cache=cache)
+    for cn in dr.chunk_name_list:
+        for file in dr.chunks[cn]['files'].values():
+            cache.fetch(dr.storage, file)
+
+def test_chunk_cache_concurrent(make_dataset, tmp_path):
+    paths = [make_dataset(f'dataset{i}', seed=i)[0] for i in range(4)]
+    dr = dataset.DatasetReader.from_manifest(paths[0])
+    max_bytes = sum(file_nbytes(dr).values())
+    cache_path = tmp_path / 'cache'
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        for future in [executor.submit(fetch_all, p, cache_path, max_bytes) for p in paths]:
+            future.result()
+    total = sum(p.stat().st_size for p in cache_path.iterdir() if not p.name.startswith('.'))
+    assert total <= max_bytes
+    assert dataset.ChunkCache(cache_path, max_bytes)._read_total() == total
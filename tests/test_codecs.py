@@ -0,0 +1,87 @@
+import concurrent.futures
+
+import numpy as np
+import pytest
+
+import dataset
+import rechunk_dataset
+from conftest import concat_items
+
+@pytest.fixture
+def small_frames(monkeypatch):
+    # 5 rows of traces per frame.
+    monkeypatch.setattr(dataset, '_FRAME_NBYTES', 5 * 64 * 2)
+
+@pytest.fixture
+def compressed_dataset(make_dataset, small_frames):
+    path, arrays = make_dataset(codecs={'traces': 'zlib'})
+    return dataset.DatasetReader.from_manifest(path), arrays
+
+@pytest.fixture
+def decode_counter(monkeypatch):
+    counter = []
+    encode, decode = dataset.CODECS['zlib']
+    def counting_decode(data, dtype, shape):
+        counter.append(shape[0])
+        return decode(data, dtype, shape)
+    monkeypatch.setitem(dataset.CODECS, 'zlib', (encode, counting_decode))
+    return counter
+
+@pytest.mark.parametrize('codec', sorted(dataset.CODECS))
+def test_codec_roundtrip(make_dataset, small_frames, codec):
+    path, arrays = make_dataset(codecs={'traces': codec})
+    dr = dataset.DatasetReader.from_manifest(path)
+    dr.validate()
+    assert all(chunk['files']['traces']['codec'] == codec for chunk in dr.chunks.values())
+    np.testing.assert_array_equal(dr.load_chunk(dr.chunk_name_list[0])['traces'], arrays['traces'][:100])
+    chunk = dr.load_chunk(dr.chunk_name_list[0], start=13, stop=27)
+    np.testing.assert_array_equal(chunk['traces'], arrays['traces'][13:27])
+    np.testing.assert_array_equal(chunk['umsk_plaintext'], arrays['umsk_plaintext'][13:27])
+
+def test_partial_decode(compressed_dataset, decode_counter):
+    dr, arrays = compressed_dataset
+    chunk = dr.load_chunk(dr.chunk_name_list[0], start=11, stop=14)
+    np.testing.assert_array_equal(chunk['traces'], arrays['traces'][11:14])
+    assert decode_counter == [5]
+
+def test_decoding_threads_reused(compressed_dataset, monkeypatch):
+    dr, _ = compressed_dataset
+    created = []
+    class CountingExecutor(concurrent.futures.ThreadPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            created.append(self)
+            super().__init__(*args, **kwargs)
+    monkeypatch.setattr(dataset, 'ThreadPoolExecutor', CountingExecutor)
+    for chunk_name in dr.chunk_name_list:
+        dr.load_chunk(chunk_name)
+    dr.subset(dr.chunk_name_list[:1]).load_chunk(dr.chunk_name_list[0])
+    assert len(created) <= 1
+
+@pytest.mark.parametrize('mode', [
+    dict(prefetch=2, prefetch_workers=2),
+    dict(buffers=True),
+    dict(buffers=True, prefetch=2),
+    dict(),
+    ])
+def test_iter_decodes_once(compressed_dataset, decode_counter, mode):
+    dr, arrays = compressed_dataset
+    # With buffers, an item is valid until the next one is requested.
+    items = [np.array(item['traces']) for item in dr.iter_ntraces(max_chunk_size=3, **mode)]
+    np.testing.assert_array_equal(np.concatenate(items), arrays['traces'])
+    # Each frame is decoded once.
+    assert sum(decode_counter) == len(dr)
+
+def test_iter_batches_decodes_once(compressed_dataset, decode_counter):
+    dr, arrays = compressed_dataset
+    batches = [np.array(batch['traces']) for batch in dr.iter_batches(7)]
+    np.testing.assert_array_equal(np.concatenate(batches), arrays['traces'])
+    assert sum(decode_counter) == len(dr)
+
+def test_rechunk_compressed(compressed_dataset):
+    dr, arrays = compressed_dataset
+    new_path = dr.base_path / 'manifest_rechunk.json'
+    rechunk_dataset.rechunk(dr, new_path, rechunk_dataset.fixed_size(10), nproc=1)
+    new_dr = dataset.DatasetReader.from_manifest(new_path)
+    assert [chunk['nexec'] for chunk in new_dr.chunks.values()] == 10*[10] + 5*[10] + 3*[10] + [7]
+    np.testing.assert_array_equal(concat_items(new_dr.iter_ntraces()), arrays['traces'])
+    new_dr.validate()
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import dataset
+from conftest import concat_items
+
+@pytest.fixture
+def two_datasets(make_dataset):
+    path0, arrays0 = make_dataset('a', seed=0)
+    path1, arrays1 = make_dataset('b', chunk_sizes=(30, 30), seed=1)
+    readers = [dataset.DatasetReader.from_manifest(p) for p in (path0, path1)]
+    arrays = {f: np.concatenate([arrays0[f], arrays1[f]]) for f in arrays0}
+    return readers, arrays
+
+def test_concat_iter(two_datasets):
+    readers, arrays = two_datasets
+    cdr = dataset.ConcatDatasetReader(readers)
+    assert len(cdr) == 247
+    items = cdr.iter_ntraces(100, start_trace=150, max_chunk_size=16)
+    assert items.n_traces == 97
+    np.testing.assert_array_equal(concat_items(items), arrays['traces'][150:])
+
+def test_concat_interleave(two_datasets):
+    readers, arrays = two_datasets
+    cdr = dataset.ConcatDatasetReader(readers, weights=[1, 3])
+    items = list(cdr.iter_ntraces(max_chunk_size=4, interleave=True))
+    assert sum(len(item['traces']) for item in items) == len(cdr)
+    # Among the first items, 3 traces of the second dataset for 1 of the first.
+    first = items[:8]
+    from_second = sum(
+            any(np.array_equal(item['traces'][0], t) for t in arrays['traces'][187:])
+            for item in first
+            )
+    assert from_second == 6
+    traces = concat_items(items)
+    assert sorted(map(bytes, traces)) == sorted(map(bytes, arrays['traces']))
+
+@pytest.mark.parametrize('weights', [[0, 1], [1, -1]])
+def test_concat_bad_weights(two_datasets, weights):
+    readers, _ = two_datasets
+    with pytest.raises(ValueError):
+        dataset.ConcatDatasetReader(readers, weights=weights)
+
+def test_concat_take(two_datasets):
+    readers, arrays = two_datasets
+    cdr = dataset.ConcatDatasetReader(readers)
+    indices = [200, 3, 186, 187]
+    np.testing.assert_array_equal(cdr.take(indices)['umsk_plaintext'], arrays['umsk_plaintext'][indices])
+
+def test_concat_fields(two_datasets):
+    readers, _ = two_datasets
+    sub = readers[1].subset(fields=['traces'])
+    cdr = dataset.ConcatDatasetReader([readers[0], sub])
+    assert list(cdr.fields) == ['traces']
+    with pytest.raises(ValueError):
+        cdr.iter_ntraces(fields=['umsk_plaintext'])
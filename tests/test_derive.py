@@ -0,0 +1,70 @@
+import argparse
+
+import numpy as np
+import pytest
+
+import dataset
+import derive_dataset
+
+def test_derive(small_dataset, tmp_path):
+    dr, arrays = small_dataset
+    transforms = [
+            derive_dataset.parse_transform(spec)
+            for spec in ('downsample:2:int32', 'crop:4:20', 'quantize:int8:3')
+            ]
+    new_path = tmp_path / 'derived' / 'manifest.json'
+    derive_dataset.derive(dr, new_path, transforms, nproc=2, max_chunk_size=16)
+    new_dr = dataset.DatasetReader.from_manifest(new_path)
+    new_dr.validate()
+    assert new_dr.id == dr.id + '-derived'
+    assert new_dr.metadata['derived_from']['transforms'][1] == dict(transform='crop', start=4, stop=20)
+    traces = arrays['traces'].astype(np.int64)
+    expected = (traces[:, 0::2] + traces[:, 1::2])[:, 4:20] >> 3
+    expected = np.clip(expected, -128, 127).astype(np.int8)
+    res = new_dr.take(np.arange(len(new_dr)))
+    np.testing.assert_array_equal(res['traces'], expected)
+    np.testing.assert_array_equal(res['umsk_plaintext'], arrays['umsk_plaintext'])
+
+@pytest.mark.parametrize('spec', [
+    'downsample:0', 'downsample:x', 'downsample:2:float32', 'quantize:float32',
+    'quantize:int8:-1', 'crop:1', 'foo:1',
+    ])
+def test_bad_transforms(spec):
+    with pytest.raises(argparse.ArgumentTypeError):
+        derive_dataset.parse_transform(spec)
+
+def test_derive_float_traces():
+    field = dict(shape=[10], dtype=np.dtype(np.float32))
+    with pytest.raises(ValueError):
+        derive_dataset.Downsample(2).field(field)
+    with pytest.raises(ValueError):
+        derive_dataset.Quantize('int8').field(field)
+
+def test_derive_empty_crop(small_dataset, tmp_path):
+    dr, _ = small_dataset
+    with pytest.raises(ValueError):
+        derive_dataset.derive(dr, tmp_path / 'manifest.json', [derive_dataset.Crop(10, 5)])
+
+def test_add_chunk_rows(tmp_path):
+    fields = {'a': {'shape': [3], 'dtype': np.int16}, 'b': {'shape': [], 'dtype': np.uint8}}
+    a = np.arange(30, dtype=np.int16).reshape(10, 3)
+    b = np.arange(10, dtype=np.uint8)
+    for merkle_block_size in (None, 16):
+        with dataset.DatasetWriter(
+                tmp_path / 'ds' / 'manifest.json', 'x', {}, fields, merkle_block_size=merkle_block_size
+                ) as dw:
+            dw.add_chunk('whole', a=a, b=b)
+            dw.add_chunk_rows('rows', 10, ({'a': a[i:i+4], 'b': b[i:i+4]} for i in range(0, 10, 4)))
+        assert dw.chunks['whole']['files']['a']['hash'] == dw.chunks['rows']['files']['a']['hash']
+        assert dw.chunks['whole']['files']['b']['hash'] == dw.chunks['rows']['files']['b']['hash']
+        dr = dataset.DatasetReader.from_manifest(tmp_path / 'ds' / 'manifest.json')
+        dr.validate()
+        np.testing.assert_array_equal(dr.load_chunk('rows')['a'], a)
+
+@pytest.mark.parametrize('nrows', [9, 11])
+def test_add_chunk_rows_bad_count(tmp_path, nrows):
+    fields = {'a': {'shape': [3], 'dtype': np.int16}}
+    dw = dataset.DatasetWriter(tmp_path / 'manifest.json', 'x', {}, fields)
+    with pytest.raises(ValueError):
+        dw.add_chunk_rows('c', 10, [{'a': np.zeros((nrows, 3), dtype=np.int16)}])
+    assert dw.error
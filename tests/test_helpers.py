@@ -0,0 +1,67 @@
+import hashlib
+
+import numpy as np
+
+import dataset
+
+def test_split_slice():
+    assert dataset.split_slice(3, 10, None) == [(3, 10)]
+    assert dataset.split_slice(3, 10, 4) == [(3, 7), (7, 10)]
+    assert dataset.split_slice(0, 0, 4) == []
+
+def test_sub_chunk():
+    chunk = dict(nexec=10, files=dict(traces=dict(path='a.npy', hash='sha256-00', rows=[5, 10])))
+    sub = dataset.sub_chunk(chunk, 2, 6)
+    assert sub['nexec'] == 4
+    assert sub['files']['traces']['rows'] == [7, 4]
+    assert chunk['files']['traces']['rows'] == [5, 10]
+
+def test_npy_header(tmp_path):
+    array = np.arange(12, dtype=np.int16).reshape(4, 3)
+    np.save(tmp_path / 'a.npy', array)
+    header = dataset.npy_header(array.dtype, array.shape)
+    assert (tmp_path / 'a.npy').read_bytes()[:len(header)] == header
+
+def test_sha256sum(tmp_path):
+    path = tmp_path / 'a.bin'
+    path.write_bytes(bytes(range(256)))
+    h = dataset.sha256sum(path)
+    assert dataset.hash_hex('sha256-' + h) == h
+    assert dataset.sha256sum(path, (b'', 0, 256)) == h
+    ranged = dataset.sha256sum(path, (b'xy', 10, 20))
+    assert ranged == hashlib.sha256(b'xy' + bytes(range(10, 30))).hexdigest()
+
+def test_merkle_hasher():
+    data = bytes(range(256)) * 10
+    hasher = dataset.MerkleHasher(1000)
+    for start in range(0, len(data), 7):
+        hasher.update(data[start:start+7])
+    entries = dataset.hash_entries(hasher)
+    assert len(entries['blocks']['digests']) == 3
+    other = dataset.new_hasher(entries)
+    other.update(data)
+    assert other.hexdigest() == dataset.hash_hex(entries['hash'])
+
+def test_hash_tasks(tmp_path):
+    path = tmp_path / 'a.bin'
+    data = bytes(range(256)) * 10
+    path.write_bytes(data)
+    for file in (
+            dict(hash='sha256-' + dataset.sha256sum(path)),
+            dict(path='a.bin', **dataset.hash_entries(_merkle(data, 100))),
+            ):
+        tasks, combine = dataset.hash_tasks(path, None, file)
+        assert combine([task(*args) for task, args in tasks]) == dataset.hash_hex(file['hash'])
+        tasks, combine = dataset.hash_tasks(tmp_path / 'missing.bin', None, file)
+        assert combine([task(*args) for task, args in tasks]) is None
+
+def test_iter_stream(tmp_path):
+    (tmp_path / 'a.bin').write_bytes(bytes(range(100)))
+    storage = dataset.LocalStorage(tmp_path)
+    pieces = list(dataset.iter_stream(storage, 'a.bin', (b'head', 10, 50), piece_size=16))
+    assert b''.join(pieces) == b'head' + bytes(range(10, 60))
+
+def _merkle(data, block_size):
+    hasher = dataset.MerkleHasher(block_size)
+    hasher.update(data)
+    return hasher
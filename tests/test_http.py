@@ -0,0 +1,87 @@
+import functools
+import http.server
+import threading
+
+import numpy as np
+import pytest
+
+import dataset
+import serve_dataset
+from conftest import concat_items
+
+class QuietRangeHandler(serve_dataset.RangeRequestHandler):
+    def log_message(self, *args):
+        pass
+
+class NoRangeHandler(http.server.SimpleHTTPRequestHandler):
+    """Ignores range requests."""
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def serve(make_dataset):
+    """Factory serving a dataset with a handler class, returns
+    (<manifest URL>, <arrays>, <list of the (method, path, range) requests>)."""
+    servers = []
+    def start(handler_class):
+        path, arrays = make_dataset()
+        requests = []
+        class Handler(handler_class):
+            def send_head(self):
+                requests.append((self.command, self.path, self.headers.get('Range')))
+                return super().send_head()
+        handler = functools.partial(Handler, directory=str(path.parent))
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        servers.append(server)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_address[1]}/manifest.json'
+        return url, arrays, requests
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+@pytest.mark.parametrize('handler_class', [QuietRangeHandler, NoRangeHandler])
+def test_http_read(serve, handler_class):
+    url, arrays, _ = serve(handler_class)
+    dr = dataset.DatasetReader.from_manifest(url)
+    for field in ('traces', 'umsk_plaintext'):
+        np.testing.assert_array_equal(
+                concat_items(dr.iter_ntraces(None, max_chunk_size=30), field), arrays[field]
+                )
+    np.testing.assert_array_equal(dr.take([3, 180, 120])['traces'], arrays['traces'][[3, 180, 120]])
+    traces = concat_items(dr.iter_ntraces(None, prefetch=2, verify=True))
+    np.testing.assert_array_equal(traces, arrays['traces'])
+
+def test_http_ranges(serve):
+    url, arrays, requests = serve(QuietRangeHandler)
+    storage = dataset.HTTPStorage(url.rsplit('/', 1)[0], part_size=1000)
+    dr = dataset.DatasetReader.from_manifest('manifest.json', storage=storage)
+    path = dr.chunks[dr.chunk_name_list[0]]['files']['traces']['path']
+    requests.clear()
+    data = storage.read_ranges(path, [(128, 2500), (10, 5)])
+    with storage.open(path) as f:
+        content = f.read()
+    assert [bytes(d) for d in data] == [content[128:2628], content[10:15]]
+    # Only range requests are made, split in parts of at most part_size bytes.
+    assert all(r is not None for _, _, r in requests)
+    assert len(requests) >= 4
+
+def test_http_no_range_support(serve):
+    url, arrays, requests = serve(NoRangeHandler)
+    storage = dataset.HTTPStorage(url.rsplit('/', 1)[0], part_size=1000)
+    dr = dataset.DatasetReader.from_manifest('manifest.json', storage=storage)
+    path = dr.chunks[dr.chunk_name_list[0]]['files']['traces']['path']
+    requests.clear()
+    data = storage.read_ranges(path, [(128, 2500), (10, 5)])
+    content = storage.read(path)
+    assert [bytes(d) for d in data] == [content[128:2628], content[10:15]]
+    with storage.open(path) as f:
+        f.seek(1000)
+        assert f.read(300) == content[1000:1300]
+    # The server answered the first request with the whole file: the file is
+    # then fetched once, instead of once per part.
+    gets = [r for r in requests if r[0] == 'GET']
+    assert len(gets) == 2
+    with pytest.raises(dataset.CorruptedDatasetError):
+        storage.read_ranges(path, [(len(content) - 10, 20)])
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from conftest import concat_items
+
+@pytest.mark.parametrize('prefetch', [None, 1, 3])
+def test_iter_ntraces(small_dataset, prefetch):
+    dr, arrays = small_dataset
+    items = list(dr.iter_ntraces(
+        120, start_trace=10, max_chunk_size=16, prefetch=prefetch, prefetch_workers=2
+        ))
+    assert all(len(item['traces']) <= 16 for item in items)
+    for field in ('traces', 'umsk_plaintext'):
+        np.testing.assert_array_equal(concat_items(items, field), arrays[field][10:130])
+
+def test_prefetch_early_exit(small_dataset):
+    dr, arrays = small_dataset
+    items = iter(dr.iter_ntraces(max_chunk_size=4, prefetch=4))
+    item = next(items)
+    items.close()
+    np.testing.assert_array_equal(item['traces'], arrays['traces'][:4])
+
+def test_prefetch_bad_parameters(small_dataset):
+    dr, _ = small_dataset
+    with pytest.raises(ValueError):
+        dr.iter_ntraces(prefetch=0)
+    with pytest.raises(ValueError):
+        dr.iter_ntraces(prefetch=1, prefetch_workers=0)
@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+import pytest
+
+import dataset
+import transpose_dataset
+
+@pytest.fixture
+def transposed(make_dataset):
+    path, arrays = make_dataset()
+    dr = dataset.DatasetReader.from_manifest(path)
+    new_path = path.parent / 'manifest_sample_major.json'
+    transpose_dataset.transpose(dr, new_path, block_size=24, tile_size=40, nproc=2)
+    return dataset.DatasetReader.from_manifest(new_path), arrays
+
+def test_transpose_layout(transposed):
+    dr, _ = transposed
+    layout = dr.layouts['traces']
+    assert layout['nexec'] == len(dr)
+    assert [file['samples'] for file in layout['files']] == [[0, 24], [24, 48], [48, 64]]
+
+@pytest.mark.parametrize('samples', [None, slice(20, 30), [60, 2, 30, 30]])
+@pytest.mark.parametrize('use_layout', [False, True])
+def test_read_samples(transposed, samples, use_layout):
+    dr, arrays = transposed
+    if not use_layout:
+        dr.layouts.clear()
+    res = dr.read_samples(samples, max_ntraces=120, start_trace=20)
+    columns = np.arange(64)[slice(None) if samples is None else samples]
+    np.testing.assert_array_equal(res, arrays['traces'][20:140, columns].T)
+
+def test_read_samples_subset(transposed):
+    dr, arrays = transposed
+    sub = dr.subset([dr.chunk_name_list[0], dr.chunk_name_list[2]])
+    res = sub.read_samples([3, 4])
+    expected = np.concatenate([arrays['traces'][:100], arrays['traces'][150:]])[:, [3, 4]].T
+    np.testing.assert_array_equal(res, expected)
+
+def test_validate_layout(transposed):
+    dr, _ = transposed
+    report = dr.validation_report()
+    assert report['layout:traces'] == dataset.CHUNK_OK
+    files = dr.layouts['traces']['files']
+    with open(dr.base_path / files[1]['path'], 'r+b') as f:
+        f.seek(300)
+        f.write(b'\xff\xff')
+    assert dr.validation_report()['layout:traces'] == dataset.CHUNK_CORRUPTED
+    with pytest.raises(dataset.CorruptedDatasetError):
+        dr.validate()
+    os.unlink(dr.base_path / files[1]['path'])
+    assert dr.validation_report()['layout:traces'] == dataset.CHUNK_MISSING
+    dr.validate()
+    with pytest.raises(dataset.PartialDatasetError):
+        dr.validate(allow_missing=False)
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+import dataset
+from conftest import concat_items
+
+def test_items_are_dicts(small_dataset):
+    dr, arrays = small_dataset
+    items = list(dr.iter_ntraces(None, max_chunk_size=40))
+    assert all(type(item) is dict for item in items)
+    item = items[0]
+    copy = item.copy()
+    item['traces'] = np.zeros(3)
+    item['extra'] = 1
+    np.testing.assert_array_equal(copy['traces'], arrays['traces'][:40])
+    assert list(copy) == ['traces', 'umsk_plaintext']
+
+def test_lazy_items(small_dataset, monkeypatch):
+    dr, arrays = small_dataset
+    loaded = []
+    load_chunk = dr.load_chunk
+    def counting_load_chunk(chunk_name, *args, fields=None, **kwargs):
+        loaded.append((chunk_name, tuple(fields)))
+        return load_chunk(chunk_name, *args, fields=fields, **kwargs)
+    monkeypatch.setattr(dr, 'load_chunk', counting_load_chunk)
+    items = list(dr.iter_ntraces(None, max_chunk_size=40, lazy=True))
+    assert all(isinstance(item, dataset.LazyChunk) for item in items)
+    assert not loaded
+    plaintexts = concat_items(items, 'umsk_plaintext')
+    np.testing.assert_array_equal(plaintexts, arrays['umsk_plaintext'])
+    # Only the accessed field is loaded, once per chunk.
+    assert loaded == [(cn, ('umsk_plaintext',)) for cn in dr.chunk_name_list]
+    assert set(items[0]) == {'traces', 'umsk_plaintext'}
+    assert len(items[0]) == 2
+    with pytest.raises(KeyError):
+        items[0]['other']
+    with pytest.raises(TypeError):
+        items[0]['traces'] = np.zeros(3)
+    item = dict(items[1])
+    np.testing.assert_array_equal(item['traces'], arrays['traces'][40:80])
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_lazy_fields_samples(small_dataset, lazy):
+    dr, arrays = small_dataset
+    items = list(dr.iter_ntraces(None, fields=['traces'], samples=slice(3, 9), lazy=lazy))
+    assert all(list(item) == ['traces'] for item in items)
+    np.testing.assert_array_equal(concat_items(items), arrays['traces'][:, 3:9])
+
+def test_lazy_concat(make_dataset):
+    path0, arrays0 = make_dataset('a', chunk_sizes=(5, 7))
+    path1, arrays1 = make_dataset('b', chunk_sizes=(9,), seed=1)
+    dr = dataset.ConcatDatasetReader([dataset.DatasetReader.from_manifest(p) for p in (path0, path1)])
+    items = list(dr.iter_ntraces(None))
+    assert all(type(item) is dict for item in items)
+    items = list(dr.iter_ntraces(None, lazy=True))
+    assert all(isinstance(item, dataset.LazyChunk) for item in items)
+    np.testing.assert_array_equal(
+            concat_items(items), np.concatenate([arrays0['traces'], arrays1['traces']])
+            )
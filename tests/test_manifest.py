@@ -0,0 +1,70 @@
+import json
+
+import numpy as np
+import pytest
+
+import dataset
+from conftest import concat_items
+
+@pytest.fixture
+def binary_dataset(small_dataset):
+    dr, arrays = small_dataset
+    path = dr.base_path / 'manifest.bin'
+    dr.save_to(path, binary=True)
+    return dataset.DatasetReader.from_manifest(path), arrays
+
+def test_binary_manifest(small_dataset, binary_dataset):
+    dr, _ = small_dataset
+    binary_dr, arrays = binary_dataset
+    assert binary_dr.chunk_name_list == dr.chunk_name_list
+    assert binary_dr.chunk_list == dr.chunk_list
+    assert binary_dr.cum_nexec == dr.cum_nexec
+    assert binary_dr.fields == dr.fields
+    binary_dr.validate()
+    np.testing.assert_array_equal(concat_items(binary_dr.iter_ntraces(max_chunk_size=30)), arrays['traces'])
+
+def test_binary_manifest_version(binary_dataset):
+    dr, _ = binary_dataset
+    with open(dr.base_path / 'manifest.bin', 'rb') as f:
+        data = f.read()
+    header_len = int.from_bytes(data[len(dataset._BINARY_MANIFEST_MAGIC):][:8], 'little')
+    header = json.loads(data[len(dataset._BINARY_MANIFEST_MAGIC)+8:][:header_len])
+    assert header['version'] == '1.1'
+
+def test_binary_manifest_lazy_index(binary_dataset):
+    dr, _ = binary_dataset
+    assert dr.chunks._index is None
+    assert len(dr.chunks) == 3
+    assert dr.chunks._index is None
+    assert '0001' in dr.chunks and 'x' not in dr.chunks
+    assert dr.chunks['0001']['nexec'] == 50
+    with pytest.raises(KeyError):
+        dr.chunks['x']
+
+def test_chunk_lists_cached(binary_dataset):
+    dr, _ = binary_dataset
+    assert dr.chunk_list is dr.chunk_list
+    assert dr.chunk_name_list is dr.chunk_name_list
+
+@pytest.mark.parametrize('binary', [False, True])
+def test_perm_seed(small_dataset, binary):
+    dr, arrays = small_dataset
+    path = dr.base_path / ('manifest.bin' if binary else 'manifest.json')
+    if binary:
+        dr.save_to(path, binary=True)
+    perm_dr = dataset.DatasetReader.from_manifest(path, perm_seed=3)
+    assert sorted(perm_dr.chunk_name_list) == dr.chunk_name_list
+    assert perm_dr.cum_nexec[1] == dr.chunks[perm_dr.chunk_name_list[0]]['nexec']
+    np.testing.assert_array_equal(
+            perm_dr.load_chunk(perm_dr.chunk_name_list[0])['traces'],
+            dr.load_chunk(perm_dr.chunk_name_list[0])['traces'],
+            )
+
+def test_unknown_version(small_dataset):
+    dr, _ = small_dataset
+    path = dr.base_path / 'manifest.json'
+    manifest = json.loads(path.read_text())
+    manifest['version'] = '2.0'
+    path.write_text(json.dumps(manifest))
+    with pytest.raises(dataset.DatasetError):
+        dataset.DatasetReader.from_manifest(path)
@@ -0,0 +1,87 @@
+import builtins
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+import dataset
+import pack_dataset
+from conftest import concat_items
+
+def read_buffers(dr, **kwargs):
+    # The buffers are reused: the items are copied.
+    items = [
+            {f: np.array(array) for f, array in item.items()}
+            for item in dr.iter_ntraces(None, buffers=True, **kwargs)
+            ]
+    return {field: concat_items(items, field) for field in ('traces', 'umsk_plaintext')}
+
+@pytest.fixture
+def npy_opens(monkeypatch):
+    """List of the paths of the .npy files opened by the dataset module."""
+    opened = []
+    def counting_open(path, *args, **kwargs):
+        if str(path).endswith('.npy'):
+            opened.append(str(path))
+        return builtins.open(path, *args, **kwargs)
+    monkeypatch.setattr(dataset, 'open', counting_open, raising=False)
+    return opened
+
+def test_max_open_files_class_attribute(small_dataset):
+    dr, _ = small_dataset
+    assert dataset.DatasetReader.max_open_files == 64
+    assert dr._memmaps.maxsize == dr.max_open_files
+
+def test_readinto_files_kept_open(small_dataset, npy_opens):
+    dr, arrays = small_dataset
+    for _ in range(2):
+        res = read_buffers(dr, max_chunk_size=10)
+        for field, array in res.items():
+            np.testing.assert_array_equal(array, arrays[field])
+    # Each file is opened once, not once per read.
+    assert len(npy_opens) == 6
+    assert len(set(npy_opens)) == 6
+
+def test_readinto_evicted_files(make_dataset, npy_opens, monkeypatch):
+    monkeypatch.setattr(dataset.DatasetReader, 'max_open_files', 2)
+    path, arrays = make_dataset()
+    dr = dataset.DatasetReader.from_manifest(path)
+    res = read_buffers(dr, max_chunk_size=10, prefetch=3, prefetch_workers=3)
+    for field, array in res.items():
+        np.testing.assert_array_equal(array, arrays[field])
+    assert len(dr._memmaps._arrays) == 2
+    # When reading sequentially, the two files of a chunk are opened once.
+    del npy_opens[:]
+    read_buffers(dr, max_chunk_size=10)
+    assert len(npy_opens) == 6
+
+def test_readinto_segment(make_dataset):
+    path, arrays = make_dataset()
+    pack_dataset.pack(dataset.DatasetReader.from_manifest(path), path.parent / 'packed.json', nproc=1)
+    dr = dataset.DatasetReader.from_manifest(path.parent / 'packed.json')
+    res = read_buffers(dr, max_chunk_size=30, start_trace=20)
+    for field, array in res.items():
+        np.testing.assert_array_equal(array, arrays[field][20:])
+
+# Reader inherited by the forked processes (see test_readinto_fork).
+_forked_reader = None
+
+def _read_in_child(start):
+    items = _forked_reader.iter_ntraces(10, start_trace=start, buffers=True)
+    return np.concatenate([np.array(item['traces']) for item in items])
+
+def test_readinto_fork(small_dataset):
+    global _forked_reader
+    dr, arrays = small_dataset
+    # The files are opened before the processes are forked.
+    read_buffers(dr)
+    _forked_reader = dr
+    try:
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=4, mp_context=context) as executor:
+            starts = list(range(0, 180, 10))
+            for start, traces in zip(starts, executor.map(_read_in_child, starts)):
+                np.testing.assert_array_equal(traces, arrays['traces'][start:start+10])
+    finally:
+        _forked_reader = None
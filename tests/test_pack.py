@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+import pytest
+
+import dataset
+import pack_dataset
+from conftest import concat_items
+
+def pack(path, name='manifest_packed.json'):
+    dr = dataset.DatasetReader.from_manifest(path)
+    pack_dataset.pack(dr, path.parent / name, nproc=2)
+    return dataset.DatasetReader.from_manifest(path.parent / name)
+
+def report_ok(dr):
+    return set(dr.validation_report().values()) == {dataset.CHUNK_OK}
+
+@pytest.mark.parametrize('chunk_sizes', [(100, 50, 37), (5, 0, 7), (0,)])
+def test_pack(make_dataset, chunk_sizes):
+    path, arrays = make_dataset(chunk_sizes=chunk_sizes)
+    packed = pack(path)
+    for file in packed.chunks[packed.chunk_name_list[0]]['files'].values():
+        assert file['segment'][0] == 0
+    assert report_ok(packed)
+    packed.validate()
+    if len(packed):
+        for field in ('traces', 'umsk_plaintext'):
+            np.testing.assert_array_equal(
+                    concat_items(packed.iter_ntraces(None, max_chunk_size=30), field), arrays[field]
+                    )
+
+def test_pack_corrupted(make_dataset):
+    path, _ = make_dataset()
+    packed = pack(path)
+    segment = packed.base_path / packed.chunks['0001']['files']['traces']['path']
+    with open(segment, 'r+b') as f:
+        f.seek(128 + 110*64*2)
+        f.write(b'\x01\x02')
+    report = packed.validation_report()
+    assert report == {'0000': dataset.CHUNK_OK, '0001': dataset.CHUNK_CORRUPTED, '0002': dataset.CHUNK_OK}
+
+def test_pack_missing_file(make_dataset):
+    path, arrays = make_dataset()
+    dr = dataset.DatasetReader.from_manifest(path)
+    missing = dr.chunks['0001']['files']['traces']['path']
+    os.unlink(dr.base_path / missing)
+    packed = pack(path)
+    # The missing file is kept as is, the other files are packed.
+    assert packed.chunks['0001']['files']['traces'] == dr.chunks['0001']['files']['traces']
+    assert 'segment' in packed.chunks['0002']['files']['traces']
+    assert packed.chunks['0002']['files']['traces']['segment'] == [100, 37]
+    assert 'segment' in packed.chunks['0001']['files']['umsk_plaintext']
+    assert packed.validation_report()['0001'] == dataset.CHUNK_MISSING
+    sub = packed.subset(['0000', '0002'])
+    sub.validate()
+    traces = concat_items(sub.iter_ntraces(None))
+    np.testing.assert_array_equal(traces, np.concatenate([arrays['traces'][:100], arrays['traces'][150:]]))
+
+def test_pack_reader_sent_once(make_dataset, monkeypatch):
+    path, _ = make_dataset(chunk_sizes=(3,) * 20)
+    pickled = []
+    def counting_reduce_ex(self, protocol):
+        pickled.append(self)
+        return object.__reduce_ex__(self, protocol)
+    monkeypatch.setattr(dataset.DatasetReader, '__reduce_ex__', counting_reduce_ex, raising=False)
+    pack(path)
+    # At most once per process (not at all with fork), not once per task.
+    assert len(pickled) <= 2
@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pytest
+
+import dataset
+
+def center(item):
+    traces = item['traces']
+    return dict(item, traces=traces - traces.mean(axis=1, keepdims=True))
+
+def first_rows(item):
+    return {f: array[:2] for f, array in item.items()}
+
+def test_iter_parallel(small_dataset):
+    dr, arrays = small_dataset
+    items = dr.iter_parallel(None, max_chunk_size=40, nproc=2)
+    traces = np.concatenate([np.array(item['traces']) for item in items])
+    np.testing.assert_array_equal(traces, arrays['traces'])
+
+def test_iter_parallel_preprocess(small_dataset):
+    dr, arrays = small_dataset
+    out_fields = dict(
+            traces=dict(shape=[64], dtype=np.float64),
+            umsk_plaintext=dict(shape=[16], dtype=np.uint8),
+            )
+    items = dr.iter_parallel(
+            None, max_chunk_size=40, preprocess=center, out_fields=out_fields, nproc=2, nslots=3,
+            )
+    traces = np.concatenate([np.array(item['traces']) for item in items])
+    expected = arrays['traces'] - arrays['traces'].mean(axis=1, keepdims=True)
+    np.testing.assert_allclose(traces, expected)
+
+def test_iter_parallel_fewer_rows(small_dataset):
+    dr, arrays = small_dataset
+    items = list(np.array(item['umsk_plaintext']) for item in dr.iter_parallel(
+        None, max_chunk_size=40, preprocess=first_rows, nproc=1,
+        ))
+    assert len(items) == 6
+    np.testing.assert_array_equal(items[0], arrays['umsk_plaintext'][:2])
+
+def test_iter_parallel_defaults(small_dataset):
+    dr, _ = small_dataset
+    items = dr.iter_parallel(None, max_chunk_size=40)
+    assert items.nproc == min(4, os.cpu_count())
+    assert items.nslots == 2*items.nproc
+    # 40 rows of 64 int16 (5120 bytes) and of 16 bytes (640 bytes) per slot.
+    items = dr.iter_parallel(None, max_chunk_size=40, nproc=4, max_bytes=3*(5120+640))
+    assert items.nslots == 3
+    items = dr.iter_parallel(None, max_chunk_size=40, nproc=4, max_bytes=10)
+    assert items.nslots == 1
+    assert len(list(items)) == 6
+
+@pytest.mark.parametrize('kwargs', [dict(nproc=0), dict(nslots=0)])
+def test_iter_parallel_bad_parameters(small_dataset, kwargs):
+    dr, _ = small_dataset
+    with pytest.raises(ValueError):
+        dr.iter_parallel(None, **kwargs)
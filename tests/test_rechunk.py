@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+import dataset
+import rechunk_dataset
+import transpose_dataset
+from conftest import concat_items
+
+@pytest.mark.parametrize('copy_data', [True, False])
+@pytest.mark.parametrize('policy, sizes', [
+    (rechunk_dataset.fixed_size(40), [40, 40, 20, 40, 10, 37]),
+    (rechunk_dataset.max_bytes(40 * (64*2 + 16)), [40, 40, 20, 40, 10, 37]),
+    (rechunk_dataset.pow2_ladder(), [36, 32, 16, 8, 4, 2, 1, 1, 18, 16, 8, 4, 2, 1, 1, 5, 16, 8, 4, 2, 1, 1]),
+    ])
+def test_rechunk(small_dataset, policy, sizes, copy_data):
+    dr, arrays = small_dataset
+    new_path = dr.base_path / 'manifest_rechunk.json'
+    rechunk_dataset.rechunk(dr, new_path, policy, nproc=2, copy_data=copy_data)
+    new_dr = dataset.DatasetReader.from_manifest(new_path)
+    assert [chunk['nexec'] for chunk in new_dr.chunks.values()] == sizes
+    new_dr.validate()
+    traces = concat_items(new_dr.iter_ntraces())
+    # pow2_ladder reorders the traces of a chunk.
+    assert sorted(map(bytes, traces)) == sorted(map(bytes, arrays['traces']))
+    for chunk_name, chunk in new_dr.chunks.items():
+        if 'rows' in chunk['files']['traces']:
+            assert not copy_data
+
+def test_rechunk_last_only(small_dataset):
+    dr, arrays = small_dataset
+    new_path = dr.base_path / 'manifest_rechunk.json'
+    rechunk_dataset.rechunk(dr, new_path, rechunk_dataset.fixed_size(10), dr.chunk_name_list[-1:], nproc=1)
+    new_dr = dataset.DatasetReader.from_manifest(new_path)
+    assert [chunk['nexec'] for chunk in new_dr.chunks.values()] == [100, 50, 10, 10, 10, 7]
+    assert new_dr.chunks['0000'] == dr.chunks['0000']
+    np.testing.assert_array_equal(concat_items(new_dr.iter_ntraces()), arrays['traces'])
+
+def test_pow2_ladder_empty_chunk(make_dataset):
+    path, arrays = make_dataset(chunk_sizes=(5, 0, 3))
+    dr = dataset.DatasetReader.from_manifest(path)
+    assert rechunk_dataset.pow2_ladder()(0, 1) == []
+    new_path = path.parent / 'manifest_rechunk.json'
+    rechunk_dataset.rechunk(dr, new_path, rechunk_dataset.pow2_ladder(), nproc=1)
+    new_dr = dataset.DatasetReader.from_manifest(new_path)
+    assert sorted(chunk['nexec'] for chunk in new_dr.chunks.values()) == [0, 1, 1, 1, 1, 1, 1, 2]
+
+@pytest.mark.parametrize('copy_data', [True, False])
+def test_rechunk_layouts(small_dataset, copy_data):
+    dr, arrays = small_dataset
+    transposed_path = dr.base_path / 'manifest_sample_major.json'
+    transpose_dataset.transpose(dr, transposed_path, block_size=32, tile_size=64, nproc=1)
+    dr = dataset.DatasetReader.from_manifest(transposed_path)
+    new_path = dr.base_path / 'manifest_rechunk.json'
+    rechunk_dataset.rechunk(dr, new_path, rechunk_dataset.fixed_size(30), nproc=1, copy_data=copy_data)
+    new_dr = dataset.DatasetReader.from_manifest(new_path)
+    assert set(new_dr.layouts['traces']['chunks']) == set(new_dr.chunks)
+    np.testing.assert_array_equal(new_dr.read_samples([5, 40]), arrays['traces'][:, [5, 40]].T)
+
+@pytest.mark.parametrize('copy_data', [True, False])
+def test_rechunk_other_directory(small_dataset, tmp_path, copy_data):
+    dr, arrays = small_dataset
+    transposed_path = dr.base_path / 'manifest_sample_major.json'
+    transpose_dataset.transpose(dr, transposed_path, block_size=32, tile_size=64, nproc=1)
+    dr = dataset.DatasetReader.from_manifest(transposed_path)
+    new_path = tmp_path / 'other' / 'manifest.json'
+    new_path.parent.mkdir()
+    policy = rechunk_dataset.fixed_size(60)
+    rechunk_dataset.rechunk(dr, new_path, policy, dr.chunk_name_list[:1], nproc=1, copy_data=copy_data)
+    new_dr = dataset.DatasetReader.from_manifest(new_path)
+    new_dr.validate()
+    np.testing.assert_array_equal(concat_items(new_dr.iter_ntraces()), arrays['traces'])
+    np.testing.assert_array_equal(new_dr.read_samples([5, 40]), arrays['traces'][:, [5, 40]].T)
+
+def test_rechunk_keeps_codecs_and_blocks(make_dataset):
+    path, arrays = make_dataset(codecs={'traces': 'zlib'}, merkle_block_size=256)
+    dr = dataset.DatasetReader.from_manifest(path)
+    new_path = path.parent / 'manifest_rechunk.json'
+    rechunk_dataset.rechunk(dr, new_path, rechunk_dataset.fixed_size(40), nproc=2)
+    new_dr = dataset.DatasetReader.from_manifest(new_path)
+    for chunk in new_dr.chunks.values():
+        assert chunk['files']['traces']['codec'] == 'zlib'
+        assert 'codec' not in chunk['files']['umsk_plaintext']
+        assert chunk['files']['umsk_plaintext']['blocks']['size'] == 256
+    new_dr.validate()
+    np.testing.assert_array_equal(concat_items(new_dr.iter_ntraces()), arrays['traces'])
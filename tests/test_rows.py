@@ -0,0 +1,83 @@
+import json
+
+import numpy as np
+import pytest
+
+import dataset
+import transpose_dataset
+from conftest import concat_items
+
+def test_subset_rows(small_dataset):
+    dr, arrays = small_dataset
+    c0, c1, c2 = dr.chunk_name_list
+    sub = dr.subset_rows([(c0, 10, 30), (c1, 0, 50), (c2, 5, 6)])
+    assert list(sub.chunks) == [f'{c0}_rows10-30', c1, f'{c2}_rows5-6']
+    assert len(sub) == 71
+    traces = concat_items(sub.iter_ntraces(None))
+    np.testing.assert_array_equal(
+            traces, np.concatenate([arrays['traces'][10:30], arrays['traces'][100:150], arrays['traces'][155:156]])
+            )
+    sub.validate()
+
+@pytest.mark.parametrize('rows', [(0, 0), (5, 3), (0, 101), (-1, 10)])
+def test_subset_rows_bad(small_dataset, rows):
+    dr, _ = small_dataset
+    with pytest.raises(ValueError):
+        dr.subset_rows([(dr.chunk_name_list[0], *rows)])
+
+@pytest.mark.parametrize('n_traces', [None, 1, 37, 100, 120, 187])
+def test_subset_ntraces(small_dataset, n_traces):
+    dr, arrays = small_dataset
+    sub = dr.subset_ntraces(n_traces, ['traces'])
+    expected = len(dr) if n_traces is None else n_traces
+    assert len(sub) == expected
+    assert list(sub.fields) == ['traces']
+    traces = concat_items(sub.iter_ntraces(None))
+    assert traces.shape == (expected, 64)
+    # The traces are distinct rows of the dataset.
+    rows = {row.tobytes() for row in arrays['traces']}
+    assert len({row.tobytes() for row in traces}) == expected
+    assert all(row.tobytes() in rows for row in traces)
+
+def test_subset_ntraces_too_large(small_dataset):
+    dr, _ = small_dataset
+    with pytest.raises(ValueError):
+        dr.subset_ntraces(len(dr) + 1)
+
+def test_subset_ntraces_empty_chunks(make_dataset):
+    path, arrays = make_dataset(chunk_sizes=(0, 5, 0, 9, 0))
+    dr = dataset.DatasetReader.from_manifest(path)
+    sub = dr.subset_ntraces(7)
+    assert len(sub) == 7
+    # The empty chunks, the chunk of 5 traces and 2 traces of the other one.
+    assert sorted(chunk['nexec'] for chunk in sub.chunks.values()) == [0, 0, 0, 2, 5]
+    np.testing.assert_array_equal(concat_items(sub.iter_ntraces(None)), arrays['traces'][:7])
+    sub = dr.subset_rows([('0000', 0, 0), ('0001', 1, 3)])
+    assert sub.chunk_name_list == ['0000', '0001_rows1-3']
+
+def test_rows_manifest_version(small_dataset, tmp_path):
+    dr, arrays = small_dataset
+    path = tmp_path / 'whole.json'
+    dr.subset_ntraces(150).save_to(path)
+    assert json.loads(path.read_text())['version'] == '1.0'
+    path = tmp_path / 'rows.json'
+    dr.subset_ntraces(120).save_to(path)
+    # Readers of version 1.0 would read the whole files.
+    assert json.loads(path.read_text())['version'] == '1.1'
+    sub = dataset.DatasetReader.from_manifest(path)
+    assert len(sub) == 120
+    assert concat_items(sub.iter_ntraces(None)).shape == (120, 64)
+
+def test_subset_rows_layouts(make_dataset):
+    path, arrays = make_dataset()
+    dr = dataset.DatasetReader.from_manifest(path)
+    new_path = path.parent / 'manifest_sample_major.json'
+    transpose_dataset.transpose(dr, new_path, block_size=24, tile_size=40, nproc=1)
+    dr = dataset.DatasetReader.from_manifest(new_path)
+    c0, c1, _ = dr.chunk_name_list
+    sub = dr.subset_rows([(c1, 20, 50), (c0, 0, 100)])
+    # The name of the split chunk is not referenced anymore.
+    assert sub.layouts['traces']['chunks'] == {f'{c1}_rows20-50': 120, c0: 0}
+    res = sub.read_samples([1, 40])
+    expected = np.concatenate([arrays['traces'][120:150], arrays['traces'][:100]])[:, [1, 40]].T
+    np.testing.assert_array_equal(res, expected)
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from conftest import concat_items
+
+SELECTIONS = [
+        slice(10, 20),
+        slice(0, 64, 3),
+        [(2, 5), (40, 44)],
+        [1, 7, 3, 3, -1],
+        np.arange(8, 16),
+        ]
+
+@pytest.mark.parametrize('samples', SELECTIONS)
+@pytest.mark.parametrize('prefetch', [None, 2])
+def test_iter_samples(small_dataset, samples, prefetch):
+    dr, arrays = small_dataset
+    expected = arrays['traces'][:, _columns(samples)]
+    items = list(dr.iter_ntraces(samples=samples, max_chunk_size=32, prefetch=prefetch))
+    for item in items:
+        assert item['traces'].flags.c_contiguous
+    np.testing.assert_array_equal(concat_items(items), expected)
+    np.testing.assert_array_equal(
+            concat_items(items, 'umsk_plaintext'), arrays['umsk_plaintext']
+            )
+
+@pytest.mark.parametrize('samples', SELECTIONS)
+def test_take_samples(small_dataset, samples):
+    dr, arrays = small_dataset
+    res = dr.take([3, 120, 4], samples=samples)
+    np.testing.assert_array_equal(res['traces'], arrays['traces'][[3, 120, 4]][:, _columns(samples)])
+
+def test_bad_samples(small_dataset):
+    dr, _ = small_dataset
+    with pytest.raises(IndexError):
+        dr.iter_ntraces(samples=[64])
+    with pytest.raises(ValueError):
+        dr.iter_ntraces(samples=np.zeros((2, 2), dtype=int))
+
+def _columns(samples):
+    if isinstance(samples, list) and isinstance(samples[0], tuple):
+        return np.concatenate([np.arange(64)[slice(*w)] for w in samples])
+    return np.arange(64)[samples]
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+@pytest.mark.parametrize('max_bytes', [2**30, 3000])
+@pytest.mark.parametrize('drop_last', [False, True])
+def test_iter_shuffled(small_dataset, max_bytes, drop_last):
+    dr, arrays = small_dataset
+    batches = list(dr.iter_shuffled(16, seed=1, max_bytes=max_bytes, drop_last=drop_last))
+    sizes = [len(batch['traces']) for batch in batches]
+    assert len(batches) == len(dr.iter_shuffled(16, drop_last=drop_last))
+    assert all(size == 16 for size in sizes[:-1])
+    traces = np.concatenate([batch['traces'] for batch in batches])
+    plaintexts = np.concatenate([batch['umsk_plaintext'] for batch in batches])
+    if drop_last:
+        assert len(traces) == len(dr) - len(dr) % 16
+    else:
+        assert len(traces) == len(dr)
+    # Traces and plaintexts stay paired.
+    expected = {bytes(t): bytes(p) for t, p in zip(arrays['traces'], arrays['umsk_plaintext'])}
+    assert all(expected[bytes(t)] == bytes(p) for t, p in zip(traces, plaintexts))
+    assert not np.array_equal(traces[:16], arrays['traces'][:16])
+
+def test_iter_shuffled_seed(small_dataset):
+    dr, _ = small_dataset
+    a = [batch['traces'] for batch in dr.iter_shuffled(32, seed=5)]
+    b = [batch['traces'] for batch in dr.iter_shuffled(32, seed=5)]
+    assert all(np.array_equal(x, y) for x, y in zip(a, b))
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+import dataset
+
+def check_stats(st, traces):
+    assert st.n == traces.shape[0]
+    np.testing.assert_allclose(st.mean, traces.mean(axis=0))
+    np.testing.assert_allclose(st.var, traces.var(axis=0))
+    np.testing.assert_array_equal(st.min, traces.min(axis=0))
+    np.testing.assert_array_equal(st.max, traces.max(axis=0))
+
+def test_stats(small_dataset):
+    dr, arrays = small_dataset
+    check_stats(dr.stats(), arrays['traces'])
+    with pytest.raises(dataset.DatasetError):
+        dr.stats(compute_missing=False)
+
+def test_build_stats(small_dataset):
+    dr, arrays = small_dataset
+    dr.build_stats(nproc=2)
+    assert dr.stats_path().exists()
+    check_stats(dr.stats(compute_missing=False), arrays['traces'])
+    check_stats(dr.stats('umsk_plaintext'), arrays['umsk_plaintext'])
+    sub = dr.subset([dr.chunk_name_list[1]])
+    check_stats(sub.stats(compute_missing=False), arrays['traces'][100:150])
+
+def test_build_stats_reader_sent_once(make_dataset, monkeypatch):
+    path, arrays = make_dataset(chunk_sizes=(3,) * 20)
+    dr = dataset.DatasetReader.from_manifest(path)
+    pickled = []
+    def counting_reduce_ex(self, protocol):
+        pickled.append(self)
+        return object.__reduce_ex__(self, protocol)
+    monkeypatch.setattr(dataset.DatasetReader, '__reduce_ex__', counting_reduce_ex, raising=False)
+    dr.build_stats(nproc=2)
+    # At most once per process (not at all with fork), not once per chunk.
+    assert len(pickled) <= 2
+    check_stats(dr.stats(compute_missing=False), arrays['traces'])
+
+def test_stats_rows(small_dataset):
+    dr, arrays = small_dataset
+    sub = dr.subset_rows([(dr.chunk_name_list[0], 10, 30)])
+    sub.build_stats(nproc=1)
+    check_stats(sub.stats(compute_missing=False), arrays['traces'][10:30])
+
+def test_stats_empty_chunk(make_dataset):
+    path, arrays = make_dataset(chunk_sizes=(5, 0, 7))
+    dr = dataset.DatasetReader.from_manifest(path)
+    check_stats(dr.stats(), arrays['traces'])
+    dr.build_stats(nproc=1)
+    check_stats(dr.stats(compute_missing=False), arrays['traces'])
+    with pytest.raises(ValueError):
+        dr.subset([dr.chunk_name_list[1]]).stats()
+
+def test_concat_stats(make_dataset):
+    path0, arrays0 = make_dataset('a', chunk_sizes=(5, 7))
+    path1, _ = make_dataset('b', chunk_sizes=(0,))
+    path2, arrays2 = make_dataset('c', chunk_sizes=(9,), seed=1)
+    dr = dataset.ConcatDatasetReader([
+        dataset.DatasetReader.from_manifest(p) for p in (path0, path1, path2)
+        ])
+    check_stats(dr.stats(), np.concatenate([arrays0['traces'], arrays2['traces']]))
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+def test_take(small_dataset):
+    dr, arrays = small_dataset
+    indices = [186, 0, 150, 99, 100, 3, 3, 120]
+    res = dr.take(indices)
+    assert set(res) == {'traces', 'umsk_plaintext'}
+    for field, array in res.items():
+        np.testing.assert_array_equal(array, arrays[field][indices])
+
+def test_take_fields(small_dataset):
+    dr, arrays = small_dataset
+    res = dr.take([5, 130], fields=['umsk_plaintext'])
+    assert list(res) == ['umsk_plaintext']
+    np.testing.assert_array_equal(res['umsk_plaintext'], arrays['umsk_plaintext'][[5, 130]])
+
+def test_take_empty(small_dataset):
+    dr, _ = small_dataset
+    res = dr.take([])
+    assert res['traces'].shape == (0, 64)
+
+def test_take_bad_indices(small_dataset):
+    dr, _ = small_dataset
+    with pytest.raises(IndexError):
+        dr.take([len(dr)])
+    with pytest.raises(IndexError):
+        dr.take([-1])
+    with pytest.raises(ValueError):
+        dr.take([[0]])
@@ -0,0 +1,137 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import dataset
+
+def _corrupt(path, offset=200):
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 0xff]))
+
+@pytest.fixture
+def no_process_pool(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('Unexpected process pool.')
+    monkeypatch.setattr(dataset, 'ProcessPoolExecutor', fail)
+
+def test_validate_ok(small_dataset, no_process_pool):
+    dr, _ = small_dataset
+    dr.validate(hash_cache=False)
+    for chunk_name in dr.chunks:
+        dr.validate_chunk(chunk_name)
+
+@pytest.mark.parametrize('nproc', [1, 2])
+def test_validation_report(make_dataset, nproc):
+    path, _ = make_dataset()
+    dr = dataset.DatasetReader.from_manifest(path)
+    chunk_names = dr.chunk_name_list
+    _corrupt(path.parent / dr.chunks[chunk_names[0]]['files']['traces']['path'])
+    os.unlink(path.parent / dr.chunks[chunk_names[1]]['files']['umsk_plaintext']['path'])
+    report = dr.validation_report(nproc=nproc, hash_cache=False)
+    assert report == {
+            chunk_names[0]: dataset.CHUNK_CORRUPTED,
+            chunk_names[1]: dataset.CHUNK_MISSING,
+            chunk_names[2]: dataset.CHUNK_OK,
+            }
+    with pytest.raises(dataset.CorruptedDatasetError):
+        dr.validate(hash_cache=False)
+    with pytest.raises(dataset.CorruptedDatasetError):
+        dr.validate_chunk(chunk_names[0])
+    with pytest.raises(dataset.PartialDatasetError):
+        dr.validate_chunk(chunk_names[1])
+    dr.validate_chunk(chunk_names[1], allow_missing=True)
+
+def test_validation_progress(small_dataset):
+    dr, _ = small_dataset
+    progress = []
+    dr.validation_report(progress=progress.append, hash_cache=False)
+    assert [p.nfiles for p in progress] == list(range(1, 7))
+    assert progress[-1].nbytes == progress[-1].nbytes_total > 0
+
+def test_journal(make_dataset, tmp_path):
+    path, _ = make_dataset()
+    dr = dataset.DatasetReader.from_manifest(path)
+    journal = tmp_path / 'journal.jsonl'
+    progress = []
+    dr.validation_report(journal=journal, hash_cache=False)
+    dr.validation_report(journal=journal, progress=progress.append, hash_cache=False)
+    # Nothing hashed again.
+    assert progress == []
+    # A file modified since its check is hashed again.
+    file_path = path.parent / dr.chunks[dr.chunk_name_list[0]]['files']['traces']['path']
+    _corrupt(file_path)
+    stat = file_path.stat()
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    report = dr.validation_report(journal=journal, progress=progress.append, hash_cache=False)
+    assert len(progress) == 1
+    assert report[dr.chunk_name_list[0]] == dataset.CHUNK_CORRUPTED
+    # Truncated and old-format entries are ignored.
+    with open(journal, 'a') as f:
+        f.write(json.dumps(dict(path=str(file_path), hash='x', ok=True)) + '\n{"pa')
+    assert dr.validation_report(journal=journal, hash_cache=False) == report
+
+def test_validation_missing_file(small_dataset):
+    dr, _ = small_dataset
+    path = dr.base_path / dr.chunks[dr.chunk_name_list[2]]['files']['traces']['path']
+    os.unlink(path)
+    report = dr.validation_report(hash_cache=False)
+    assert report[dr.chunk_name_list[2]] == dataset.CHUNK_MISSING
+    with pytest.raises(dataset.PartialDatasetError):
+        dr.validate(allow_missing=False, hash_cache=False)
+
+def test_no_default_hash_cache(small_dataset, tmp_path, monkeypatch):
+    dr, _ = small_dataset
+    cache_dir = tmp_path / 'cache'
+    monkeypatch.setenv('XDG_CACHE_HOME', str(cache_dir))
+    dr.validate()
+    assert not cache_dir.exists()
+
+def test_hash_cache(small_dataset, tmp_path):
+    dr, _ = small_dataset
+    hash_cache = dataset.HashCache(tmp_path / 'hash_cache.json')
+    dr.validation_report(hash_cache=hash_cache)
+    progress = []
+    hash_cache = dataset.HashCache(tmp_path / 'hash_cache.json')
+    dr.validation_report(hash_cache=hash_cache, progress=progress.append)
+    assert progress == []
+    file_path = dr.base_path / dr.chunks[dr.chunk_name_list[0]]['files']['traces']['path']
+    _corrupt(file_path)
+    stat = file_path.stat()
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    report = dr.validation_report(hash_cache=hash_cache, progress=progress.append)
+    assert len(progress) == 1
+    assert report[dr.chunk_name_list[0]] == dataset.CHUNK_CORRUPTED
+
+def test_paranoid(small_dataset, tmp_path):
+    dr, _ = small_dataset
+    journal = tmp_path / 'journal.jsonl'
+    hash_cache = dataset.HashCache(tmp_path / 'hash_cache.json')
+    dr.validation_report(journal=journal, hash_cache=hash_cache)
+    # Silent corruption (same size and mtime).
+    file_path = dr.base_path / dr.chunks[dr.chunk_name_list[0]]['files']['traces']['path']
+    stat = file_path.stat()
+    _corrupt(file_path)
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    report = dr.validation_report(journal=journal, hash_cache=hash_cache)
+    assert report[dr.chunk_name_list[0]] == dataset.CHUNK_OK
+    report = dr.validation_report(journal=journal, hash_cache=hash_cache, paranoid=True)
+    assert report[dr.chunk_name_list[0]] == dataset.CHUNK_CORRUPTED
+
+def _record_and_save(cache_path, i):
+    hash_cache = dataset.HashCache(cache_path)
+    for j in range(20):
+        hash_cache.record(f'{i}/{j}', os.stat(cache_path.parent), str(j))
+        hash_cache.save()
+
+def test_hash_cache_concurrent_save(tmp_path):
+    cache_path = tmp_path / 'hash_cache.json'
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        for future in [executor.submit(_record_and_save, cache_path, i) for i in range(4)]:
+            future.result()
+    with open(cache_path) as f:
+        assert len(json.load(f)) == 4 * 20
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+import dataset
+from conftest import concat_items
+
+# The .npy headers are 128 bytes, and the rows of "traces" are 128 bytes, such
+# that the rows end on block boundaries with 64-bytes blocks.
+CHUNK_SIZES = (5, 3, 0, 8)
+
+@pytest.fixture(params=[None, 64])
+def verified_dataset(request, make_dataset):
+    path, arrays = make_dataset(chunk_sizes=CHUNK_SIZES, merkle_block_size=request.param)
+    return dataset.DatasetReader.from_manifest(path), arrays
+
+def copy_items(items):
+    return [{f: np.array(array) for f, array in item.items()} for item in items]
+
+@pytest.mark.parametrize('kwargs', [
+    dict(),
+    dict(lazy=True),
+    dict(prefetch=2),
+    dict(buffers=True),
+    dict(max_chunk_size=2, prefetch=2, buffers=True),
+    ])
+def test_verify_empty_chunk(verified_dataset, kwargs):
+    dr, arrays = verified_dataset
+    items = copy_items(dr.iter_ntraces(None, verify=True, **kwargs))
+    for field in ('traces', 'umsk_plaintext'):
+        np.testing.assert_array_equal(concat_items(items, field), arrays[field])
+
+def test_verify_batches_parallel(verified_dataset):
+    dr, arrays = verified_dataset
+    batches = copy_items(dr.iter_batches(3, verify=True))
+    np.testing.assert_array_equal(concat_items(batches), arrays['traces'])
+    items = copy_items(dr.iter_parallel(None, verify=True, nproc=2))
+    np.testing.assert_array_equal(concat_items(items), arrays['traces'])
+
+def corrupt(dr, chunk_name, field, offset):
+    path = dr.base_path / dr.chunks[chunk_name]['files'][field]['path']
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        data = f.read(1)
+        f.seek(offset)
+        f.write(bytes([data[0] ^ 0xff]))
+
+def test_verify_blocks(make_dataset):
+    path, arrays = make_dataset(chunk_sizes=CHUNK_SIZES, merkle_block_size=64)
+    dr = dataset.DatasetReader.from_manifest(path)
+    # Last byte of row 5 (the end of the file is block-aligned).
+    corrupt(dr, '0003', 'traces', 128 + 8*128 - 1)
+    # Only the blocks of the rows read are checked.
+    items = list(dr.iter_ntraces(7, start_trace=8, verify=True))
+    np.testing.assert_array_equal(concat_items(items), arrays['traces'][8:15])
+    with pytest.raises(dataset.CorruptedDatasetError):
+        list(dr.iter_ntraces(1, start_trace=15, verify=True))
+    with pytest.raises(dataset.CorruptedDatasetError):
+        list(dr.iter_ntraces(None, verify=True, buffers=True))
+
+def test_verify_whole_file(make_dataset):
+    path, arrays = make_dataset(chunk_sizes=CHUNK_SIZES)
+    dr = dataset.DatasetReader.from_manifest(path)
+    corrupt(dr, '0003', 'umsk_plaintext', 128 + 8*16 - 1)
+    # Files without block hashes are checked whole.
+    with pytest.raises(dataset.CorruptedDatasetError):
+        list(dr.iter_ntraces(1, start_trace=8, fields=['umsk_plaintext'], verify=True))
+    items = list(dr.iter_ntraces(None, fields=['traces'], verify=True))
+    np.testing.assert_array_equal(concat_items(items), arrays['traces'])
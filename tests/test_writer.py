@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+import dataset
+
+@pytest.mark.parametrize('writer_kwargs', [
+    dict(),
+    dict(nworkers=2),
+    dict(codecs={'traces': 'delta-bitpack'}),
+    dict(merkle_block_size=256),
+    ])
+def test_writer_hashes(make_dataset, writer_kwargs):
+    path, arrays = make_dataset(**writer_kwargs)
+    dr = dataset.DatasetReader.from_manifest(path)
+    assert list(dr.chunks) == ['0000', '0001', '0002']
+    for chunk in dr.chunks.values():
+        for file in chunk['files'].values():
+            if file['hash'].startswith('sha256-'):
+                assert dataset.hash_hex(file['hash']) == dataset.sha256sum(path.parent / file['path'])
+    dr.validate()
+    np.testing.assert_array_equal(dr.take(np.arange(len(dr)))['traces'], arrays['traces'])
+
+def test_writer_bad_chunk(tmp_path):
+    fields = {'a': {'shape': [3], 'dtype': np.int16}}
+    dw = dataset.DatasetWriter(tmp_path / 'manifest.json', 'x', {}, fields)
+    with pytest.raises(ValueError):
+        dw.add_chunk(a=np.zeros((2, 4), dtype=np.int16))
+    with pytest.raises(ValueError):
+        dw.add_chunk(a=np.zeros((2, 3), dtype=np.int32))
+    dw.add_chunk('c', a=np.zeros((2, 3), dtype=np.int16))
+    with pytest.raises(ValueError):
+        dw.add_chunk('c', a=np.zeros((2, 3), dtype=np.int16))
+    assert dw.error
+
+def test_writer_no_manifest_on_error(tmp_path):
+    fields = {'a': {'shape': [3], 'dtype': np.int16}}
+    with pytest.raises(RuntimeError):
+        with dataset.DatasetWriter(tmp_path / 'manifest.json', 'x', {}, fields) as dw:
+            dw.add_chunk(a=np.zeros((2, 3), dtype=np.int16))
+            raise RuntimeError()
+    assert not (tmp_path / 'manifest.json').exists()